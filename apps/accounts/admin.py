@@ -10,6 +10,8 @@ class UserAdmin(RegionalAdminMixin, BaseUserAdmin):
     search_fields = ('phone', 'first_name', 'last_name', 'email')
     ordering = ('-created_at',)
     actions = ['top_up_wallet']
+    # Balances change only through WalletService so the ledger stays complete
+    readonly_fields = ('wallet_balance',)
     
     fieldsets = (
         (None, {'fields': ('phone', 'password')}),
@@ -36,20 +38,10 @@ class UserAdmin(RegionalAdminMixin, BaseUserAdmin):
         amount = Decimal('10000.00')
         count = 0
         
+        from apps.payments.wallet_service import WalletService
         for user in queryset:
-            user.wallet_balance += amount
-            user.save()
+            WalletService.credit(user, amount, 'topup', f'Admin top-up by {request.user.phone}')
             count += 1
-            
-            # Log the transaction
-            from apps.payments.models import WalletTransaction
-            WalletTransaction.objects.create(
-                user=user,
-                amount=amount,
-                transaction_type='topup',
-                status='completed',
-                description=f'Admin top-up by {request.user.phone}'
-            )
         
         self.message_user(
             request,
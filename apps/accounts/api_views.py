@@ -7,8 +7,8 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from .models import User, Vehicle, OTPCode
+from .authentication import start_device_session
 from .serializers import UserSerializer, VehicleSerializer, RegisterSerializer
 
 class RegisterView(APIView):
@@ -64,17 +64,13 @@ class VerifyOTPView(APIView):
             
             user.is_verified = True
             
-            # Generate new JWT token
-            refresh = RefreshToken.for_user(user)
+            # Generate new JWT token for a new device session (invalidates the previous one)
+            refresh = start_device_session(user)
             access_token = refresh.access_token
             
-            # Get token ID (jti) for session tracking
-            token_jti = str(access_token.get('jti', ''))
-            
-            # Update user session tracking (invalidates previous session)
+            # Update user session tracking
             if device_id:
                 user.current_device_id = device_id
-            user.current_session_token = token_jti
             user.last_login_device = device_info or request.META.get('HTTP_USER_AGENT', '')[:255]
             user.save()
             
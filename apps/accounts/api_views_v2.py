@@ -16,9 +16,10 @@ from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 
 from .models import User, Vehicle, OTPCode
+from .authentication import start_device_session
+from .revocation import revoke, revoke_user_sessions, token_session_id
 from .serializers_v2 import (
     UserProfileSerializer, UpdateProfileSerializer, RegisterSerializer,
     LoginSerializer, VehicleSerializer, AddVehicleSerializer,
@@ -100,17 +101,13 @@ class VerifyOTPAPIView(APIView):
             device_id = request.data.get('device_id')
             device_info = request.data.get('device_info', '')
             
-            # Generate new JWT token
-            refresh = RefreshToken.for_user(user)
+            # Generate new JWT token for a new device session (invalidates the previous one)
+            refresh = start_device_session(user)
             access_token = refresh.access_token
             
-            # Get token ID (jti) for session tracking
-            token_jti = str(access_token.get('jti', ''))
-            
-            # Update user session tracking (invalidates previous session)
+            # Update user session tracking
             if device_id:
                 user.current_device_id = device_id
-            user.current_session_token = token_jti
             user.last_login_device = device_info or request.META.get('HTTP_USER_AGENT', '')[:255]
             user.save()
             
@@ -148,17 +145,13 @@ class LoginAPIView(APIView):
             device_id = request.data.get('device_id')
             device_info = request.data.get('device_info', '')
             
-            # Generate new JWT token
-            refresh = RefreshToken.for_user(user)
+            # Generate new JWT token for a new device session (invalidates the previous one)
+            refresh = start_device_session(user)
             access_token = refresh.access_token
             
-            # Get token ID (jti) for session tracking
-            token_jti = str(access_token.get('jti', ''))
-            
-            # Update user session tracking (invalidates previous session)
+            # Update user session tracking
             if device_id:
                 user.current_device_id = device_id
-            user.current_session_token = token_jti
             user.last_login_device = device_info or request.META.get('HTTP_USER_AGENT', '')[:255]
             user.save()
             
@@ -314,6 +307,23 @@ class ResendOTPAPIView(APIView):
                 'error': 'User not found'
             }, status=status.HTTP_404_NOT_FOUND)
 
+class LogoutAPIView(APIView):
+    """Log out this device: its access and refresh tokens stop working immediately"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        if request.auth is not None:
+            session_id = token_session_id(request.auth)
+            revoke(session_id, user=user, reason='logout')
+            if str(user.current_session_token) == session_id:
+                user.current_session_token = None
+                user.save(update_fields=['current_session_token'])
+
+        return Response({
+            'message': 'Logged out successfully'
+        }, status=status.HTTP_200_OK)
+
 class ChangePasswordAPIView(APIView):
     """Change user password"""
     permission_classes = [IsAuthenticated]
@@ -353,6 +363,7 @@ class DeleteAccountAPIView(APIView):
         user = request.user
         # Soft delete: set is_active to False
         user.is_active = False
+        revoke_user_sessions(user, reason='account_deleted')
         user.save()
         
         return Response({
@@ -1,41 +1,99 @@
+from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.accounts.revocation import is_revoked, revoke, token_session_id
+from apps.accounts.user_cache import get_cached_user
+
+
+class SessionInvalidated(AuthenticationFailed):
+    """
+    The token's device session has ended: logged out, or replaced by a login on
+    another device. The 401 carries `X-Session-Invalidated: true`
+    (apps.accounts.exceptions), on which the mobile apps clear their stored
+    credentials.
+    """
+    default_detail = _('Your session has been invalidated. Please log in again.')
+    default_code = 'session_invalidated'
 
 
 class DeviceSessionJWTAuthentication(JWTAuthentication):
     """Extends SimpleJWT authentication to enforce single-device login.
 
-    Requires that tokens include a `device_session_id` claim which must match
-    the current `device_session_id` on the `User` record.
+    Every login starts a device session (see start_device_session): its id is
+    stored in `User.current_session_token` and carried as the `device_session_id`
+    claim of the refresh token and every access token refreshed from it. A token
+    whose session is no longer the user's current one belongs to a device that
+    has since been logged out. The check reads the user row that authentication
+    has already loaded, so it costs no extra query.
+
+    The user itself comes from the snapshot cache (apps.accounts.user_cache)
+    rather than a query per request; `wallet_balance` is still read fresh.
+    Sessions ended by logout, a login elsewhere or account deletion are also
+    denylisted (apps.accounts.revocation).
     """
 
     def authenticate(self, request):
-        # Debug: show incoming Authorization header
-        try:
-            auth_header = request.META.get('HTTP_AUTHORIZATION', None)
-            print(f"DeviceSessionJWTAuthentication: Authorization header present: {bool(auth_header)} | header={auth_header}")
-        except Exception:
-            print("DeviceSessionJWTAuthentication: could not read Authorization header")
-
         auth_result = super().authenticate(request)
         if auth_result is None:
-            print("DeviceSessionJWTAuthentication: super().authenticate returned None (no credentials or invalid token)")
             return None
 
         user, token = auth_result
-
-        # Check if token has device_session_id claim
-        token_device_session = token.payload.get('device_session_id')
-        print(f"DeviceSessionJWTAuthentication: token payload keys: {list(token.payload.keys())}")
-        
-        if token_device_session is not None:
-            # Get current session ID from user
-            current_session_id = getattr(user, 'device_session_id', None)
-            
-            # If user has a session ID, compare it with token's session ID
-            # Use string comparison to avoid float precision issues
-            if str(current_session_id) != str(token_device_session):
-                print(f"DeviceSessionJWTAuthentication: session mismatch: user={user.id} current={current_session_id} token={token_device_session}")
-                raise AuthenticationFailed('Session expired. You have logged in on another device.')
-        
+        self.check_device_session(user, token)
         return user, token
+
+    def get_user(self, validated_token):
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            # Needs the password hash, which is never cached
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    def check_device_session(self, user, token):
+        """Raise SessionInvalidated if the token belongs to a device the user has since been logged out of"""
+        # Tokens issued before device sessions were embedded were tracked by their own jti
+        token_session = token_session_id(token)
+        if is_revoked(token_session):
+            raise SessionInvalidated('Session expired. Please log in again.')
+
+        current_session = user.current_session_token
+        if current_session and token_session != str(current_session):
+            raise SessionInvalidated('Session expired. You have logged in on another device.')
+
+
+class DeviceSessionTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuses to refresh tokens of a revoked device session"""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if is_revoked(token_session_id(refresh)):
+            raise SessionInvalidated('Session expired. Please log in again.')
+        return super().validate(attrs)
+
+
+def start_device_session(user) -> RefreshToken:
+    """
+    Issue tokens for a new login and make it the user's only valid device session.
+    The caller saves the user.
+    """
+    if user.current_session_token:
+        # Logs the previous device out everywhere, not only where the user row is re-read
+        revoke(user.current_session_token, user=user, reason='device_switch')
+
+    refresh = RefreshToken.for_user(user)
+    refresh['device_session_id'] = refresh[api_settings.JTI_CLAIM]
+    user.current_session_token = refresh['device_session_id']
+    return refresh
@@ -0,0 +1,17 @@
+"""
+API exception handling.
+
+Kept apart from apps.accounts.authentication, which DRF imports while its own
+views module is still loading.
+"""
+from rest_framework.views import exception_handler as drf_exception_handler
+
+from apps.accounts.authentication import SessionInvalidated
+
+
+def exception_handler(exc, context):
+    """DRF's exception handler, plus the header the mobile apps log out on"""
+    response = drf_exception_handler(exc, context)
+    if response is not None and isinstance(exc, SessionInvalidated):
+        response['X-Session-Invalidated'] = 'true'
+    return response
@@ -0,0 +1,132 @@
+import time
+
+from django.db import connection
+from decimal import Decimal
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.accounts.authentication import DeviceSessionJWTAuthentication, start_device_session
+from apps.accounts.models import User
+from apps.common.management.harness import HarnessCommand
+
+BENCH_EMAIL = 'bench_auth@example.com'
+
+
+class Command(HarnessCommand):
+    help = 'Measure per-request cost of JWT authentication (queries and latency) and verify single-device enforcement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--path', default='/api/user/profile/', help='Authenticated endpoint to request')
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        User.objects.filter(email=BENCH_EMAIL).delete()
+        user = User.objects.create(email=BENCH_EMAIL, phone='+256710880001', first_name='Bench')
+        refresh = start_device_session(user)
+        user.save()
+        access = str(refresh.access_token)
+
+        try:
+            self._measure_authentication(access, n)
+            self._measure_requests(access, n, options['path'])
+            self._verify_single_device(user, refresh, options['path'])
+            self._verify_snapshot(user)
+        finally:
+            User.objects.filter(email=BENCH_EMAIL).delete()
+
+    def _measure_authentication(self, access, n):
+        authentication = DeviceSessionJWTAuthentication()
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        queries, elapsed = self._timed(n, lambda: authentication.authenticate(request))
+        self.stdout.write(
+            f"authenticate(): {queries / n:.2f} queries, {elapsed * 1e6 / n:.0f}us per call"
+        )
+
+    def _measure_requests(self, access, n, path):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        status_code = client.get(path).status_code
+        queries, elapsed = self._timed(n, lambda: client.get(path))
+        self.stdout.write(
+            f"GET {path} ({status_code}): {queries / n:.2f} queries, {elapsed * 1000 / n:.2f}ms per request"
+        )
+
+    @staticmethod
+    def _timed(n, call) -> tuple:
+        """(total queries, total seconds) for n calls"""
+        queries = 0
+        elapsed = 0.0
+        for _ in range(n):
+            # One context per call: the connection keeps only the last 9000 queries
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                call()
+                elapsed += time.perf_counter() - started
+            queries += len(captured)
+        return queries, elapsed
+
+    def _verify_single_device(self, user, first_login, path):
+        authentication = DeviceSessionJWTAuthentication()
+        factory = APIRequestFactory()
+
+        def accepted(token):
+            try:
+                return authentication.authenticate(factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}')) is not None
+            except AuthenticationFailed:
+                return False
+
+        # A refreshed access token stays in the same device session
+        refreshed = str(RefreshToken(str(first_login)).access_token)
+        second_login = start_device_session(user)
+        user.save()
+
+        if not accepted(refreshed) and accepted(str(second_login.access_token)):
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Logging in on a new device rejects the old device's tokens"))
+        else:
+            self.stdout.write(self.style.ERROR("FAILED: Single-device login not enforced"))
+
+        # The mobile apps clear their stored credentials on this header
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {refreshed}')
+        response = client.get(path)
+        code = response.data.get('code') if isinstance(response.data, dict) else None
+        if (response.status_code == 401 and response.get('X-Session-Invalidated') == 'true'
+                and code == 'session_invalidated'):
+            self.stdout.write(self.style.SUCCESS("SUCCESS: The old device gets a 401 with X-Session-Invalidated"))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"FAILED: Old device got {response.status_code}, "
+                f"X-Session-Invalidated={response.get('X-Session-Invalidated')}, code={code}"
+            ))
+
+        if accepted(str(RefreshToken(str(second_login)).access_token)):
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Refreshed access tokens keep their device session"))
+        else:
+            self.stdout.write(self.style.ERROR("FAILED: Refreshed access token was rejected"))
+
+    def _verify_snapshot(self, user):
+        authentication = DeviceSessionJWTAuthentication()
+        refresh = start_device_session(user)
+        user.save()
+        access = str(refresh.access_token)
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        authentication.authenticate(request)
+
+        # Balance changes made without User.save() are still seen
+        User.objects.filter(id=user.id).update(wallet_balance=Decimal('1234.00'))
+        cached_user, _ = authentication.authenticate(request)
+        if cached_user.wallet_balance == Decimal('1234.00'):
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Wallet balance is read fresh"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: Stale wallet balance {cached_user.wallet_balance}"))
+
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        try:
+            authentication.authenticate(request)
+            self.stdout.write(self.style.ERROR("FAILED: Deactivated user still authenticated"))
+        except AuthenticationFailed:
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Deactivating a user drops the cached snapshot"))
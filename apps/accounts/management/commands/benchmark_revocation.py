@@ -0,0 +1,82 @@
+from datetime import timedelta
+import time
+import uuid
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.accounts import revocation
+from apps.accounts.authentication import start_device_session
+from apps.accounts.models import RevokedToken, User
+from apps.common.management.harness import HarnessCommand
+
+BENCH_REASON = 'benchmark'
+BENCH_PHONE = '+256710880002'
+
+
+class Command(HarnessCommand):
+    help = 'Measure token revocation checks against a large denylist and verify logout/refresh revocation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--revoked', type=int, default=20000, help='Denylist entries to create')
+        parser.add_argument('--checks', type=int, default=100000, help='Checks of valid sessions to time')
+
+    def handle(self, *args, **options):
+        RevokedToken.objects.filter(reason=BENCH_REASON).delete()
+        User.objects.filter(phone=BENCH_PHONE).delete()
+        try:
+            self._measure(options['revoked'], options['checks'])
+            self._verify_logout()
+        finally:
+            RevokedToken.objects.filter(reason=BENCH_REASON).delete()
+            User.objects.filter(phone=BENCH_PHONE).delete()
+            revocation.reset()
+
+    def _measure(self, revoked_count, checks):
+        expires_at = timezone.now() + timedelta(days=1)
+        revoked_ids = [uuid.uuid4().hex for _ in range(revoked_count)]
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti=jti, reason=BENCH_REASON, expires_at=expires_at) for jti in revoked_ids],
+            batch_size=1000
+        )
+        revocation.reset()
+
+        started = time.perf_counter()
+        revocation.is_revoked('warm-up')
+        self.stdout.write(f"Loaded {revoked_count} revocations in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+        valid_ids = [uuid.uuid4().hex for _ in range(checks)]
+        revocation.stats.clear()
+        started = time.perf_counter()
+        wrongly_revoked = sum(1 for jti in valid_ids if revocation.is_revoked(jti))
+        elapsed = time.perf_counter() - started
+        fast_path = revocation.stats['fast_path']
+        self.stdout.write(
+            f"{checks} valid tokens: {elapsed * 1e6 / checks:.1f}us per check, "
+            f"{fast_path * 100 / checks:.2f}% without I/O, "
+            f"{revocation.stats['lookups']} cache lookups, {revocation.stats['db_lookups']} database lookups"
+        )
+
+        missed = sum(1 for jti in revoked_ids[:1000] if not revocation.is_revoked(jti))
+        if wrongly_revoked or missed:
+            self.stdout.write(self.style.ERROR(f"FAILED: {wrongly_revoked} valid tokens rejected, {missed} revoked tokens accepted"))
+        else:
+            self.stdout.write(self.style.SUCCESS("SUCCESS: All revoked sessions rejected, no valid session rejected"))
+
+    def _verify_logout(self):
+        user = User.objects.create(phone=BENCH_PHONE, first_name='Bench')
+        refresh = start_device_session(user)
+        user.save()
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        logged_out = client.post('/api/auth/logout/').status_code == 200
+        profile = client.get('/api/user/profile/').status_code
+        refreshed = APIClient().post('/api/auth/refresh/', {'refresh': str(refresh)}, format='json').status_code
+
+        if logged_out and profile == 401 and refreshed == 401:
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Logout revokes the access and refresh tokens immediately"))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"FAILED: after logout profile returned {profile}, refresh returned {refreshed}"
+            ))
@@ -97,6 +97,17 @@ class User(AbstractBaseUser, PermissionsMixin, BaseModel):
                 
         super().save(*args, **kwargs)
 
+        from apps.accounts.user_cache import user_changed
+        user_changed(self.id, kwargs.get('update_fields'))
+
+    def delete(self, *args, **kwargs):
+        user_id = self.id
+        result = super().delete(*args, **kwargs)
+
+        from apps.accounts.user_cache import user_changed
+        user_changed(user_id)
+        return result
+
 class Vehicle(BaseModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='vehicles')
     license_plate = models.CharField(max_length=20, unique=True)
@@ -146,4 +157,23 @@ class UserLocation(BaseModel):
         ordering = ['-timestamp']
 
     def __str__(self):
-        return f"{self.user.phone} at {self.timestamp}"
\ No newline at end of file
+        return f"{self.user.phone} at {self.timestamp}"
+
+class RevokedToken(BaseModel):
+    """
+    Denylisted JWT device session (or, for older tokens, a single jti), kept until
+    the tokens it covers expire. See apps.accounts.revocation.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='revoked_tokens')
+    reason = models.CharField(max_length=30, blank=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='acc_rvk_created_idx'),
+            models.Index(fields=['expires_at'], name='acc_rvk_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.jti} ({self.reason})"
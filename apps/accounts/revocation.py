@@ -0,0 +1,182 @@
+"""
+Revocation of long-lived JWTs.
+
+Tokens are revoked per device session: the `device_session_id` claim shared by a
+login's refresh token and every access token refreshed from it (see
+start_device_session), or the token's own jti for tokens issued before that
+claim existed. RevokedToken rows are the denylist of record and are kept until
+the tokens they cover expire; the default cache holds a `jwt_revoked_{id}` flag
+per entry for the same time.
+
+Each process keeps a Bloom filter of the denylist. A token whose session is not
+in it is accepted with no I/O at all, which is nearly every request. Only a
+"maybe" is confirmed against the cache, then the database. The filter picks up
+new rows every REVOCATION_REFRESH_SECONDS, so a revocation takes effect at once
+in the process that made it and in the cache, and within that interval in every
+other process, the same bound as cached user snapshots (USER_SNAPSHOT_LOCAL_TTL).
+"""
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+import logging
+import threading
+import time
+
+from apps.common.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+MIN_CAPACITY = 10000
+# Rows committed out of created_at order are still picked up by the next refresh
+REFRESH_OVERLAP = timedelta(seconds=60)
+# Cached "not revoked" answers for Bloom false positives
+NOT_REVOKED_TTL = 300
+
+stats = Counter()
+
+_lock = threading.Lock()
+_filter = None
+_loaded_since = None
+_refreshed_at = 0.0
+_rebuilt_at = 0.0
+
+
+def revoked_key(session_id) -> str:
+    return f"jwt_revoked_{session_id}"
+
+
+def token_session_id(token) -> str:
+    """The id a token is revoked by: its device session, else its own jti"""
+    return str(token.payload.get('device_session_id') or token.payload.get(api_settings.JTI_CLAIM))
+
+
+def max_token_lifetime() -> timedelta:
+    return max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+
+
+def _rebuild(now):
+    from apps.accounts.models import RevokedToken
+    global _filter, _loaded_since, _rebuilt_at
+    live = RevokedToken.objects.filter(expires_at__gt=now)
+    bloom = BloomFilter(max(MIN_CAPACITY, live.count() * 2))
+    for jti in live.values_list('jti', flat=True).iterator():
+        bloom.add(jti)
+    _filter = bloom
+    _loaded_since = now
+    _rebuilt_at = time.monotonic()
+    stats['rebuilds'] += 1
+
+
+def _refresh(now):
+    from apps.accounts.models import RevokedToken
+    global _loaded_since
+    jtis = list(
+        RevokedToken.objects.filter(created_at__gt=_loaded_since - REFRESH_OVERLAP, expires_at__gt=now)
+        .values_list('jti', flat=True)
+    )
+    for jti in jtis:
+        _filter.add(jti)
+    _loaded_since = now
+    stats['refreshes'] += 1
+
+
+def _current_filter() -> BloomFilter:
+    global _refreshed_at
+    elapsed = time.monotonic() - _refreshed_at
+    if _filter is not None and elapsed < settings.REVOCATION_REFRESH_SECONDS:
+        return _filter
+
+    with _lock:
+        if _filter is None or time.monotonic() - _refreshed_at >= settings.REVOCATION_REFRESH_SECONDS:
+            now = timezone.now()
+            try:
+                if (_filter is None or _filter.is_full
+                        or time.monotonic() - _rebuilt_at >= settings.REVOCATION_REBUILD_SECONDS):
+                    # Also drops expired entries
+                    _rebuild(now)
+                else:
+                    _refresh(now)
+                _refreshed_at = time.monotonic()
+            except Exception as e:
+                logger.error(f"Could not load the token denylist: {e}")
+                if _filter is None:
+                    raise
+    return _filter
+
+
+def is_revoked(session_id) -> bool:
+    session_id = str(session_id)
+    if session_id not in _current_filter():
+        stats['fast_path'] += 1
+        return False
+
+    stats['lookups'] += 1
+    key = revoked_key(session_id)
+    try:
+        revoked = cache.get(key)
+    except Exception:
+        revoked = None
+    if revoked is None:
+        from apps.accounts.models import RevokedToken
+        revoked = RevokedToken.objects.filter(jti=session_id, expires_at__gt=timezone.now()).exists()
+        stats['db_lookups'] += 1
+        try:
+            cache.set(key, revoked, NOT_REVOKED_TTL if not revoked else max_token_lifetime().total_seconds())
+        except Exception:
+            pass
+    return revoked
+
+
+def revoke(session_id, expires_at=None, user=None, reason: str = '') -> None:
+    """Denylist a device session (or jti) until expires_at, by default the longest token lifetime from now"""
+    from apps.accounts.models import RevokedToken
+    session_id = str(session_id)
+    expires_at = expires_at or timezone.now() + max_token_lifetime()
+    RevokedToken.objects.get_or_create(
+        jti=session_id,
+        defaults={'user': user, 'reason': reason, 'expires_at': expires_at}
+    )
+
+    def publish():
+        try:
+            ttl = max(1, int((expires_at - timezone.now()).total_seconds()))
+            cache.set(revoked_key(session_id), True, ttl)
+        except Exception as e:
+            # Other processes still find the row once their filter refreshes
+            logger.warning(f"Could not cache revocation of {session_id}: {e}")
+        with _lock:
+            if _filter is not None:
+                _filter.add(session_id)
+
+    transaction.on_commit(publish)
+    logger.info(f"Revoked JWT session {session_id} ({reason})")
+
+
+def revoke_token(token, reason: str = '', user=None) -> None:
+    """Revoke the device session a validated token belongs to"""
+    revoke(token_session_id(token), user=user, reason=reason)
+
+
+def revoke_user_sessions(user, reason: str = '') -> None:
+    """Revoke the user's current device session, if any. The caller saves the user."""
+    if user.current_session_token:
+        revoke(user.current_session_token, user=user, reason=reason)
+        user.current_session_token = None
+
+
+def purge_expired() -> int:
+    from apps.accounts.models import RevokedToken
+    deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def reset() -> None:
+    """Drop this process's filter so the next check reloads it"""
+    global _filter, _refreshed_at
+    with _lock:
+        _filter = None
+        _refreshed_at = 0.0
@@ -0,0 +1,14 @@
+from celery import shared_task
+import logging
+
+from apps.accounts.revocation import purge_expired
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def purge_expired_revocations():
+    """Delete denylist entries whose tokens have expired anyway"""
+    deleted = purge_expired()
+    if deleted:
+        logger.info(f"Purged {deleted} expired token revocations")
+    return deleted
@@ -6,6 +6,7 @@ urlpatterns = [
     path('register/', api_views.RegisterAPIView.as_view(), name='register'),
     path('verify-otp/', api_views.VerifyOTPAPIView.as_view(), name='verify-otp'),
     path('login/', api_views.LoginAPIView.as_view(), name='login'),
+    path('logout/', api_views.LogoutAPIView.as_view(), name='logout'),
     path('resend-otp/', api_views.ResendOTPAPIView.as_view(), name='resend-otp'),
     path('refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     path('profile/', api_views.ProfileAPIView.as_view(), name='profile'),
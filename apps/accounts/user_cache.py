@@ -0,0 +1,135 @@
+"""
+Cached loading of the authenticated user.
+
+Every JWT-authenticated request used to load the full User row. The row's
+identity fields (profile, role, country, is_active, device session...) are now
+kept as a compact snapshot in the default cache and, for a few seconds, in a
+per-process LRU, and the request's User is rebuilt from the snapshot without a
+query.
+
+Fields that must never be served stale are left out of the snapshot and stay
+deferred on the rebuilt User: reading `wallet_balance` (or `password`) loads it
+fresh from the database, and saving the user writes back only what was loaded.
+
+Every User save that touches a snapshot field calls user_changed, which after
+commit replaces the user's version token (user_snapshot_ver_{id}), as
+ZoneLiveStatusService does for zones. Another process may keep serving its local
+copy for up to USER_SNAPSHOT_LOCAL_TTL seconds.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.fields.files import FieldFile
+import logging
+import uuid
+
+from apps.common.cache import CoalescingCache, LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Bump when the snapshot's fields change so old snapshots are not read back
+SNAPSHOT_VERSION = 1
+
+# Read fresh from the database whenever they are used
+UNCACHED_FIELDS = frozenset({'wallet_balance', 'password'})
+
+user_snapshot_cache = CoalescingCache('user_snapshot', ttl=settings.USER_SNAPSHOT_TTL, stale_ttl=30)
+_local_snapshots = LocalLRUCache(maxsize=settings.USER_SNAPSHOT_LOCAL_SIZE, ttl=settings.USER_SNAPSHOT_LOCAL_TTL)
+# A few dozen rows that change about never; admin edits reach other processes within the TTL
+_local_countries = LocalLRUCache(maxsize=256, ttl=300)
+
+
+def snapshot_key(user_id) -> str:
+    return f"user_snapshot_v{SNAPSHOT_VERSION}_{user_id}"
+
+
+def version_key(user_id) -> str:
+    return f"user_snapshot_ver_{user_id}"
+
+
+def _snapshot_fields():
+    from apps.accounts.models import User
+    return [field for field in User._meta.concrete_fields if field.attname not in UNCACHED_FIELDS]
+
+
+def build_snapshot(user_id):
+    """{attname: value} of the user's cached fields, or None if there is no such user"""
+    from apps.accounts.models import User
+    fields = _snapshot_fields()
+    user = User.objects.filter(pk=user_id).only(*[field.attname for field in fields]).first()
+    if user is None:
+        return None
+    snapshot = {}
+    for field in fields:
+        value = getattr(user, field.attname)
+        if isinstance(value, FieldFile):
+            value = value.name
+        snapshot[field.attname] = value
+    return snapshot
+
+
+def get_snapshot(user_id):
+    key = str(user_id)
+    snapshot = _local_snapshots.get(key)
+    if snapshot is None:
+        snapshot = user_snapshot_cache.get_or_compute(
+            snapshot_key(key),
+            lambda: build_snapshot(user_id),
+            version_key=version_key(key)
+        )
+        if snapshot is not None:
+            _local_snapshots.set(key, snapshot)
+    return snapshot
+
+
+def get_country(country_id):
+    from apps.common.models import Country
+    key = str(country_id)
+    country = _local_countries.get(key)
+    if country is None:
+        country = Country.objects.filter(pk=country_id).first()
+        if country is not None:
+            _local_countries.set(key, country)
+    return country
+
+
+def get_cached_user(user_id):
+    """
+    The user as of its last change, without a query when it is cached, or None if
+    there is no such user. UNCACHED_FIELDS are deferred and load on first access.
+    """
+    from apps.accounts.models import User
+    snapshot = get_snapshot(user_id)
+    if snapshot is None:
+        return None
+
+    attnames = [field.attname for field in _snapshot_fields()]
+    user = User.from_db(DEFAULT_DB_ALIAS, attnames, [snapshot[attname] for attname in attnames])
+    if user.country_id is not None:
+        country = get_country(user.country_id)
+        if country is not None:
+            User._meta.get_field('country').set_cached_value(user, country)
+    return user
+
+
+def user_changed(user_id, update_fields=None) -> None:
+    """Drop the user's snapshot once the transaction commits (see User.save)"""
+    if update_fields is not None and not set(update_fields) - UNCACHED_FIELDS:
+        return
+    transaction.on_commit(lambda: invalidate(user_id))
+
+
+def invalidate(user_id) -> None:
+    key = str(user_id)
+    _local_snapshots.delete(key)
+    try:
+        # Outlives any snapshot built under the previous token
+        user_snapshot_cache.cache.set(
+            version_key(key), uuid.uuid4().hex, user_snapshot_cache.ttl + user_snapshot_cache.stale_ttl
+        )
+    except Exception as e:
+        # The snapshot then lives until its TTL
+        logger.warning(f"Could not invalidate cached user {key}: {e}")
+
+
+def country_changed(country_id) -> None:
+    transaction.on_commit(lambda: _local_countries.delete(str(country_id)))
@@ -0,0 +1,60 @@
+"""
+JWT authentication for WebSocket connections.
+
+The mobile apps have no session cookie, so they pass their access token either
+as `?token=<jwt>` in the URL or in an `Authorization: Bearer <jwt>` header. The
+token goes through the same checks as the REST API (DeviceSessionJWTAuthentication),
+including the single-device rule. Connections without a token keep whatever user
+the session middleware found, so the admin dashboard still works.
+"""
+from urllib.parse import parse_qs
+import logging
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from apps.accounts.authentication import DeviceSessionJWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+
+def get_raw_token(scope):
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    if token:
+        return token[0]
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.decode().split()
+            if len(parts) == 2 and parts[0].lower() == 'bearer':
+                return parts[1]
+    return None
+
+
+@database_sync_to_async
+def get_user_for_token(raw_token):
+    authentication = DeviceSessionJWTAuthentication()
+    try:
+        validated_token = authentication.get_validated_token(raw_token)
+        user = authentication.get_user(validated_token)
+        authentication.check_device_session(user, validated_token)
+        return user
+    except (InvalidToken, TokenError, AuthenticationFailed) as e:
+        logger.info(f"Rejected WebSocket token: {e}")
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    async def __call__(self, scope, receive, send):
+        raw_token = get_raw_token(scope)
+        if raw_token:
+            scope = dict(scope, user=await get_user_for_token(raw_token))
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    """Session auth first, then a JWT (if given) takes precedence"""
+    return AuthMiddlewareStack(JWTAuthMiddleware(inner))
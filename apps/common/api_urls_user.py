@@ -16,6 +16,7 @@ urlpatterns = [
     path('auth/register/', accounts_views.RegisterAPIView.as_view(), name='register'),
     path('auth/verify-otp/', accounts_views.VerifyOTPAPIView.as_view(), name='verify-otp'),
     path('auth/login/', accounts_views.LoginAPIView.as_view(), name='login'),
+    path('auth/logout/', accounts_views.LogoutAPIView.as_view(), name='logout'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/resend-otp/', accounts_views.ResendOTPAPIView.as_view(), name='resend-otp'),
     path('auth/change-password/', accounts_views.ChangePasswordAPIView.as_view(), name='change-password'),
@@ -27,14 +28,16 @@ urlpatterns = [
     path('payment-methods/<uuid:pk>/set-default/', payments_views.SetDefaultPaymentMethodAPIView.as_view(), 
          name='set-default-payment-method'),
     path('zones/', parking_views.ZoneListAPIView.as_view(), name='zone-list'),
+    path('zones/nearby/', parking_views.ZoneNearbyAPIView.as_view(), name='zone-nearby'),
     path('zones/<uuid:pk>/', parking_views.ZoneDetailAPIView.as_view(), name='zone-detail'),
-    path('zones/<int:zone_id>/availability/', parking_views.ZoneAvailabilityAPIView.as_view(), name='zone-availability'),
+    path('zones/<uuid:zone_id>/availability/', parking_views.ZoneAvailabilityAPIView.as_view(), name='zone-availability'),
     path('parking/start/', parking_views.StartParkingAPIView.as_view(), name='start-parking'),
     path('parking/end/', parking_views.EndParkingAPIView.as_view(), name='end-parking'),
     path('parking/extend/', parking_views.ExtendParkingAPIView.as_view(), name='extend-parking'),
     path('parking/cancel/', parking_views.CancelParkingSessionAPIView.as_view(), name='cancel-parking'),
     path('parking/sessions/', parking_views.UserParkingSessionsAPIView.as_view(), name='parking-sessions'),
     path('reservations/create/', parking_views.CreateReservationAPIView.as_view(), name='create-reservation'),
+    path('reservations/search/', parking_views.ReservationSearchAPIView.as_view(), name='reservation-search'),
     path('reservations/', parking_views.UserReservationsAPIView.as_view(), name='reservations'),
     path('reservations/<uuid:reservation_id>/cancel/', parking_views.CancelReservationAPIView.as_view(), 
          name='cancel-reservation'),
@@ -0,0 +1,213 @@
+"""
+Single-flight, stale-while-revalidate caching on top of the CACHES aliases.
+
+Values are stored in an envelope with the time they stop being fresh. On a miss
+(or once the value is stale) only the worker that wins a short cache.add() lock
+recomputes; the others are served the stale value, or, when there is none yet,
+wait briefly for the winner's result instead of all hitting the database.
+
+Hit/miss/stale/coalesce counters are kept per process and flushed to the cache
+every few seconds; `manage.py cache_stats` shows the totals.
+
+LocalLRUCache is a small in-process cache for values read on nearly every
+request, in front of a shared one.
+"""
+from collections import Counter, OrderedDict
+from django.core.cache import caches
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY_PREFIX = 'cache_stats'
+STATS_EVENTS = ('hit', 'miss', 'stale', 'coalesced')
+STATS_FLUSH_SECONDS = 10
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_stats_flushed_at = time.monotonic()
+
+
+def _record(name: str, event: str) -> None:
+    with _stats_lock:
+        _stats[(name, event)] += 1
+        due = time.monotonic() - _stats_flushed_at >= STATS_FLUSH_SECONDS
+    if due:
+        flush_stats()
+
+
+def flush_stats() -> None:
+    """Add this process's counters to the shared totals"""
+    global _stats_flushed_at
+    with _stats_lock:
+        pending = dict(_stats)
+        _stats.clear()
+        _stats_flushed_at = time.monotonic()
+
+    stats_cache = caches['default']
+    for (cache_name, cache_event), count in pending.items():
+        key = f"{STATS_KEY_PREFIX}:{cache_name}:{cache_event}"
+        try:
+            stats_cache.add(key, 0, None)
+            stats_cache.incr(key, count)
+        except Exception:
+            pass
+
+
+def cache_stats(names) -> dict:
+    """Flushed counters per cache name: {name: {event: count}}"""
+    stats_cache = caches['default']
+    keys = {
+        f"{STATS_KEY_PREFIX}:{name}:{event}": (name, event)
+        for name in names for event in STATS_EVENTS
+    }
+    values = stats_cache.get_many(list(keys))
+    result = {name: dict.fromkeys(STATS_EVENTS, 0) for name in names}
+    for key, (name, event) in keys.items():
+        result[name][event] = values.get(key, 0)
+    return result
+
+
+class CoalescingCache:
+    """
+    A named cache area, e.g. CoalescingCache('zone_live', ttl=300, stale_ttl=30).
+
+    get_or_compute(key, compute) returns the cached value of key, calling
+    compute() in at most one worker at a time. A value stays fresh for ttl
+    seconds and is then served stale for up to stale_ttl more while one worker
+    revalidates it. If version_key is given, the value is only fresh while it
+    was computed under the version stored there (see ZoneLiveStatusService).
+    compute() returning None is not cached.
+    """
+
+    def __init__(self, name: str, ttl: int, stale_ttl: int = 30, alias: str = 'default',
+                 lock_timeout: int = 10, wait_timeout: float = 2.0, poll_interval: float = 0.05):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.alias = alias
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _read(self, key, version_key=None) -> tuple:
+        """(envelope or None, current version)"""
+        keys = [key, version_key] if version_key else [key]
+        try:
+            values = self.cache.get_many(keys)
+        except Exception as e:
+            logger.warning(f"Cache read failed for {key}: {e}")
+            return None, None
+        return values.get(key), values.get(version_key) if version_key else None
+
+    @staticmethod
+    def _is_fresh(envelope, version) -> bool:
+        return envelope['version'] == version and time.time() < envelope['fresh_until']
+
+    def _compute_and_store(self, key, compute, version):
+        value = compute()
+        if value is not None:
+            envelope = {'value': value, 'version': version, 'fresh_until': time.time() + self.ttl}
+            try:
+                self.cache.set(key, envelope, self.ttl + self.stale_ttl)
+            except Exception as e:
+                logger.warning(f"Cache write failed for {key}: {e}")
+        return value
+
+    def get_or_compute(self, key, compute, version_key=None):
+        lock_key = f"{key}:lock"
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while True:
+            envelope, version = self._read(key, version_key)
+            if envelope is not None and self._is_fresh(envelope, version):
+                _record(self.name, 'coalesced' if waited else 'hit')
+                return envelope['value']
+
+            token = uuid.uuid4().hex
+            try:
+                acquired = self.cache.add(lock_key, token, self.lock_timeout)
+            except Exception:
+                # Cache unavailable: fall back to computing every time
+                _record(self.name, 'miss')
+                return compute()
+
+            if acquired:
+                _record(self.name, 'miss')
+                try:
+                    return self._compute_and_store(key, compute, version)
+                finally:
+                    try:
+                        if self.cache.get(lock_key) == token:
+                            self.cache.delete(lock_key)
+                    except Exception:
+                        pass
+
+            # Someone else is recomputing
+            if envelope is not None:
+                _record(self.name, 'stale')
+                return envelope['value']
+            if time.monotonic() >= deadline:
+                # The winner is taking too long; don't keep the request waiting
+                _record(self.name, 'miss')
+                return compute()
+            waited = True
+            time.sleep(self.poll_interval)
+
+    def delete(self, key) -> None:
+        try:
+            self.cache.delete(key)
+        except Exception:
+            pass
+
+
+_MISSING = object()
+
+
+class LocalLRUCache:
+    """
+    Small per-process cache: at most maxsize entries, each kept for ttl seconds.
+
+    For values read on nearly every request (e.g. the authenticated user) where a
+    shared-cache round trip is the main cost. Other processes don't see delete(),
+    so a change can take up to ttl seconds to reach them; keep ttl short.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,127 @@
+"""
+Idempotency keys for mutating API endpoints.
+
+A client that may retry a request (e.g. the mobile apps on a flaky network)
+sends the same `Idempotency-Key` header with every attempt. The first attempt
+runs the view and its response is stored for IDEMPOTENCY_TTL seconds under the
+key, scoped to the endpoint and the user. Later attempts get the stored response
+back, marked `Idempotent-Replayed: true`, without running the view or touching
+the database. An attempt that arrives while the first is still running waits for
+its response; one that reuses a key for a different request body gets 422.
+
+Server errors (5xx) are not stored, so the client can retry them. Requests
+without the header are handled as before.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from functools import wraps
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+
+
+def fingerprint(request) -> str:
+    """Hash of what makes two requests the same request"""
+    if hasattr(request.data, 'lists'):
+        # Form data: keep repeated fields
+        data = {key: values for key, values in request.data.lists()}
+    else:
+        data = request.data
+    files = sorted((name, f.name, f.size) for name, f in request.FILES.items())
+    payload = json.dumps([request.method, request.path, data, files], sort_keys=True, cls=JSONEncoder, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def idempotency_cache_key(scope: str, request, key: str) -> str:
+    user_id = request.user.pk if request.user.is_authenticated else 'anonymous'
+    key_hash = hashlib.sha256(key.encode()).hexdigest()
+    return f"idempotency:{scope}:{user_id}:{key_hash}"
+
+
+def idempotent(scope: str):
+    """
+    Make an APIView handler (post, create...) honour Idempotency-Key. Put it
+    outside @transaction.atomic so the response is only stored once committed.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.META.get(HEADER)
+            if not key:
+                return handler(view, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            cache_key = idempotency_cache_key(scope, request, key)
+            request_fingerprint = fingerprint(request)
+            deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+            while True:
+                try:
+                    if cache.add(
+                        cache_key,
+                        {'state': IN_FLIGHT, 'fingerprint': request_fingerprint},
+                        settings.IDEMPOTENCY_LOCK_TIMEOUT
+                    ):
+                        break
+                    entry = cache.get(cache_key)
+                except Exception as e:
+                    # Without the cache, run the request as if no key had been sent
+                    logger.warning(f"Idempotency cache unavailable: {e}")
+                    return handler(view, request, *args, **kwargs)
+
+                if entry is None:
+                    # The first attempt failed and released the key: this one runs
+                    continue
+                if entry['fingerprint'] != request_fingerprint:
+                    return Response(
+                        {'error': 'Idempotency-Key was already used for a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                if entry['state'] == DONE:
+                    return Response(entry['data'], status=entry['status'], headers={'Idempotent-Replayed': 'true'})
+                if time.monotonic() >= deadline:
+                    return Response(
+                        {'error': 'A request with this Idempotency-Key is still being processed'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                time.sleep(POLL_INTERVAL)
+
+            try:
+                response = handler(view, request, *args, **kwargs)
+            except Exception:
+                cache.delete(cache_key)
+                raise
+
+            if response.status_code >= 500 or not isinstance(response, Response):
+                cache.delete(cache_key)
+                return response
+            entry = {
+                'state': DONE,
+                'fingerprint': request_fingerprint,
+                'status': response.status_code,
+                # Plain JSON types, so a replay needs no serializer or model
+                'data': json.loads(json.dumps(response.data, cls=JSONEncoder)),
+            }
+            try:
+                cache.set(cache_key, entry, settings.IDEMPOTENCY_TTL)
+            except Exception as e:
+                logger.warning(f"Could not store idempotent response for {scope}: {e}")
+            return response
+        return wrapper
+    return decorator
+
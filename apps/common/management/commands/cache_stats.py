@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.common.cache import CoalescingCache, cache_stats, flush_stats
+
+DEFAULT_CACHES = ('zone_live', 'vehicle_plate', 'zone_list', 'user_snapshot', 'pesapal_token', 'pesapal_ipn', 'gateway_config')
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss/stale/coalesced counters of the coalescing caches, optionally after a thundering-herd test'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', default=list(DEFAULT_CACHES), help='Cache names to report')
+        parser.add_argument('--herd', type=int, default=0, help='Simulate this many concurrent misses on one key first')
+
+    def handle(self, *args, **options):
+        names = list(options['names'])
+        if options['herd']:
+            self._herd(options['herd'])
+            names.append('herd_test')
+
+        flush_stats()
+        for name, counters in cache_stats(names).items():
+            total = sum(counters.values())
+            served = total - counters['miss']
+            ratio = f"{served * 100 / total:.1f}% served from cache" if total else "no traffic"
+            self.stdout.write(
+                f"{name}: {counters['hit']} hits, {counters['miss']} misses, "
+                f"{counters['stale']} stale, {counters['coalesced']} coalesced ({ratio})"
+            )
+
+    def _herd(self, requests):
+        """Fire concurrent requests at a cold key with a slow recompute; only one should compute"""
+        herd_cache = CoalescingCache('herd_test', ttl=5)
+        key = f"herd_test_{time.time()}"
+        computes = []
+        lock = threading.Lock()
+
+        def compute():
+            with lock:
+                computes.append(1)
+            time.sleep(0.3)
+            return {'computed_at': time.time()}
+
+        self.stdout.write(f"Sending {requests} concurrent requests to a cold key...")
+        with ThreadPoolExecutor(max_workers=requests) as pool:
+            results = list(pool.map(lambda _: herd_cache.get_or_compute(key, compute), range(requests)))
+        herd_cache.delete(key)
+
+        if len(computes) == 1 and all(result == results[0] for result in results):
+            self.stdout.write(self.style.SUCCESS(f"SUCCESS: {requests} requests, 1 recompute"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: {requests} requests, {len(computes)} recomputes"))
@@ -0,0 +1,40 @@
+"""
+Base for the test_* and benchmark_* management commands.
+
+They create their own fixtures, exercise the services and the API through the
+test client, and delete the fixtures again, all in the configured database.
+HarnessCommand refuses to run them unless DEBUG is on or that database is a
+test database, and runs them in Django's test environment, where the test
+client's 'testserver' host is allowed.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.base.creation import TEST_DATABASE_PREFIX
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+def is_scratch_database() -> bool:
+    """DEBUG is on, or the default database is a test database"""
+    name = str(connection.settings_dict['NAME'])
+    return settings.DEBUG or name.startswith(TEST_DATABASE_PREFIX) or name == ':memory:' or 'mode=memory' in name
+
+
+class HarnessCommand(BaseCommand):
+    """A command that only runs against a scratch database, in the test environment"""
+
+    def execute(self, *args, **options):
+        if not is_scratch_database():
+            raise CommandError(
+                f"{self.__module__.rsplit('.', 1)[-1]} writes and deletes rows in the "
+                f"'{connection.settings_dict['NAME']}' database; run it with DEBUG on or against a test database"
+            )
+        try:
+            setup_test_environment()
+        except RuntimeError:
+            # Already inside the test runner's environment
+            return super().execute(*args, **options)
+        try:
+            return super().execute(*args, **options)
+        finally:
+            teardown_test_environment()
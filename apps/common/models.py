@@ -27,6 +27,12 @@ class Country(BaseModel):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        from apps.accounts.user_cache import country_changed
+        country_changed(self.id)
+
 import threading
 
 _thread_locals = threading.local()
@@ -14,6 +14,7 @@ from apps.common.constants import UserRole, CURRENCY_SYMBOLS, DEFAULT_CURRENCY,
 from apps.common.models import SystemConfiguration
 from apps.accounts.models import User, Vehicle
 from apps.parking.models import Zone, ParkingSlot, ParkingSession, Reservation
+from apps.parking.services.occupancy_service import OccupancyService
 from apps.payments.models import Transaction, PaymentMethod, Refund, Invoice, WalletTransaction, PaymentGatewayConfig
 from apps.enforcement.models import Violation, OfficerLog, OfficerStatus, QRCodeScan
 from apps.rewards.models import LoyaltyAccount, PointTransaction
@@ -56,16 +57,15 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             revenue_labels.append(date.strftime('%m/%d'))
         
         # Zone occupancy data
-        zones = Zone.objects.filter(is_active=True)
+        zones = Zone.objects.filter(is_active=True).select_related('occupancy')
         occupancy_labels = []
         occupancy_data = []
         
         for zone in zones[:5]:  # Top 5 zones
-            total_slots = zone.slots.count()
-            if total_slots > 0:
-                occupied = zone.slots.filter(status='occupied').count()
+            occupancy = zone.get_occupancy()
+            if occupancy.slots_total > 0:
                 occupancy_labels.append(zone.name)
-                occupancy_data.append(occupied)
+                occupancy_data.append(occupancy.slots_occupied)
         
         context.update({
             'total_users': User.objects.count(),
@@ -231,7 +231,7 @@ class ZoneListView(AdminRequiredMixin, ListView):
     paginate_by = 20
     
     def get_queryset(self):
-        return Zone.objects.select_related().prefetch_related('slots').all().order_by('-created_at')
+        return Zone.objects.select_related('occupancy').prefetch_related('slots').all().order_by('-created_at')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -346,14 +346,13 @@ class ZoneMapView(AdminRequiredMixin, TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        zones = Zone.objects.filter(is_active=True)
+        zones = Zone.objects.filter(is_active=True).select_related('occupancy')
         
         # Add real occupancy data for each zone
         zones_data = []
         for zone in zones:
-            active_sessions = ParkingSession.objects.filter(zone=zone, status=ParkingStatus.ACTIVE)
-            total_slots = zone.slots.count() or 50
-            occupied_slots = active_sessions.count()
+            total_slots = zone.total_slots_count or 50
+            occupied_slots = zone.active_sessions_count
             
             zones_data.append({
                 'id': str(zone.id),
@@ -407,9 +406,10 @@ class ZoneUpdateView(AdminRequiredMixin, UpdateView):
             messages.success(self.request, _('Added %(count)d new parking slots!') % {'count': new_total - old_total})
         elif new_total < old_total:
             # Remove excess slots (only if they're available)
-            excess_slots = zone.slots.filter(status='available').order_by('-created_at')[:old_total - new_total]
-            deleted_count = excess_slots.count()
-            excess_slots.delete()
+            excess_ids = list(zone.slots.filter(status='available').order_by('-created_at').values_list('id', flat=True)[:old_total - new_total])
+            deleted_count = ParkingSlot.objects.filter(id__in=excess_ids).delete()[0]
+            # Queryset deletes bypass ParkingSlot.delete(), so re-count the zone
+            OccupancyService.rebuild(zone.id)
             messages.warning(self.request, _('Removed %(count)d available parking slots.') % {'count': deleted_count})
         
         return response
@@ -957,6 +957,7 @@ class SlotDeleteAllAjaxView(AdminRequiredMixin, View):
             zone = Zone.objects.get(pk=zone_id)
             # Delete only available slots, keep occupied ones
             deleted_count = zone.slots.filter(status='available').delete()[0]
+            OccupancyService.rebuild(zone.id)
             return JsonResponse({'success': True, 'deleted_count': deleted_count})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
@@ -8,9 +8,12 @@ from django.shortcuts import get_object_or_404
 from django.db.models import Q
 from .serializers import ZoneSerializer, VehicleDetailSerializer, ViolationSerializer, ParkingSlotSerializer, OfficerLogSerializer
 from .models import Violation
-from apps.parking.models import Zone, ParkingSession
+from apps.parking.models import Zone
 from apps.accounts.models import Vehicle
-from django.core.cache import cache
+from apps.common.cache import CoalescingCache
+from apps.common.idempotency import idempotent
+
+vehicle_plate_cache = CoalescingCache('vehicle_plate', ttl=60, stale_ttl=30)
 
 class OfficerZoneListView(generics.ListAPIView):
     serializer_class = ZoneSerializer
@@ -18,12 +21,22 @@ class OfficerZoneListView(generics.ListAPIView):
     
     def get_queryset(self):
         # For now, return all active zones. In production, filter by officer assignment
-        return Zone.objects.filter(is_active=True)
+        return Zone.objects.filter(is_active=True).select_related('occupancy')
+
+    def list(self, request, *args, **kwargs):
+        from apps.parking.services.zone_search_service import ZoneSearchService, zone_list_cache, ZONE_LIST_VERSION_KEY
+
+        data = zone_list_cache.get_or_compute(
+            ZoneSearchService.zone_list_key('officer_zones', request),
+            lambda: super(OfficerZoneListView, self).list(request, *args, **kwargs).data,
+            version_key=ZONE_LIST_VERSION_KEY
+        )
+        return Response(data)
 
 class ZoneDetailView(generics.RetrieveAPIView):
     serializer_class = ZoneSerializer
     permission_classes = [IsAuthenticated]
-    queryset = Zone.objects.filter(is_active=True)
+    queryset = Zone.objects.filter(is_active=True).select_related('occupancy')
 
 class ZoneSlotsView(generics.ListAPIView):
     serializer_class = ParkingSlotSerializer
@@ -39,87 +52,34 @@ def search_vehicle(request):
     plate = request.GET.get('plate', '').strip()
     if not plate:
         return Response({'error': 'License plate required'}, status=status.HTTP_400_BAD_REQUEST)
-    cache_key = f"vehicle_plate_{plate.lower()}"
-    cached = cache.get(cache_key)
-    if cached:
-        return Response(cached)
 
-    try:
-        vehicle = Vehicle.objects.get(license_plate__iexact=plate)
-        serializer = VehicleDetailSerializer(vehicle)
-        data = serializer.data
-        try:
-            cache.set(cache_key, data, 60)
-        except Exception:
-            pass
-        return Response(data)
-    except Vehicle.DoesNotExist:
+    def lookup():
+        vehicle = Vehicle.objects.filter(license_plate__iexact=plate).first()
+        return VehicleDetailSerializer(vehicle).data if vehicle else None
+
+    data = vehicle_plate_cache.get_or_compute(f"vehicle_plate_{plate.lower()}", lookup)
+    if data is None:
         return Response({'error': 'Vehicle not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(data)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def zone_live_status(request, zone_id):
-    from django.utils import timezone
+    from apps.parking.services.zone_live_service import ZoneLiveStatusService
     zone = get_object_or_404(Zone, id=zone_id)
-
-    cache_key = f"zone_live_{zone_id}"
-    cached = cache.get(cache_key)
-    if cached:
-        return Response(cached)
-
-    # Get active sessions
-    active_sessions = ParkingSession.objects.filter(
-        zone=zone,
-        status='active'
-    ).select_related('vehicle', 'parking_slot')
-
-    # Get zone stats
-    total_slots = zone.slots.count() or 50
-    occupied_slots = active_sessions.count()
-
-    sessions_data = []
-    now = timezone.now()
-    for session in active_sessions:
-        # Calculate remaining time
-        remaining_seconds = (session.planned_end_time - now).total_seconds()
-        remaining_seconds = max(0, remaining_seconds)
-        remaining_minutes = int(remaining_seconds / 60)
-
-        sessions_data.append({
-            'id': str(session.id),
-            'vehicle_plate': session.vehicle.license_plate,
-            'slot_code': session.parking_slot.slot_code if session.parking_slot else None,
-            'start_time': session.start_time.isoformat(),
-            'planned_end_time': session.planned_end_time.isoformat(),
-            'duration_minutes': session.duration_minutes,
-            'remaining_minutes': remaining_minutes,
-            'estimated_cost': float(session.estimated_cost)
-        })
-
-    result = {
-        'zone_id': str(zone.id),
-        'zone_name': zone.name,
-        'total_slots': total_slots,
-        'occupied_slots': occupied_slots,
-        'available_slots': total_slots - occupied_slots,
-        'occupancy_rate': (occupied_slots * 100) // total_slots if total_slots > 0 else 0,
-        'active_sessions': sessions_data
-    }
-
-    try:
-        cache.set(cache_key, result, 10)
-    except Exception:
-        pass
-
-    return Response(result)
+    return Response(ZoneLiveStatusService.live_status(zone))
 
 class CreateViolationView(generics.CreateAPIView):
     serializer_class = ViolationSerializer
     permission_classes = [IsAuthenticated]
     
+    @idempotent('violation_create')
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
     @transaction.atomic
     def perform_create(self, serializer):
-        from apps.payments.models import WalletTransaction
+        from apps.payments.wallet_service import WalletService
         
         # Infer zone from officer status if not provided and not in session
         zone = serializer.validated_data.get('zone')
@@ -138,20 +98,11 @@ class CreateViolationView(generics.CreateAPIView):
         violation = serializer.save(officer=officer, zone=zone)
         
         # Auto-deduct fine from wallet (allowing negative balance)
-        user = violation.vehicle.user
-        fine_amount = violation.fine_amount
-        
-        # Deduct amount
-        user.wallet_balance -= fine_amount
-        user.save(update_fields=['wallet_balance'])
-        
-        # Log transaction
-        WalletTransaction.objects.create(
-            user=user,
-            amount=-fine_amount,
-            transaction_type='fine_payment',
-            status='completed',
-            description=f"Fine for violation: {violation.get_violation_type_display()}",
+        WalletService.debit(
+            violation.vehicle.user,
+            violation.fine_amount,
+            'fine_payment',
+            f"Fine for violation: {violation.get_violation_type_display()}",
             metadata={
                 'violation_id': str(violation.id),
                 'vehicle_plate': violation.vehicle.license_plate
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('enforcement', '0008_officerlog_enf_log_cr_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='violation',
+            name='officer',
+            field=models.ForeignKey(blank=True, help_text='Empty for system generated violations', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='issued_violations', to=settings.AUTH_USER_MODEL, verbose_name='Officer'),
+        ),
+    ]
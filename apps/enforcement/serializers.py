@@ -15,10 +15,10 @@ class ZoneSerializer(serializers.ModelSerializer):
                  'radius_meters', 'is_active', 'active_sessions_count', 'total_capacity', 'occupancy_rate')
     
     def get_active_sessions_count(self, obj):
-        return ParkingSession.objects.filter(zone=obj, status='active').count()
+        return obj.active_sessions_count
     
     def get_total_capacity(self, obj):
-        return obj.slots.count() or 50
+        return obj.total_slots_count
     
     def get_occupancy_rate(self, obj):
         total = self.get_total_capacity(obj)
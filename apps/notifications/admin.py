@@ -1,17 +1,19 @@
 from django.contrib import admin
-from .models import NotificationEvent, ChatConversation, ChatMessage
+from django.utils import timezone
+from . import counters
+from .models import NotificationEvent, NotificationCampaign, ChatConversation, ChatMessage
 
 @admin.register(NotificationEvent)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ('user', 'title', 'type', 'priority', 'is_read', 'sent_via_push', 'created_at')
+    list_display = ('user', 'title', 'type', 'priority', 'read_state', 'sent_via_push', 'created_at')
     list_filter = ('type', 'category', 'priority', 'is_read', 'is_promotional', 'sent_via_push', 'created_at')
     search_fields = ('user__phone', 'user__first_name', 'user__last_name', 'title', 'message')
-    readonly_fields = ('created_at', 'updated_at', 'push_sent_at')
+    readonly_fields = ('created_at', 'updated_at', 'push_sent_at', 'marked_unread_at')
     ordering = ('-created_at',)
     
     fieldsets = (
         (None, {'fields': ('user', 'title', 'message')}),
-        ('Details', {'fields': ('type', 'category', 'priority', 'is_read', 'metadata')}),
+        ('Details', {'fields': ('type', 'category', 'priority', 'is_read', 'marked_unread_at', 'metadata')}),
         ('Admin Options', {'fields': ('show_as_dialog', 'is_promotional')}),
         ('Push Notification', {'fields': ('sent_via_push', 'push_sent_at', 'push_error')}),
         ('Timestamps', {'fields': ('created_at', 'updated_at')}),
@@ -19,13 +21,34 @@ class NotificationAdmin(admin.ModelAdmin):
     
     actions = ['mark_as_read', 'mark_as_unread', 'send_push_notification']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_read_watermark()
+    
+    @admin.display(boolean=True, description='Read')
+    def read_state(self, obj):
+        # is_read or the user's mark-all watermark
+        return obj.read_state
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            # The read flag or category may have changed
+            counters.notifications_changed([obj.user_id])
+    
+    def delete_queryset(self, request, queryset):
+        # Bulk delete skips NotificationEvent.delete
+        counters.notifications_changed(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+    
     def mark_as_read(self, request, queryset):
         count = queryset.update(is_read=True)
+        counters.notifications_changed(queryset.values_list('user_id', flat=True))
         self.message_user(request, f'{count} notification(s) marked as read')
     mark_as_read.short_description = 'Mark selected as read'
     
     def mark_as_unread(self, request, queryset):
-        count = queryset.update(is_read=False)
+        count = queryset.update(is_read=False, marked_unread_at=timezone.now())
+        counters.notifications_changed(queryset.values_list('user_id', flat=True))
         self.message_user(request, f'{count} notification(s) marked as unread')
     mark_as_unread.short_description = 'Mark selected as unread'
     
@@ -69,6 +92,22 @@ class NotificationAdmin(admin.ModelAdmin):
     send_push_notification.short_description = 'Send push notification to users'
 
 
+@admin.register(NotificationCampaign)
+class NotificationCampaignAdmin(admin.ModelAdmin):
+    list_display = ('title', 'audience', 'status', 'processed', 'total_users', 'pushed', 'push_failed', 'created_at')
+    list_filter = ('status', 'audience', 'category', 'created_at')
+    search_fields = ('title', 'message')
+    readonly_fields = (
+        'status', 'total_users', 'cursor', 'processed', 'chunks', 'delivered_realtime', 'pushed',
+        'push_failed', 'no_token', 'started_at', 'finished_at', 'error', 'created_at', 'updated_at'
+    )
+    ordering = ('-created_at',)
+    
+    def has_add_permission(self, request):
+        # Campaigns are started through the API, which queues their task
+        return False
+
+
 @admin.register(ChatConversation)
 class ChatConversationAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'assigned_agent', 'status', 'priority', 'created_at')
@@ -130,5 +169,10 @@ class ChatMessageAdmin(admin.ModelAdmin):
     def mark_as_read(self, request, queryset):
         from django.utils import timezone
         count = queryset.update(is_read=True, read_at=timezone.now())
+        conversations = ChatConversation.objects.filter(id__in=queryset.values('conversation_id'))
+        counters.invalidate_chat(
+            user_ids={user_id for parties in conversations.values_list('user_id', 'assigned_agent_id') for user_id in parties},
+            conversation_ids=conversations.values_list('id', flat=True)
+        )
         self.message_user(request, f'{count} message(s) marked as read')
     mark_as_read.short_description = 'Mark as Read'
@@ -4,12 +4,14 @@ API Views for Notifications
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.generics import ListAPIView, UpdateAPIView
+from rest_framework.generics import ListAPIView, RetrieveAPIView, UpdateAPIView
 from django.db.models import Q
-from apps.notifications.models import NotificationEvent, UserPreferences
+from django.utils import timezone
+from apps.notifications.counters import all_read, notification_counts, read_changed
+from apps.notifications.models import NotificationEvent, NotificationCampaign, NotificationReadMark, UserPreferences
 from apps.notifications.serializers import (
     NotificationSerializer, NotificationListSerializer, NotificationSummarySerializer,
-    UserPreferencesSerializer, MarkNotificationAsReadSerializer
+    UserPreferencesSerializer, MarkNotificationAsReadSerializer, NotificationCampaignSerializer
 )
 
 
@@ -20,7 +22,7 @@ class NotificationListAPIView(ListAPIView):
     
     def get_queryset(self):
         user = self.request.user
-        queryset = NotificationEvent.objects.filter(user=user)
+        queryset = NotificationEvent.objects.filter(user=user).with_read_watermark()
         
         # Filter by category if provided
         category = self.request.query_params.get('category')
@@ -30,9 +32,9 @@ class NotificationListAPIView(ListAPIView):
         # Filter by read status if provided
         read_status = self.request.query_params.get('read')
         if read_status == 'true':
-            queryset = queryset.filter(is_read=True)
+            queryset = queryset.read()
         elif read_status == 'false':
-            queryset = queryset.filter(is_read=False)
+            queryset = queryset.unread()
         
         return queryset.order_by('-created_at')
 
@@ -43,7 +45,7 @@ class NotificationDetailAPIView(UpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return NotificationEvent.objects.filter(user=self.request.user)
+        return NotificationEvent.objects.filter(user=self.request.user).with_read_watermark()
     
     def put(self, request, pk=None):
         """Mark notification as read"""
@@ -67,8 +69,13 @@ class NotificationDetailAPIView(UpdateAPIView):
                 )
             else:
                 # If they want to mark as unread (unlikely in this context but supported by serializer)
+                # marked_unread_at keeps it unread below an earlier mark-all watermark
+                was_read = notification.read_state
                 notification.is_read = False
+                notification.marked_unread_at = timezone.now()
                 notification.save()
+                if was_read:
+                    read_changed(notification.user_id, False)
                 return Response(
                     NotificationSerializer(notification).data,
                     status=status.HTTP_200_OK
@@ -87,19 +94,18 @@ class NotificationSummaryAPIView(APIView):
 
 
 class MarkAllNotificationsAsReadAPIView(APIView):
-    """Mark all notifications as read for current user"""
+    """Mark all notifications as read for current user (moves their read watermark, rows are not touched)"""
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
         user = request.user
-        count = NotificationEvent.objects.filter(
-            user=user,
-            is_read=False
-        ).delete()
+        count = notification_counts(user.id)['unread']
+        NotificationReadMark.mark_all_read(user.id)
+        all_read(user.id)
         
         return Response({
             'success': True,
-            'message': f'{count[0] if isinstance(count, tuple) else count} notifications deleted'
+            'message': f'{count} notifications marked as read'
         })
 
 
@@ -189,31 +195,39 @@ class BulkCreateNotificationsAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        from apps.accounts.models import User
-        
-        if user_filter == 'all':
-            users = User.objects.all()
-        elif user_filter == 'active':
-            users = User.objects.filter(is_active=True)
-        else:
-            users = User.objects.filter(is_active=True)
-        
-        created_count = 0
-        for user in users:
-            NotificationEvent.objects.create(
-                user=user,
-                title=title,
-                message=message,
-                type=notification_type,
-                category=category,
-            )
-            created_count += 1
+        from apps.notifications.campaign_service import CampaignService
+        
+        # Created by a Celery task in chunks; progress at campaigns/<id>/
+        campaign = CampaignService.start(
+            created_by=request.user,
+            title=title,
+            message=message,
+            type=notification_type,
+            category=category,
+            send_push=False,
+            audience='all' if user_filter == 'all' else 'active',
+        )
         
         return Response({
             'success': True,
-            'created_count': created_count,
-            'message': f'Created {created_count} notifications'
-        })
+            'campaign_id': str(campaign.id),
+            'status': campaign.status,
+            'message': 'Creating notifications in the background'
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class NotificationCampaignListAPIView(ListAPIView):
+    """Admin notification campaigns, newest first"""
+    serializer_class = NotificationCampaignSerializer
+    permission_classes = [permissions.IsAdminUser]
+    queryset = NotificationCampaign.objects.all()
+
+
+class NotificationCampaignDetailAPIView(RetrieveAPIView):
+    """Progress and throughput of an admin notification campaign"""
+    serializer_class = NotificationCampaignSerializer
+    permission_classes = [permissions.IsAdminUser]
+    queryset = NotificationCampaign.objects.all()
 
 
 class SendOTPAPIView(APIView):
@@ -305,7 +319,7 @@ class SendCustomNotificationAPIView(APIView):
     def post(self, request):
         from apps.notifications.serializers import SendCustomNotificationSerializer
         from apps.notifications.notification_triggers import notify_custom
-        from apps.notifications.firebase_service import send_notification_to_multiple_users
+        from apps.notifications.campaign_service import CampaignService
         from apps.accounts.models import User
         
         serializer = SendCustomNotificationSerializer(data=request.data)
@@ -318,42 +332,50 @@ class SendCustomNotificationAPIView(APIView):
         category = data.get('category', 'system')
         custom_data = data.get('data', {})
         
-        # Determine target users
-        target_users = []
-        
+        # Single user: one outbox row, sent right away
         if data.get('user_id'):
-            # Single user
             try:
                 user = User.objects.get(id=data['user_id'])
-                target_users = [user]
             except User.DoesNotExist:
                 return Response(
                     {'error': 'User not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
-        
-        elif data.get('user_ids'):
-            # Multiple specific users
+            notify_custom(user, title, message, category, custom_data)
+            return Response({
+                'success': True,
+                'sent_count': 1,
+                'message': 'Sent 1 notification'
+            }, status=status.HTTP_200_OK)
+        
+        # Many users: a campaign sent by a Celery task in chunks
+        if data.get('user_ids'):
+            audience = {'audience': 'users', 'user_ids': [str(user_id) for user_id in data['user_ids']]}
             target_users = User.objects.filter(id__in=data['user_ids'])
-        
-        elif data.get('role'):
-            # All users with specific role
+        else:
+            audience = {'audience': 'role', 'role': data['role']}
             target_users = User.objects.filter(role=data['role'], is_active=True)
         
-        if not target_users:
+        if not target_users.exists():
             return Response(
                 {'error': 'No target users found'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Send notifications
-        sent_count = 0
-        for user in target_users:
-            notify_custom(user, title, message, category, custom_data)
-            sent_count += 1
+        campaign = CampaignService.start(
+            created_by=request.user,
+            title=title,
+            message=message,
+            type='other',
+            category=category,
+            metadata=custom_data or {},
+            push_data={'type': 'custom', **(custom_data or {})},
+            **audience
+        )
         
         return Response({
             'success': True,
-            'sent_count': sent_count,
-            'message': f'Sent {sent_count} notifications'
-        }, status=status.HTTP_200_OK)
+            'campaign_id': str(campaign.id),
+            'status': campaign.status,
+            'message': 'Sending notifications in the background'
+        }, status=status.HTTP_202_ACCEPTED)
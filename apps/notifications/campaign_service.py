@@ -0,0 +1,134 @@
+"""
+Chunked admin notification campaigns.
+
+The bulk-create and send-custom admin endpoints looped over every target user
+inside the request, creating one NotificationEvent and queuing one push each,
+and timed out on a large user base. They now record a NotificationCampaign
+and return its id; run_campaign_task does the work on a Celery worker.
+
+- Users are taken in id order, NOTIFICATION_CAMPAIGN_CHUNK_SIZE at a time, from
+  the campaign's cursor (the last user done), which is advanced under a lock
+  on the campaign row, so a redelivered task never repeats a chunk.
+- Each chunk's NotificationEvents are made with one bulk_create. Connected
+  users get theirs over the WebSocket, the rest are sent in FCM batches by the
+  push dispatcher with the device tokens read along with the chunk. FCM
+  topics are not used: devices are not subscribed to any, and per-user events
+  need per-user delivery results.
+- A task stops after NOTIFICATION_CAMPAIGN_TIME_BUDGET seconds and queues the
+  next one, so no worker is held for the length of the campaign.
+- Progress (processed, pushed, push_failed...) is kept on the campaign row and
+  served by the campaign endpoints along with the throughput.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+import logging
+import time
+
+from . import counters
+from .models import NotificationCampaign, NotificationEvent
+
+logger = logging.getLogger(__name__)
+
+
+class CampaignService:
+
+    @staticmethod
+    def start(**fields) -> NotificationCampaign:
+        """Record a campaign and queue its task once the transaction commits"""
+        from . import tasks
+        campaign = NotificationCampaign.objects.create(**fields)
+        transaction.on_commit(lambda: tasks.run_campaign_task.delay(str(campaign.id)))
+        logger.info(f"Queued notification campaign {campaign.id} ({campaign.audience})")
+        return campaign
+
+    @staticmethod
+    def audience(campaign):
+        """The campaign's target users"""
+        from apps.accounts.models import User
+        if campaign.audience == 'all':
+            return User.objects.all()
+        if campaign.audience == 'role':
+            return User.objects.filter(role=campaign.role, is_active=True)
+        if campaign.audience == 'users':
+            return User.objects.filter(id__in=campaign.user_ids or [])
+        return User.objects.filter(is_active=True)
+
+    @staticmethod
+    def run(campaign_id, chunk_size=None, time_budget=None) -> bool:
+        """Process chunks until the campaign is done (True) or time_budget seconds ran out (False)"""
+        chunk_size = chunk_size or settings.NOTIFICATION_CAMPAIGN_CHUNK_SIZE
+        time_budget = time_budget or settings.NOTIFICATION_CAMPAIGN_TIME_BUDGET
+        deadline = time.monotonic() + time_budget
+        while CampaignService.run_chunk(campaign_id, chunk_size):
+            if time.monotonic() >= deadline:
+                return False
+        return True
+
+    @staticmethod
+    def run_chunk(campaign_id, chunk_size) -> bool:
+        """Create and push the next chunk. Returns whether more may be left."""
+        with transaction.atomic():
+            campaign = NotificationCampaign.objects.select_for_update().get(id=campaign_id)
+            if campaign.status in ('completed', 'failed'):
+                return False
+            users = CampaignService.audience(campaign)
+            if campaign.status == 'pending':
+                campaign.status = 'running'
+                campaign.started_at = timezone.now()
+                campaign.total_users = users.count()
+            if campaign.cursor:
+                users = users.filter(id__gt=campaign.cursor)
+            rows = list(users.order_by('id').values_list('id', 'fcm_device_token')[:chunk_size])
+            events = NotificationEvent.objects.bulk_create([
+                NotificationEvent(
+                    user_id=user_id, title=campaign.title, message=campaign.message, type=campaign.type,
+                    category=campaign.category, metadata=campaign.metadata,
+                    is_promotional=campaign.category == 'promo'
+                )
+                for user_id, _ in rows
+            ])
+            counters.notifications_added(events)
+            if rows:
+                campaign.cursor = rows[-1][0]
+                campaign.processed += len(rows)
+                campaign.chunks += 1
+            campaign.save(update_fields=['status', 'started_at', 'total_users', 'cursor', 'processed', 'chunks'])
+
+        if events and campaign.send_push:
+            CampaignService._deliver(campaign, events, dict(rows))
+        if len(rows) < chunk_size:
+            NotificationCampaign.objects.filter(id=campaign_id, status='running').update(
+                status='completed', finished_at=timezone.now()
+            )
+            logger.info(f"Notification campaign {campaign_id} completed")
+            return False
+        return True
+
+    @staticmethod
+    def _deliver(campaign, events, tokens) -> None:
+        """Socket delivery for connected users, FCM batches for the rest; counted on the campaign"""
+        from . import push_dispatcher
+        from .firebase_service import deliver_events_over_socket
+        payload = deliver_events_over_socket((event, campaign.push_data) for event in events)
+        user_ids = {str(event.id): event.user_id for event in events}
+        pushes = [
+            push_dispatcher.Push(event_id, user_ids[event_id], tokens[user_ids[event_id]],
+                                 campaign.title, campaign.message, data)
+            for event_id, data in payload if tokens.get(user_ids[event_id])
+        ]
+        stats = push_dispatcher.send(pushes) if push_dispatcher.enabled() else {'sent': 0, 'failed': 0}
+        NotificationCampaign.objects.filter(id=campaign.id).update(
+            delivered_realtime=F('delivered_realtime') + len(events) - len(payload),
+            pushed=F('pushed') + stats['sent'],
+            push_failed=F('push_failed') + stats['failed'],
+            no_token=F('no_token') + len(payload) - len(pushes),
+        )
+
+    @staticmethod
+    def fail(campaign_id, error: str) -> None:
+        NotificationCampaign.objects.filter(id=campaign_id).exclude(status='completed').update(
+            status='failed', finished_at=timezone.now(), error=error
+        )
+        logger.error(f"Notification campaign {campaign_id} failed: {error}")
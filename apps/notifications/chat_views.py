@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from django.utils import timezone
 from django.db.models import Q
+from . import counters
 from .models import ChatConversation, ChatMessage
 from .serializers import ChatConversationSerializer, ChatMessageSerializer
 
@@ -163,7 +164,8 @@ class ChatConversationViewSet(viewsets.ModelViewSet):
         
         # Mark unread messages as read (excluding messages sent by the user)
         unread_messages = conversation.messages.filter(is_read=False).exclude(sender=request.user)
-        unread_messages.update(is_read=True, read_at=timezone.now())
+        count = unread_messages.update(is_read=True, read_at=timezone.now())
+        counters.chat_messages_read(conversation, request.user, count)
         
         return Response(
             {'status': 'Messages marked as read'},
@@ -172,29 +174,10 @@ class ChatConversationViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
-        """Get count of unread conversations and messages"""
-        user = request.user
-        
-        if user.role == 'support_agent':
-            unread_conversations = ChatConversation.objects.filter(
-                assigned_agent=user,
-                status='open'
-            ).count()
-            unread_messages = ChatMessage.objects.filter(
-                conversation__assigned_agent=user,
-                is_read=False
-            ).exclude(sender=user).count()
-        else:
-            unread_conversations = ChatConversation.objects.filter(
-                user=user,
-                status__in=['open', 'in_progress']
-            ).count()
-            unread_messages = ChatMessage.objects.filter(
-                conversation__user=user,
-                is_read=False
-            ).exclude(sender=user).count()
+        """Get count of unread conversations and messages (from the cached counters)"""
+        counts = counters.chat_counts(request.user)
         
         return Response({
-            'unread_conversations': unread_conversations,
-            'unread_messages': unread_messages,
+            'unread_conversations': counts['open_conversations'],
+            'unread_messages': counts['unread_messages'],
         })
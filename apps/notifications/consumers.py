@@ -1,7 +1,11 @@
+import asyncio
 import json
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 
+from . import realtime
+
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
@@ -33,3 +37,44 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def chat_message(self, event):
         # Send message to WebSocket
         await self.send(text_data=json.dumps(event['message']))
+
+
+class UserEventsConsumer(AsyncWebsocketConsumer):
+    """
+    The signed-in user's own events (ws/notifications/), authenticated with the
+    JWT middleware. Joins the user_<id> group; while connected the user counts as
+    online, so notifications come through here instead of FCM.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated:
+            await self.close()
+            return
+
+        self.user_id = user.id
+        self.group_name = realtime.user_group_name(self.user_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await sync_to_async(realtime.connection_opened)(self.user_id)
+        self.heartbeat = asyncio.ensure_future(self.keep_presence())
+
+    async def disconnect(self, close_code):
+        if not hasattr(self, 'group_name'):
+            return
+        self.heartbeat.cancel()
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        await sync_to_async(realtime.connection_closed)(self.user_id)
+
+    async def keep_presence(self):
+        while True:
+            await asyncio.sleep(realtime.PRESENCE_HEARTBEAT)
+            await sync_to_async(realtime.connection_alive)(self.user_id)
+
+    async def receive(self, text_data):
+        # Server-to-client only
+        pass
+
+    # Receive an event for this user
+    async def user_event(self, event):
+        await self.send(text_data=json.dumps(event['payload']))
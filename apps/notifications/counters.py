@@ -0,0 +1,348 @@
+"""
+Cached unread counters for notifications and chat.
+
+The apps poll the notification summary and the chat unread counts constantly,
+and each poll ran a COUNT per figure (five for the summary, one per
+conversation for the chat list). The figures are now kept per user, and per
+conversation, as counters in the default cache, read together with one
+get_many:
+
+- ntf_count_v1_{user_id}_{field}: total, unread and the total of each category
+- chat_count_v1_{user_id}_{field}: open_conversations and unread_messages
+- chat_unread_v1_{conversation_id}: unread messages in the conversation
+
+Notification counters are adjusted in place after commit (cache.incr) when
+events are created, read or deleted, and unread is reset when the user marks
+all read (see NotificationEventQuerySet for the read watermark). A missing
+counter means nothing is known for that user: the adjustment drops the user's
+counters and the next read rebuilds all of them with one grouped query. Changes reaching more than
+ADJUST_MAX_USERS users at once (broadcasts) drop their counters instead. Chat counts are adjusted as
+messages are sent and read, and dropped when a conversation changes hands or
+status.
+
+Writes that bypass these hooks (queryset updates in the admin, cascades) and
+races between a rebuild and an adjustment can leave a counter off;
+repair_recent() recomputes the cached counters of recently active users from
+the database on beat, and every counter expires after
+NOTIFICATION_COUNTERS_TTL seconds.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from operator import attrgetter
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when the counted fields change so old counters are not read back
+COUNTERS_VERSION = 1
+REPAIR_BATCH_SIZE = 500
+# Beyond this many users in one change, their counters are dropped rather than adjusted
+ADJUST_MAX_USERS = 50
+
+# Categories counted in the summary (see NotificationEvent.CATEGORIES)
+CATEGORIES = ('parking', 'violations', 'payments', 'reservations', 'system', 'promo')
+NOTIFICATION_FIELDS = ('total', 'unread') + CATEGORIES
+CHAT_FIELDS = ('open_conversations', 'unread_messages')
+
+
+def notification_key(user_id, field) -> str:
+    return f"ntf_count_v{COUNTERS_VERSION}_{user_id}_{field}"
+
+
+def chat_key(user_id, field) -> str:
+    return f"chat_count_v{COUNTERS_VERSION}_{user_id}_{field}"
+
+
+def conversation_key(conversation_id) -> str:
+    return f"chat_unread_v{COUNTERS_VERSION}_{conversation_id}"
+
+
+# Notifications
+
+def build_notification_counts(user_ids) -> dict:
+    """{user_id: {field: count}} from the database, one grouped query for all users"""
+    from .models import NotificationEvent, NotificationEventQuerySet
+    counts = {user_id: dict.fromkeys(NOTIFICATION_FIELDS, 0) for user_id in user_ids}
+    rows = NotificationEvent.objects.filter(user_id__in=list(counts)).with_read_watermark().values_list(
+        'user_id', 'category'
+    ).annotate(n=Count('id'), unread=Count('id', filter=NotificationEventQuerySet.UNREAD)).order_by()
+    for user_id, category, n, unread in rows:
+        user_counts = counts[user_id]
+        user_counts['total'] += n
+        user_counts['unread'] += unread
+        if category in user_counts:
+            user_counts[category] += n
+    return counts
+
+
+def _store_notification_counts(counts) -> None:
+    cache.set_many({
+        notification_key(user_id, field): value
+        for user_id, user_counts in counts.items() for field, value in user_counts.items()
+    }, settings.NOTIFICATION_COUNTERS_TTL)
+
+
+def notification_counts(user_id) -> dict:
+    """{field: count} of the user's notifications (see NOTIFICATION_FIELDS)"""
+    keys = {field: notification_key(user_id, field) for field in NOTIFICATION_FIELDS}
+    try:
+        cached = cache.get_many(list(keys.values()))
+    except Exception as e:
+        logger.warning(f"Could not read notification counters of user {user_id}: {e}")
+        cached = {}
+    if len(cached) == len(keys):
+        return {field: max(0, cached[key]) for field, key in keys.items()}
+
+    counts = build_notification_counts([user_id])
+    try:
+        _store_notification_counts(counts)
+    except Exception as e:
+        logger.warning(f"Could not cache notification counters of user {user_id}: {e}")
+    return counts[user_id]
+
+
+def invalidate_notifications(user_ids) -> None:
+    """Drop the users' notification counters; they are rebuilt on next read"""
+    try:
+        cache.delete_many([
+            notification_key(user_id, field) for user_id in user_ids for field in NOTIFICATION_FIELDS
+        ])
+    except Exception as e:
+        # The counters then live until their TTL or the next repair
+        logger.warning(f"Could not drop notification counters: {e}")
+
+
+def _adjust(deltas) -> None:
+    """Apply {user_id: Counter(field: delta)}; a user with a missing counter is dropped whole"""
+    if len(deltas) > ADJUST_MAX_USERS:
+        # A broadcast: one delete beats a few increments per user
+        invalidate_notifications(deltas)
+        return
+    for user_id, user_deltas in deltas.items():
+        try:
+            for field, delta in user_deltas.items():
+                if delta:
+                    cache.incr(notification_key(user_id, field), delta)
+        except ValueError:
+            # Not cached (or expired): rebuilt on next read
+            invalidate_notifications([user_id])
+        except Exception as e:
+            logger.warning(f"Could not adjust notification counters of user {user_id}: {e}")
+            invalidate_notifications([user_id])
+
+
+def _deltas(events, sign, is_read=attrgetter('is_read')) -> dict:
+    deltas = defaultdict(Counter)
+    for event in events:
+        user_deltas = deltas[event.user_id]
+        user_deltas['total'] += sign
+        user_deltas[event.category] += sign
+        if not is_read(event):
+            user_deltas['unread'] += sign
+    return deltas
+
+
+def notifications_added(events) -> None:
+    """Count saved or bulk-created NotificationEvents once the transaction commits"""
+    # New events postdate the user's mark-all watermark, so only their flag matters
+    deltas = _deltas(events, 1)
+    if deltas:
+        transaction.on_commit(lambda: _adjust(deltas))
+
+
+def notifications_removed(events) -> None:
+    """Uncount deleted NotificationEvents once the transaction commits"""
+    deltas = _deltas(events, -1, is_read=attrgetter('read_state'))
+    if deltas:
+        transaction.on_commit(lambda: _adjust(deltas))
+
+
+def read_changed(user_id, is_read: bool) -> None:
+    """One of the user's notifications was marked read (or unread again)"""
+    deltas = {user_id: Counter(unread=-1 if is_read else 1)}
+    transaction.on_commit(lambda: _adjust(deltas))
+
+
+def all_read(user_id) -> None:
+    """The user moved their mark-all watermark: nothing is unread any more"""
+    def adjust():
+        try:
+            cache.set(notification_key(user_id, 'unread'), 0, settings.NOTIFICATION_COUNTERS_TTL)
+        except Exception as e:
+            logger.warning(f"Could not reset unread counter of user {user_id}: {e}")
+            invalidate_notifications([user_id])
+    transaction.on_commit(adjust)
+
+
+def notifications_changed(user_ids) -> None:
+    """Rows changed in bulk (queryset update or delete): recount these users on next read"""
+    user_ids = set(user_ids)
+    transaction.on_commit(lambda: invalidate_notifications(user_ids))
+
+
+# Chat
+
+def _counts_conversation(user, conversation) -> bool:
+    """Whether the conversation's messages count towards the user's unread_messages (as in build_chat_counts)"""
+    if user.role == 'support_agent':
+        return conversation.assigned_agent_id == user.id
+    return conversation.user_id == user.id
+
+
+def build_chat_counts(user) -> dict:
+    from .models import ChatConversation, ChatMessage
+    if user.role == 'support_agent':
+        open_conversations = ChatConversation.objects.filter(assigned_agent=user, status='open')
+        unread_messages = ChatMessage.objects.filter(conversation__assigned_agent=user, is_read=False)
+    else:
+        open_conversations = ChatConversation.objects.filter(user=user, status__in=['open', 'in_progress'])
+        unread_messages = ChatMessage.objects.filter(conversation__user=user, is_read=False)
+    return {
+        'open_conversations': open_conversations.count(),
+        'unread_messages': unread_messages.exclude(sender=user).count(),
+    }
+
+
+def chat_counts(user) -> dict:
+    """{'open_conversations', 'unread_messages'} for the user's chat badge"""
+    keys = {field: chat_key(user.id, field) for field in CHAT_FIELDS}
+    try:
+        cached = cache.get_many(list(keys.values()))
+    except Exception as e:
+        logger.warning(f"Could not read chat counters of user {user.id}: {e}")
+        cached = {}
+    if len(cached) == len(keys):
+        return {field: max(0, cached[key]) for field, key in keys.items()}
+
+    counts = build_chat_counts(user)
+    try:
+        cache.set_many({keys[field]: value for field, value in counts.items()}, settings.NOTIFICATION_COUNTERS_TTL)
+    except Exception as e:
+        logger.warning(f"Could not cache chat counters of user {user.id}: {e}")
+    return counts
+
+
+def conversation_unread_counts(conversation_ids) -> dict:
+    """{conversation_id: unread messages}; the ones not cached are counted in one grouped query"""
+    from .models import ChatMessage
+    keys = {conversation_id: conversation_key(conversation_id) for conversation_id in conversation_ids}
+    try:
+        cached = cache.get_many(list(keys.values()))
+    except Exception as e:
+        logger.warning(f"Could not read conversation counters: {e}")
+        cached = {}
+    counts = {conversation_id: cached[key] for conversation_id, key in keys.items() if key in cached}
+    missing = [conversation_id for conversation_id in keys if conversation_id not in counts]
+    if missing:
+        built = dict.fromkeys(missing, 0)
+        built.update(
+            ChatMessage.objects.filter(conversation_id__in=missing, is_read=False)
+            .values_list('conversation_id').annotate(n=Count('id')).order_by()
+        )
+        try:
+            cache.set_many({keys[conversation_id]: n for conversation_id, n in built.items()},
+                           settings.NOTIFICATION_COUNTERS_TTL)
+        except Exception as e:
+            logger.warning(f"Could not cache conversation counters: {e}")
+        counts.update(built)
+    return {conversation_id: max(0, n) for conversation_id, n in counts.items()}
+
+
+def _incr_or_drop(key, delta) -> None:
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        pass  # Not cached: counted on next read
+    except Exception as e:
+        logger.warning(f"Could not adjust chat counter {key}: {e}")
+        cache.delete(key)
+
+
+def chat_message_added(message) -> None:
+    """Count a new message for the conversation and for the parties it is unread for"""
+    conversation = message.conversation
+    parties = [party for party in (conversation.user, conversation.assigned_agent)
+               if party is not None and party.id != message.sender_id]
+
+    def adjust():
+        _incr_or_drop(conversation_key(conversation.id), 1)
+        for party in parties:
+            if _counts_conversation(party, conversation):
+                _incr_or_drop(chat_key(party.id, 'unread_messages'), 1)
+    transaction.on_commit(adjust)
+
+
+def chat_messages_read(conversation, reader, count: int) -> None:
+    """reader marked count of the conversation's messages read"""
+    if not count:
+        return
+
+    def adjust():
+        _incr_or_drop(conversation_key(conversation.id), -count)
+        if _counts_conversation(reader, conversation):
+            _incr_or_drop(chat_key(reader.id, 'unread_messages'), -count)
+    transaction.on_commit(adjust)
+
+
+def invalidate_chat(user_ids=(), conversation_ids=()) -> None:
+    keys = [chat_key(user_id, field) for user_id in user_ids if user_id for field in CHAT_FIELDS]
+    keys += [conversation_key(conversation_id) for conversation_id in conversation_ids]
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.warning(f"Could not drop chat counters: {e}")
+
+
+def conversation_changed(user_ids) -> None:
+    """A conversation was opened, changed status or changed hands: recount its parties on next read"""
+    user_ids = set(user_ids)
+    transaction.on_commit(lambda: invalidate_chat(user_ids=user_ids))
+
+
+# Repair
+
+def repair_recent(window=None) -> dict:
+    """
+    Recompute the cached notification counters of users with notifications
+    changed in the last `window` seconds, and drop the chat counters of recently
+    active conversations. Returns {'users', 'repaired', 'conversations'}.
+    """
+    from .models import ChatMessage, NotificationEvent
+    since = timezone.now() - timedelta(seconds=window or settings.NOTIFICATION_COUNTERS_REPAIR_WINDOW)
+    totals = {'users': 0, 'repaired': 0, 'conversations': 0}
+
+    user_ids = (NotificationEvent.objects.filter(updated_at__gte=since)
+                .values_list('user_id', flat=True).distinct().order_by('user_id'))
+    last = None
+    while True:
+        batch = list((user_ids.filter(user_id__gt=last) if last else user_ids)[:REPAIR_BATCH_SIZE])
+        if not batch:
+            break
+        last = batch[-1]
+        totals['users'] += len(batch)
+        # Only users whose counters are cached; the rest are counted on their next read
+        cached = cache.get_many([notification_key(user_id, 'total') for user_id in batch])
+        cached_ids = [user_id for user_id in batch if notification_key(user_id, 'total') in cached]
+        if not cached_ids:
+            continue
+        counts = build_notification_counts(cached_ids)
+        _store_notification_counts(counts)
+        totals['repaired'] += len(counts)
+
+    conversations = (ChatMessage.objects.filter(Q(created_at__gte=since) | Q(updated_at__gte=since))
+                     .values_list('conversation_id', 'conversation__user_id', 'conversation__assigned_agent_id')
+                     .distinct())
+    conversation_ids, parties = set(), set()
+    for conversation_id, user_id, agent_id in conversations.iterator():
+        conversation_ids.add(conversation_id)
+        parties.update((user_id, agent_id))
+    invalidate_chat(user_ids=parties, conversation_ids=conversation_ids)
+    totals['conversations'] = len(conversation_ids)
+
+    logger.info(f"Repaired notification counters: {totals}")
+    return totals
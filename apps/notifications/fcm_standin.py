@@ -0,0 +1,100 @@
+"""
+A local stand-in for FCM, for measuring push throughput without the network.
+
+POST /batch takes {'messages': [{'token', 'title', 'body', 'data'}, ...]}, at most
+500, and answers {'responses': [...]} in the same order: {'name': ...} for a sent
+message, or {'error': {'code', 'message'}}. Tokens starting with `unregistered-`
+get UNREGISTERED and `invalid-` INVALID_ARGUMENT, as FCM answers for uninstalled
+apps and malformed tokens. `latency` is added per batch (FCM's per-message
+requests run in parallel) and `message_latency` per message. Run it with
+`manage.py fcm_standin` and set FCM_STANDIN_URL, or start it in-process with
+FCMStandIn().start().
+"""
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+import uuid
+
+MAX_MESSAGES = 500
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    @staticmethod
+    def _result(message):
+        token = message.get('token') or ''
+        if token.startswith('unregistered-'):
+            return {'error': {'code': 'UNREGISTERED', 'message': 'Requested entity was not found.'}}
+        if token.startswith('invalid-') or not token:
+            return {'error': {'code': 'INVALID_ARGUMENT', 'message': 'The registration token is not a valid FCM registration token'}}
+        return {'name': f"projects/standin/messages/{uuid.uuid4().hex}"}
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if self.path.rstrip('/') != '/batch':
+            return self._send(404, {'error': {'code': 'NOT_FOUND', 'message': self.path}})
+        messages = body.get('messages') or []
+        if len(messages) > MAX_MESSAGES:
+            return self._send(400, {'error': {'code': 'INVALID_ARGUMENT', 'message': f"More than {MAX_MESSAGES} messages"}})
+
+        time.sleep(server.latency + server.message_latency * len(messages))
+        responses = [self._result(message) for message in messages]
+        with server.lock:
+            server.calls['batches'] += 1
+            server.calls['messages'] += len(messages)
+            server.calls['errors'] += sum(1 for response in responses if 'error' in response)
+            server.in_flight += 1
+            server.calls['max_in_flight'] = max(server.calls['max_in_flight'], server.in_flight)
+        try:
+            self._send(200, {'responses': responses})
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+class FCMStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, message_latency=0.0, verbose=False):
+        super().__init__((host, port), StandInHandler)
+        self.latency = latency
+        self.message_latency = message_latency
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.in_flight = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_calls(self) -> None:
+        with self.lock:
+            self.calls.clear()
+
+    def start(self) -> 'FCMStandIn':
+        """Serve from a background thread"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
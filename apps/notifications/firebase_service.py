@@ -38,7 +38,31 @@ def initialize_firebase():
         raise
 
 
-from . import tasks
+from . import tasks, realtime
+
+
+def build_message(token: str, title: str, body: str, data: Optional[Dict[str, str]] = None) -> messaging.Message:
+    """The FCM message for one device, as the Flutter apps expect it"""
+    notification_data = dict(data or {})
+    notification_data['click_action'] = 'FLUTTER_NOTIFICATION_CLICK'
+    return messaging.Message(
+        notification=messaging.Notification(
+            title=title,
+            body=body,
+        ),
+        data=notification_data,
+        token=token,
+        android=messaging.AndroidConfig(
+            priority='high',
+            notification=messaging.AndroidNotification(
+                sound='default',
+                channel_id='default',
+                icon='launcher_icon',
+                color='#4CAF50',
+            ),
+        ),
+    )
+
 
 def send_notification_to_user_sync(
     user,
@@ -73,28 +97,8 @@ def send_notification_to_user_sync(
         if not _firebase_initialized:
             initialize_firebase()
         
-        # Prepare notification data
-        notification_data = data or {}
-        notification_data['click_action'] = 'FLUTTER_NOTIFICATION_CLICK'
-        
         # Create FCM message
-        message = messaging.Message(
-            notification=messaging.Notification(
-                title=title,
-                body=body,
-            ),
-            data=notification_data,
-            token=user.fcm_device_token,
-            android=messaging.AndroidConfig(
-                priority='high',
-                notification=messaging.AndroidNotification(
-                    sound='default',
-                    channel_id='default',
-                    icon='launcher_icon',
-                    color='#4CAF50',
-                ),
-            ),
-        )
+        message = build_message(user.fcm_device_token, title, body, data)
         
         # Send message
         response = messaging.send(message)
@@ -140,7 +144,11 @@ def send_notification_to_user(
 ) -> bool:
     """
     Async wrapper for sending push notification to a user.
+    Users with a live WebSocket connection get it over the socket instead of FCM.
     """
+    if realtime.deliver_notification(user.id, title, body, data, notification_event):
+        return True
+
     # Extract ID from notification_event if provided
     notification_event_id = str(notification_event.id) if notification_event else None
     
@@ -156,6 +164,40 @@ def send_notification_to_user(
     return True
 
 
+def send_notification_events(events_with_data) -> int:
+    """
+    Push many already-saved NotificationEvents with a single queued task.
+    Connected users get theirs over the WebSocket and are left out of the push.
+    
+    Args:
+        events_with_data: iterable of (NotificationEvent, push data dict or None)
+    
+    Returns:
+        int: Number of notifications queued for FCM
+    """
+    payload = deliver_events_over_socket(events_with_data)
+    if payload:
+        tasks.send_notification_events_task.delay(payload)
+    return len(payload)
+
+
+def deliver_events_over_socket(events_with_data) -> list:
+    """
+    Send saved NotificationEvents to connected users over the WebSocket.
+    Returns the [notification_event_id, data] payload of the rest, for FCM.
+    """
+    events_with_data = list(events_with_data)
+    online = realtime.online_user_ids(event.user_id for event, _ in events_with_data)
+    payload = []
+    for event, data in events_with_data:
+        if event.user_id in online and realtime.send_to_user(
+            event.user_id, realtime.notification_payload(event.title, event.message, data, event)
+        ):
+            continue
+        payload.append([str(event.id), data])
+    return payload
+
+
 def send_notification_to_multiple_users(
     users,
     title: str,
@@ -163,7 +205,9 @@ def send_notification_to_multiple_users(
     data: Optional[Dict[str, str]] = None
 ) -> Dict[str, int]:
     """
-    Send a push notification to multiple users
+    Send a push notification to multiple users.
+    Connected users get it over the WebSocket; the rest are pushed in FCM
+    batches by queued tasks (see push_dispatcher).
     
     Args:
         users: QuerySet or list of User instances
@@ -172,20 +216,32 @@ def send_notification_to_multiple_users(
         data: Optional dictionary of custom data
     
     Returns:
-        dict: Statistics with 'success', 'failed', and 'no_token' counts
+        dict: Statistics with 'success' (delivered or queued), 'failed', and 'no_token' counts
     """
     stats = {'success': 0, 'failed': 0, 'no_token': 0}
     
+    with_token = []
     for user in users:
         if not user.fcm_device_token:
             stats['no_token'] += 1
             continue
-        
-        success = send_notification_to_user(user, title, body, data)
-        if success:
+        with_token.append(user)
+    
+    online = realtime.online_user_ids(user.id for user in with_token)
+    queued = []
+    for user in with_token:
+        if user.id in online and realtime.send_to_user(
+            user.id, realtime.notification_payload(title, body, data)
+        ):
             stats['success'] += 1
-        else:
-            stats['failed'] += 1
+            continue
+        queued.append(str(user.id))
+    
+    # One task per few FCM batches rather than one per user
+    chunk = settings.FCM_BATCH_SIZE * settings.FCM_DISPATCH_WORKERS
+    for start in range(0, len(queued), chunk):
+        tasks.send_push_to_users_task.delay(queued[start:start + chunk], title, body, data)
+    stats['success'] += len(queued)
     
     logger.info(f"Batch notification sent: {stats}")
     return stats
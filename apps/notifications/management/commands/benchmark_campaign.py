@@ -0,0 +1,129 @@
+import time
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from apps.accounts.models import User
+from apps.notifications.campaign_service import CampaignService
+from apps.notifications.fcm_standin import FCMStandIn
+from apps.notifications.models import NotificationCampaign, NotificationEvent
+from apps.common.management.harness import HarnessCommand
+
+BENCH_PHONE_PREFIX = '+2567139'
+ADMIN_PHONE = '+256713999999'
+SEND_CUSTOM_URL = '/api/notifications/fcm/send-custom/'
+
+
+class Command(HarnessCommand):
+    help = 'Run notification campaigns against the FCM stand-in: request time, chunking, throughput and resumption'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--unregistered', type=float, default=0.02, help='Share of stale device tokens')
+
+    def handle(self, *args, **options):
+        self._cleanup()
+        server = FCMStandIn(latency=0.05, message_latency=0.0001).start()
+        standin = override_settings(
+            FCM_STANDIN_URL=server.base_url, NOTIFICATION_CAMPAIGN_CHUNK_SIZE=options['chunk_size']
+        )
+        standin.enable()
+        self.server = server
+        self.chunk_size = options['chunk_size']
+        try:
+            users = self._setup(max(options['users'], 1), options['unregistered'])
+            self._verify_send_custom(users)
+            self._verify_resume(users)
+        finally:
+            standin.disable()
+            server.stop()
+            self._cleanup()
+
+    def _cleanup(self):
+        user_ids = User.objects.filter(phone__startswith=BENCH_PHONE_PREFIX).values_list('id', flat=True)
+        NotificationCampaign.objects.filter(created_by__phone=ADMIN_PHONE).delete()
+        NotificationEvent.objects.filter(user_id__in=list(user_ids)).delete()
+        User.objects.filter(phone__startswith=BENCH_PHONE_PREFIX).delete()
+        User.objects.filter(phone=ADMIN_PHONE).delete()
+
+    def _setup(self, n, unregistered_share):
+        stale_every = max(1, round(1 / unregistered_share)) if unregistered_share else 0
+        self.admin = User.objects.create(phone=ADMIN_PHONE, first_name='Admin', password='!', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        return User.objects.bulk_create([
+            User(
+                phone=f"{BENCH_PHONE_PREFIX}{i:05d}", first_name='Bench', password='!',
+                fcm_device_token=f"{'unregistered' if stale_every and i % stale_every == 0 else 'device'}-{i}"
+            )
+            for i in range(n)
+        ])
+
+    def _report(self, ok, success, failure):
+        if ok:
+            self.stdout.write(self.style.SUCCESS(f"SUCCESS: {success}"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: {failure}"))
+
+    def _verify_send_custom(self, users):
+        self.server.reset_calls()
+        body = {
+            'user_ids': [str(user.id) for user in users], 'title': 'Benchmark',
+            'message': 'Campaign benchmark', 'data': {'campaign': 'benchmark'},
+        }
+        # The campaign task is queued on commit, so the request is timed on its own
+        with transaction.atomic():
+            started = time.perf_counter()
+            response = self.client.post(SEND_CUSTOM_URL, body, format='json')
+            request_elapsed = time.perf_counter() - started
+            started = time.perf_counter()
+        campaign_elapsed = time.perf_counter() - started
+        if response.status_code != 202:
+            self._report(False, '', f"send-custom answered {response.status_code}: {response.data}")
+            return
+
+        progress = self.client.get(f"/api/notifications/campaigns/{response.data['campaign_id']}/").data
+        self.stdout.write(
+            f"send-custom to {len(users)} users answered in {request_elapsed * 1000:.0f}ms; campaign ran in "
+            f"{campaign_elapsed * 1000:.0f}ms, {self.server.calls['batches']} FCM requests"
+        )
+        self.stdout.write(
+            f"progress: {progress['status']}, {progress['processed']}/{progress['total_users']} users in "
+            f"{progress['chunks']} chunks, {progress['pushed']} pushed, {progress['push_failed']} failed, "
+            f"{progress['users_per_second']} users/s"
+        )
+        events = NotificationEvent.objects.filter(user__in=users, title='Benchmark')
+        expected_chunks = -(-len(users) // self.chunk_size)
+        self._report(
+            progress['status'] == 'completed' and progress['processed'] == len(users)
+            and events.count() == len(users) and progress['chunks'] == expected_chunks
+            and progress['pushed'] + progress['push_failed'] == len(users)
+            and events.filter(sent_via_push=True).count() == progress['pushed'],
+            f"{len(users)} notifications created and pushed in {expected_chunks} chunks, progress recorded",
+            f"Campaign: {progress}, {events.count()} events (expected {expected_chunks} chunks)"
+        )
+
+    def _verify_resume(self, users):
+        campaign = NotificationCampaign.objects.create(
+            created_by=self.admin, title='Resumed', message='Campaign resumption', send_push=False,
+            audience='users', user_ids=[str(user.id) for user in users]
+        )
+        # A task out of time budget after its first chunk, then the next one, then a redelivery
+        finished_early = CampaignService.run(campaign.id, time_budget=1e-9)
+        with CaptureQueriesContext(connection) as queries:
+            finished = CampaignService.run(campaign.id)
+        CampaignService.run(campaign.id)
+        campaign.refresh_from_db()
+        created = NotificationEvent.objects.filter(user__in=users, title='Resumed').count()
+        self.stdout.write(
+            f"{campaign.chunks - 1} more chunks in {len(queries)} queries "
+            f"({len(queries) / max(1, campaign.chunks - 1):.0f} per chunk of {self.chunk_size})"
+        )
+        self._report(
+            not finished_early and finished and campaign.status == 'completed' and created == len(users),
+            "A campaign split across tasks and run again creates each notification once",
+            f"Resume: finished early {finished_early}, then {finished}, {campaign.status}, "
+            f"{created} events for {len(users)} users"
+        )
@@ -0,0 +1,112 @@
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from apps.accounts.models import User
+from apps.notifications import push_dispatcher
+from apps.notifications.fcm_standin import FCMStandIn
+from apps.notifications.models import NotificationEvent
+from apps.common.management.harness import HarnessCommand
+
+BENCH_PHONE_PREFIX = '+2567119'
+
+
+class Command(HarnessCommand):
+    help = 'Measure batched FCM pushes against the local stand-in, against one request per push'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--unregistered', type=float, default=0.02, help='Share of stale device tokens')
+        parser.add_argument('--baseline', type=int, default=100, help='Pushes sent one request at a time, for comparison')
+        parser.add_argument('--latency', type=float, default=80, help='Stand-in milliseconds per request')
+
+    def handle(self, *args, **options):
+        self._cleanup()
+        server = FCMStandIn(latency=options['latency'] / 1000, message_latency=0.0001).start()
+        standin = override_settings(FCM_STANDIN_URL=server.base_url)
+        standin.enable()
+        try:
+            events = self._setup(options['users'], options['unregistered'])
+            self._measure_baseline(server, events[:options['baseline']])
+            self._measure_batched(server, events)
+        finally:
+            standin.disable()
+            server.stop()
+            self._cleanup()
+
+    def _cleanup(self):
+        User.objects.filter(phone__startswith=BENCH_PHONE_PREFIX).delete()
+
+    def _setup(self, n, unregistered_share):
+        stale_every = max(1, round(1 / unregistered_share)) if unregistered_share else 0
+        users = User.objects.bulk_create([
+            User(
+                phone=f"{BENCH_PHONE_PREFIX}{i:05d}", first_name='Bench', password='!',
+                fcm_device_token=f"{'unregistered' if stale_every and i % stale_every == 0 else 'device'}-{i}"
+            )
+            for i in range(n)
+        ])
+        return NotificationEvent.objects.bulk_create([
+            NotificationEvent(user=user, title='Benchmark', message='Batched push benchmark') for user in users
+        ])
+
+    def _payload(self, events):
+        return [[str(event.id), {'type': 'benchmark'}] for event in events]
+
+    def _measure_baseline(self, server, events):
+        if not events:
+            return
+        # What one task per push amounted to: one FCM request each, one after another
+        server.reset_calls()
+        with override_settings(FCM_BATCH_SIZE=1, FCM_DISPATCH_WORKERS=1):
+            started = time.perf_counter()
+            for event in events:
+                push_dispatcher.dispatch_events(self._payload([event]))
+            elapsed = time.perf_counter() - started
+        self.per_push_baseline = elapsed / len(events)
+        self.stdout.write(
+            f"one per push: {len(events)} pushes in {elapsed * 1000:.0f}ms "
+            f"({len(events) / elapsed:.0f}/s), {server.calls['batches']} FCM requests"
+        )
+        # Back to unsent for the batched run
+        NotificationEvent.objects.filter(id__in=[event.id for event in events]).update(
+            sent_via_push=False, push_sent_at=None, push_error=None
+        )
+        stale = [event.user_id for event in events if event.user.fcm_device_token.startswith('unregistered')]
+        for user_id in stale:
+            User.objects.filter(id=user_id).update(fcm_device_token=f"unregistered-again-{user_id}")
+
+    def _measure_batched(self, server, events):
+        server.reset_calls()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            stats = push_dispatcher.dispatch_events(self._payload(events))
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"batched: {len(events)} pushes in {elapsed * 1000:.0f}ms ({len(events) / elapsed:.0f}/s), "
+            f"{server.calls['batches']} FCM requests, at most {server.calls['max_in_flight']} at once, "
+            f"{len(queries)} queries; {stats}"
+        )
+        if getattr(self, 'per_push_baseline', None):
+            self.stdout.write(f"speedup: {self.per_push_baseline * len(events) / elapsed:.0f}x")
+
+        ids = [event.id for event in events]
+        sent = NotificationEvent.objects.filter(id__in=ids, sent_via_push=True).count()
+        failed = NotificationEvent.objects.filter(id__in=ids, push_error=push_dispatcher.UNREGISTERED_ERROR).count()
+        stale_left = User.objects.filter(
+            phone__startswith=BENCH_PHONE_PREFIX, fcm_device_token__startswith='unregistered'
+        ).count()
+        expected_batches = -(-len(events) // push_dispatcher.batch_size())
+        if (sent == stats['sent'] and failed == stats['unregistered'] and sent + failed == len(events)
+                and stale_left == 0 and server.calls['batches'] == expected_batches
+                and server.calls['max_in_flight'] <= settings.FCM_DISPATCH_WORKERS):
+            self.stdout.write(self.style.SUCCESS(
+                f"SUCCESS: {sent} sent and {failed} unregistered recorded in bulk, stale tokens cleared"
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"FAILED: {sent} sent, {failed} unregistered, {stale_left} stale tokens left, "
+                f"{server.calls['batches']} batches (expected {expected_batches})"
+            ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from apps.notifications.fcm_standin import FCMStandIn
+
+
+class Command(BaseCommand):
+    help = 'Run a local stand-in for FCM (set FCM_STANDIN_URL to its address)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--latency', type=float, default=80, help='Milliseconds added to every batch')
+        parser.add_argument('--message-latency', type=float, default=0.1, help='Milliseconds added per message')
+
+    def handle(self, *args, **options):
+        server = FCMStandIn(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'] / 1000,
+            message_latency=options['message_latency'] / 1000,
+            verbose=options['verbosity'] > 1,
+        )
+        self.stdout.write(f"FCM stand-in on {server.base_url} (FCM_STANDIN_URL={server.base_url})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            calls = ', '.join(f"{name}={count}" for name, count in sorted(server.calls.items()))
+            self.stdout.write(f"Calls: {calls or 'none'}")
@@ -0,0 +1,143 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.accounts.models import User
+from apps.notifications import counters
+from apps.notifications.models import ChatConversation, NotificationEvent
+from apps.notifications.notification_triggers import notify_custom
+from apps.common.management.harness import HarnessCommand
+
+USER_PHONE = '+256714900001'
+AGENT_PHONE = '+256714900002'
+SUMMARY_URL = '/api/notifications/notifications/summary/'
+MARK_ALL_URL = '/api/notifications/notifications/mark-all-as-read/'
+CHAT_URL = '/api/notifications/chat/conversations/'
+
+
+class Command(HarnessCommand):
+    help = 'Verify the cached unread counters: queries per poll, updates on create/read/mark-all, drift repair'
+
+    def handle(self, *args, **options):
+        self._cleanup()
+        self.user = User.objects.create(phone=USER_PHONE, first_name='Bench', password='!')
+        self.agent = User.objects.create(phone=AGENT_PHONE, first_name='Agent', password='!', role='support_agent')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        try:
+            self._verify_summary()
+            self._verify_repair()
+            self._verify_chat()
+        finally:
+            self._cleanup()
+
+    def _cleanup(self):
+        users = User.objects.filter(phone__in=[USER_PHONE, AGENT_PHONE])
+        for user in users:
+            counters.invalidate_notifications([user.id])
+            counters.invalidate_chat(user_ids=[user.id])
+        users.delete()
+
+    def _report(self, ok, success, failure):
+        if ok:
+            self.stdout.write(self.style.SUCCESS(f"SUCCESS: {success}"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: {failure}"))
+
+    def _summary(self, client=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = (client or self.client).get(SUMMARY_URL)
+        return response.data, len(queries)
+
+    def _expected(self):
+        events = NotificationEvent.objects.filter(user=self.user)
+        return {
+            'unread_count': events.unread().count(),
+            'total_count': events.count(),
+            'parking_count': events.filter(category='parking').count(),
+            'violation_count': events.filter(category='violations').count(),
+            'payment_count': events.filter(category='payments').count(),
+        }
+
+    def _verify_summary(self):
+        for i in range(3):
+            notify_custom(self.user, f"Custom {i}", 'Counter test', category='payments')
+        NotificationEvent.objects.create(user=self.user, title='Parking', message='Counter test', category='parking')
+        cold, cold_queries = self._summary()
+        warm, warm_queries = self._summary()
+        self.stdout.write(f"summary: {cold_queries} queries cold, {warm_queries} warm")
+        self._report(
+            cold_queries == 1 and warm_queries == 0 and warm == self._expected(),
+            "The summary is one grouped query cold and none warm",
+            f"Summary: {cold_queries}/{warm_queries} queries, {warm} (expected {self._expected()})"
+        )
+
+        # Created, read (deleted by the detail endpoint) and created again: adjusted in place
+        notify_custom(self.user, 'Another', 'Counter test', category='violations')
+        NotificationEvent.objects.filter(user=self.user, category='parking').first().delete()
+        adjusted, queries = self._summary()
+        self._report(
+            queries == 0 and adjusted == self._expected(),
+            "Creating and reading notifications adjusts the counters without a query",
+            f"Adjusted: {queries} queries, {adjusted} (expected {self._expected()})"
+        )
+
+        self.client.post(MARK_ALL_URL)
+        after, _ = self._summary()
+        again, queries = self._summary()
+        self._report(
+            after == self._expected() and after['unread_count'] == 0 and queries == 0,
+            "Mark-all is reflected in the summary",
+            f"Mark-all: {after} (expected {self._expected()}), then {queries} queries"
+        )
+
+    def _verify_repair(self):
+        NotificationEvent.objects.bulk_create([
+            NotificationEvent(user=self.user, title=f"Unseen {i}", message='Drift', category='system') for i in range(5)
+        ])
+        stale, _ = self._summary()
+        totals = counters.repair_recent()
+        repaired, queries = self._summary()
+        self.stdout.write(f"repair: {totals}")
+        self._report(
+            stale != self._expected() and repaired == self._expected() and queries == 0,
+            "Rows written behind the counters' back are picked up by the repair",
+            f"Repair: stale {stale}, repaired {repaired} (expected {self._expected()}), {queries} queries"
+        )
+
+    def _verify_chat(self):
+        conversation = ChatConversation.objects.create(user=self.user, subject='Counters', assigned_agent=self.agent)
+        agent_client = APIClient()
+        agent_client.force_authenticate(self.agent)
+        # The first message moves the conversation to in_progress, which drops the parties' counts
+        self.client.post(f"{CHAT_URL}{conversation.id}/send_message/", {'content': 'Hello 0'}, format='json')
+        agent_client.get(f"{CHAT_URL}unread_count/")
+        self.client.get(f"{CHAT_URL}unread_count/")
+        self.client.get(CHAT_URL)
+        for i in range(1, 3):
+            self.client.post(f"{CHAT_URL}{conversation.id}/send_message/", {'content': f"Hello {i}"}, format='json')
+        agent_client.post(f"{CHAT_URL}{conversation.id}/send_message/", {'content': 'Hi'}, format='json')
+
+        with CaptureQueriesContext(connection) as queries:
+            agent_counts = agent_client.get(f"{CHAT_URL}unread_count/").data
+        user_counts = self.client.get(f"{CHAT_URL}unread_count/").data
+        listed = self.client.get(CHAT_URL).data['results'][0]['unread_count']
+        self.stdout.write(f"chat unread_count: {len(queries)} queries warm")
+        self._report(
+            agent_counts['unread_messages'] == 3 and user_counts['unread_messages'] == 1 and listed == 4
+            and len(queries) == 0,
+            "Chat unread counts follow new messages without a query",
+            f"Chat: agent {agent_counts}, user {user_counts}, conversation {listed}, {len(queries)} queries"
+        )
+
+        agent_client.post(f"{CHAT_URL}{conversation.id}/mark_messages_read/")
+        agent_counts = agent_client.get(f"{CHAT_URL}unread_count/").data
+        listed = self.client.get(CHAT_URL).data['results'][0]['unread_count']
+        truth = conversation.messages.filter(is_read=False).count()
+        self._report(
+            agent_counts['unread_messages'] == 0 and listed == truth == 1,
+            "Marking messages read updates the agent's and the conversation's counts",
+            f"Read: agent {agent_counts}, conversation {listed} (database {truth})"
+        )
+        cache.delete(counters.conversation_key(conversation.id))
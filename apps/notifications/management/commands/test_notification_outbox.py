@@ -0,0 +1,139 @@
+import time
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from apps.accounts.models import User
+from apps.notifications import outbox
+from apps.notifications.fcm_standin import FCMStandIn
+from apps.notifications.models import NotificationEvent, NotificationOutbox
+from apps.notifications.notification_triggers import notify_custom
+from apps.common.management.harness import HarnessCommand
+
+BENCH_PHONE_PREFIX = '+2567129'
+
+
+class Command(HarnessCommand):
+    help = 'Verify the notification outbox: rollbacks, one relay per transaction, and batched relaying'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self._cleanup()
+        server = FCMStandIn(latency=0.02, message_latency=0.0001).start()
+        standin = override_settings(FCM_STANDIN_URL=server.base_url)
+        standin.enable()
+        self.server = server
+        try:
+            users = User.objects.bulk_create([
+                User(phone=f"{BENCH_PHONE_PREFIX}{i:05d}", first_name='Bench', password='!',
+                     fcm_device_token=f"device-{i}")
+                for i in range(max(options['users'], 1))
+            ])
+            self._verify_rollback(users[0])
+            self._verify_commit(users[0])
+            self._verify_savepoint_rollback(users[0])
+            self._verify_relay(users, options['batch_size'])
+        finally:
+            standin.disable()
+            server.stop()
+            self._cleanup()
+
+    def _cleanup(self):
+        User.objects.filter(phone__startswith=BENCH_PHONE_PREFIX).delete()
+
+    def _report(self, ok, success, failure):
+        if ok:
+            self.stdout.write(self.style.SUCCESS(f"SUCCESS: {success}"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: {failure}"))
+
+    def _verify_rollback(self, user):
+        self.server.reset_calls()
+        with transaction.atomic():
+            notify_custom(user, 'Rolled back', 'Never sent')
+            transaction.set_rollback(True)
+        events = NotificationEvent.objects.filter(user=user).count()
+        entries = NotificationOutbox.objects.filter(user=user).count()
+        self._report(
+            events == 0 and entries == 0 and self.server.calls['batches'] == 0,
+            "A rolled back notification is neither saved nor pushed",
+            f"Rollback: {events} events, {entries} outbox rows, {self.server.calls['batches']} pushes"
+        )
+
+    def _verify_commit(self, user):
+        self.server.reset_calls()
+        with CaptureQueriesContext(connection) as committed:
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for i in range(3):
+                        notify_custom(user, f"Committed {i}", 'Sent after commit')
+                    elapsed = time.perf_counter() - started
+                pending = NotificationEvent.objects.filter(user=user).count()
+        relays = self._relays(committed)
+        events = NotificationEvent.objects.filter(user=user)
+        sent = events.filter(sent_via_push=True).count()
+        self.stdout.write(
+            f"3 notifications in one transaction: {len(queries)} queries, {elapsed * 1000:.1f}ms before commit"
+        )
+        self._report(
+            len(queries) == 3 and pending == 0 and events.count() == 3 and sent == 3 and relays == 1
+            and self.server.calls['batches'] == 1 and not NotificationOutbox.objects.filter(user=user).exists(),
+            "Each notification is one insert; all three were saved and pushed in one batch after commit",
+            f"Commit: {len(queries)} queries, {pending} events before commit, {events.count()} after, "
+            f"{sent} sent, {relays} relays, {self.server.calls['batches']} pushes"
+        )
+
+    def _relays(self, queries):
+        """Relays run while capturing: each takes its first batch with one select on the outbox"""
+        return sum(
+            1 for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "notifications_notificationoutbox"' in query['sql']
+        )
+
+    def _verify_savepoint_rollback(self, user):
+        # The relay requested inside a rolled back savepoint is dropped with it
+        with CaptureQueriesContext(connection) as committed:
+            with transaction.atomic():
+                with transaction.atomic():
+                    notify_custom(user, 'Rolled back savepoint', 'Never sent')
+                    transaction.set_rollback(True)
+                notify_custom(user, 'After savepoint', 'Sent after commit')
+        relays = self._relays(committed)
+        titles = set(NotificationEvent.objects.filter(user=user, title__in=['Rolled back savepoint', 'After savepoint'])
+                     .values_list('title', flat=True))
+        self._report(
+            titles == {'After savepoint'} and relays == 1,
+            "A notification written after a rolled back savepoint still gets its relay",
+            f"Savepoint rollback: saved {titles}, {relays} relays"
+        )
+
+    def _verify_relay(self, users, batch_size):
+        NotificationOutbox.objects.bulk_create([
+            NotificationOutbox(user=user, title='Benchmark', message='Outbox relay benchmark',
+                               push_data={'type': 'benchmark'})
+            for user in users
+        ])
+        self.server.reset_calls()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            totals = outbox.relay(batch_size=batch_size)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"relay: {totals['relayed']} notifications in {elapsed * 1000:.0f}ms "
+            f"({totals['relayed'] / elapsed:.0f}/s), {len(queries)} queries, "
+            f"{self.server.calls['batches']} FCM requests; {totals}"
+        )
+        events = NotificationEvent.objects.filter(
+            user__phone__startswith=BENCH_PHONE_PREFIX, title='Benchmark', sent_via_push=True
+        ).count()
+        expected_batches = -(-len(users) // batch_size)
+        self._report(
+            totals['relayed'] == len(users) and events == len(users) and totals['batches'] == expected_batches
+            and not NotificationOutbox.objects.filter(user__phone__startswith=BENCH_PHONE_PREFIX).exists(),
+            f"{len(users)} outbox rows saved and pushed in {totals['batches']} batches",
+            f"Relay: {totals}, {events} events pushed (expected {len(users)} in {expected_batches} batches)"
+        )
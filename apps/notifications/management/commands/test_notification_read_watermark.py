@@ -0,0 +1,116 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.accounts.models import User
+from apps.notifications import counters
+from apps.notifications.models import NotificationEvent, NotificationReadMark
+from apps.common.management.harness import HarnessCommand
+
+USER_PHONE = '+256714900003'
+LIST_URL = '/api/notifications/notifications/'
+SUMMARY_URL = '/api/notifications/notifications/summary/'
+MARK_ALL_URL = '/api/notifications/notifications/mark-all-as-read/'
+
+
+class Command(HarnessCommand):
+    help = 'Verify mark-all-read through the read watermark: writes per mark-all, list/detail/summary read state'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--notifications', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self._cleanup()
+        self.user = User.objects.create(phone=USER_PHONE, first_name='Bench', password='!')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        try:
+            self._verify_mark_all(max(options['notifications'], 1))
+            self._verify_after_watermark()
+            self._verify_mark_unread()
+        finally:
+            self._cleanup()
+
+    def _cleanup(self):
+        for user in User.objects.filter(phone=USER_PHONE):
+            counters.invalidate_notifications([user.id])
+            user.delete()
+
+    def _report(self, ok, success, failure):
+        if ok:
+            self.stdout.write(self.style.SUCCESS(f"SUCCESS: {success}"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: {failure}"))
+
+    def _listed(self, read):
+        response = self.client.get(LIST_URL, {'read': read, 'page_size': 100})
+        results = response.data['results'] if 'results' in response.data else response.data
+        return response.data.get('count', len(results)), results
+
+    def _state(self):
+        """(unread in the summary, unread in a cold rebuild, unread in the list, read in the list)"""
+        summary = self.client.get(SUMMARY_URL).data['unread_count']
+        rebuilt = counters.build_notification_counts([self.user.id])[self.user.id]['unread']
+        return summary, rebuilt, self._listed('false')[0], self._listed('true')[0]
+
+    def _verify_mark_all(self, n):
+        NotificationEvent.objects.bulk_create([
+            NotificationEvent(user=self.user, title=f"Old {i}", message='Watermark test', category='parking')
+            for i in range(n)
+        ])
+        counters.invalidate_notifications([self.user.id])
+        before = self._state()
+        last_updated = NotificationEvent.objects.filter(user=self.user).order_by('-updated_at')[0].updated_at
+
+        # The first mark-all creates the user's watermark, later ones update it
+        NotificationReadMark.mark_all_read(self.user.id)
+        with CaptureQueriesContext(connection) as queries:
+            NotificationReadMark.mark_all_read(self.user.id)
+        # Read before the next request resets the query log
+        sql = [query['sql'] for query in queries.captured_queries]
+        writes = [statement for statement in sql
+                  if statement.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        response = self.client.post(MARK_ALL_URL)
+        after = self._state()
+        touched = NotificationEvent.objects.filter(user=self.user, updated_at__gt=last_updated).count()
+        self.stdout.write(f"mark-all over {n} unread: {len(sql)} queries ({len(writes)} writes), "
+                          f"{touched} notification rows updated; {response.data['message']}")
+        self._report(
+            before[0] == before[1] == before[2] == n and after == (0, 0, 0, n)
+            and len(writes) == 1 and touched == 0,
+            "Mark-all writes one row and every endpoint reads the notifications as read",
+            f"Mark-all: before {before}, after {after} (summary, rebuilt, unread listed, read listed), "
+            f"{len(writes)} writes, {touched} rows touched"
+        )
+
+    def _verify_after_watermark(self):
+        NotificationEvent.objects.create(user=self.user, title='New', message='Watermark test', category='payments')
+        state = self._state()
+        _, unread = self._listed('false')
+        self._report(
+            state[:3] == (1, 1, 1) and unread[0]['title'] == 'New' and unread[0]['is_read'] is False,
+            "A notification created after the watermark is unread",
+            f"After watermark: {state}, listed {unread[:1]}"
+        )
+
+    def _verify_mark_unread(self):
+        old = NotificationEvent.objects.filter(user=self.user, title='Old 0').get()
+        response = self.client.put(f"{LIST_URL}{old.id}/", {'is_read': False}, format='json')
+        state = self._state()
+        self._report(
+            response.status_code == 200 and response.data['is_read'] is False and state[:3] == (2, 2, 2),
+            "Marking a notification below the watermark unread is honoured by detail, list and summary",
+            f"Mark unread: {response.status_code} {getattr(response, 'data', None)}, state {state}"
+        )
+
+        # Reading (deleting) a watermark-read notification leaves the unread count alone
+        read = NotificationEvent.objects.filter(user=self.user, title='Old 1').get()
+        self.client.put(f"{LIST_URL}{read.id}/", {'is_read': True}, format='json')
+        self.client.post(MARK_ALL_URL)
+        state = self._state()
+        total = NotificationEvent.objects.filter(user=self.user).count()
+        self._report(
+            state == (0, 0, 0, total),
+            "Deleting a read notification and marking all read again leave nothing unread",
+            f"Mark all again: {state} with {total} notifications"
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0012_notificationevent_ntf_evt_usr_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpreferences',
+            name='parking_alert_minutes',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
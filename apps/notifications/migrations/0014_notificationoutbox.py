@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0013_userpreferences_parking_alert_minutes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=100)),
+                ('message', models.TextField()),
+                ('type', models.CharField(choices=[('parking_ended', 'Parking Ended'), ('violation_received', 'Violation Received'), ('payment_successful', 'Payment Successful'), ('payment_failed', 'Payment Failed'), ('reservation_confirmed', 'Reservation Confirmed'), ('reservation_cancelled', 'Reservation Cancelled'), ('maintenance_alert', 'Maintenance Alert'), ('system_alert', 'System Alert'), ('promotional_offer', 'Promotional Offer'), ('custom_admin', 'Custom Admin'), ('other', 'Other')], default='other', max_length=50)),
+                ('category', models.CharField(choices=[('parking', 'Parking'), ('violations', 'Violations'), ('payments', 'Payments'), ('reservations', 'Reservations'), ('system', 'System'), ('promo', 'Promotions')], default='system', max_length=20)),
+                ('metadata', models.JSONField(blank=True, null=True)),
+                ('show_as_dialog', models.BooleanField(default=False)),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], default='medium', max_length=10)),
+                ('is_promotional', models.BooleanField(default=False)),
+                ('push_data', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Notification Outbox Entry',
+                'verbose_name_plural': 'Notification Outbox',
+            },
+        ),
+    ]
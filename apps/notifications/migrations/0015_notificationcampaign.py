@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0014_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCampaign',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('title', models.CharField(max_length=100)),
+                ('message', models.TextField()),
+                ('type', models.CharField(choices=[('parking_ended', 'Parking Ended'), ('violation_received', 'Violation Received'), ('payment_successful', 'Payment Successful'), ('payment_failed', 'Payment Failed'), ('reservation_confirmed', 'Reservation Confirmed'), ('reservation_cancelled', 'Reservation Cancelled'), ('maintenance_alert', 'Maintenance Alert'), ('system_alert', 'System Alert'), ('promotional_offer', 'Promotional Offer'), ('custom_admin', 'Custom Admin'), ('other', 'Other')], default='other', max_length=50)),
+                ('category', models.CharField(choices=[('parking', 'Parking'), ('violations', 'Violations'), ('payments', 'Payments'), ('reservations', 'Reservations'), ('system', 'System'), ('promo', 'Promotions')], default='system', max_length=20)),
+                ('metadata', models.JSONField(blank=True, null=True)),
+                ('send_push', models.BooleanField(default=True, help_text='Push as well as create the in-app notifications')),
+                ('push_data', models.JSONField(blank=True, null=True)),
+                ('audience', models.CharField(choices=[('all', 'All users'), ('active', 'Active users'), ('role', 'Active users with a role'), ('users', 'Listed users')], default='active', max_length=10)),
+                ('role', models.CharField(blank=True, max_length=20)),
+                ('user_ids', models.JSONField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('total_users', models.PositiveIntegerField(blank=True, null=True)),
+                ('cursor', models.UUIDField(blank=True, null=True)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('chunks', models.PositiveIntegerField(default=0)),
+                ('delivered_realtime', models.PositiveIntegerField(default=0)),
+                ('pushed', models.PositiveIntegerField(default=0)),
+                ('push_failed', models.PositiveIntegerField(default=0)),
+                ('no_token', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Notification Campaign',
+                'verbose_name_plural': 'Notification Campaigns',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='ntf_cmp_st_cr_idx')],
+            },
+        ),
+    ]
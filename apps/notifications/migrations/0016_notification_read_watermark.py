@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0015_notificationcampaign'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationReadMark',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_read_mark', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_read_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Notification Read Mark',
+                'verbose_name_plural': 'Notification Read Marks',
+            },
+        ),
+        migrations.AddField(
+            model_name='notificationevent',
+            name='marked_unread_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
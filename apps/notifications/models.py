@@ -1,8 +1,41 @@
 from django.db import models
-from django.db.models import Q
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
 from django.contrib.postgres.fields import JSONField
 from apps.common.models import BaseModel
 
+class NotificationEventQuerySet(models.QuerySet):
+    """
+    A notification is read when its is_read flag is set, or when it predates
+    the user's mark-all watermark (NotificationReadMark) and was not marked
+    unread after it.
+    """
+    UNREAD = Q(is_read=False) & (
+        Q(read_watermark__isnull=True)
+        | Q(created_at__gt=F('read_watermark'))
+        | Q(marked_unread_at__gt=F('read_watermark'))
+    )
+    READ = Q(is_read=True) | (
+        Q(read_watermark__isnull=False)
+        & Q(created_at__lte=F('read_watermark'))
+        & (Q(marked_unread_at__isnull=True) | Q(marked_unread_at__lte=F('read_watermark')))
+    )
+
+    def with_read_watermark(self):
+        """Annotate each row with its user's last_read_at (None if never marked all read)"""
+        if 'read_watermark' in self.query.annotations:
+            return self
+        return self.annotate(read_watermark=Subquery(
+            NotificationReadMark.objects.filter(user_id=OuterRef('user_id')).values('last_read_at')[:1]
+        ))
+
+    def unread(self):
+        return self.with_read_watermark().filter(self.UNREAD)
+
+    def read(self):
+        return self.with_read_watermark().filter(self.READ)
+
+
 class NotificationEvent(BaseModel):
     NOTIFICATION_TYPES = [
         ('parking_ended', 'Parking Ended'),
@@ -39,6 +72,8 @@ class NotificationEvent(BaseModel):
     type = models.CharField(max_length=50, choices=NOTIFICATION_TYPES, default='other')
     category = models.CharField(max_length=20, choices=CATEGORIES, default='system')
     is_read = models.BooleanField(default=False, db_index=True)
+    # Set when marked unread, so the row stays unread below an older mark-all watermark
+    marked_unread_at = models.DateTimeField(null=True, blank=True)
     metadata = models.JSONField(null=True, blank=True)  # Store additional data like parking_session_id, violation_id
     
     # Admin notification fields
@@ -51,6 +86,8 @@ class NotificationEvent(BaseModel):
     push_sent_at = models.DateTimeField(null=True, blank=True, help_text="When push notification was sent")
     push_error = models.TextField(blank=True, null=True, help_text="Error message if push notification failed")
     
+    objects = NotificationEventQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Notification Event'
@@ -66,6 +103,159 @@ class NotificationEvent(BaseModel):
     
     def __str__(self):
         return f"{self.user.phone} - {self.title}"
+    
+    @property
+    def read_state(self) -> bool:
+        """Whether the user has read it, honouring the mark-all watermark (see NotificationEventQuerySet)"""
+        if self.is_read:
+            return True
+        if hasattr(self, 'read_watermark'):
+            watermark = self.read_watermark
+        else:
+            watermark = NotificationReadMark.last_read_at_for(self.user_id)
+        if watermark is None or self.created_at > watermark:
+            return False
+        return not (self.marked_unread_at and self.marked_unread_at > watermark)
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        
+        if adding:
+            from apps.notifications.counters import notifications_added
+            notifications_added([self])
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        
+        from apps.notifications.counters import notifications_removed
+        notifications_removed([self])
+        return result
+
+
+class NotificationReadMark(models.Model):
+    """
+    A user's mark-all-read watermark: their notifications created up to
+    last_read_at are read unless marked unread since, so marking all read
+    writes this one row instead of every unread NotificationEvent.
+    """
+    user = models.OneToOneField('accounts.User', on_delete=models.CASCADE, primary_key=True,
+                                related_name='notification_read_mark')
+    last_read_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Notification Read Mark'
+        verbose_name_plural = 'Notification Read Marks'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.last_read_at}"
+
+    @classmethod
+    def last_read_at_for(cls, user_id):
+        return cls.objects.filter(user_id=user_id).values_list('last_read_at', flat=True).first()
+
+    @classmethod
+    def mark_all_read(cls, user_id, at=None):
+        """Move the user's watermark to `at` (now); one row written whatever the number of notifications"""
+        at = at or timezone.now()
+        if not cls.objects.filter(user_id=user_id).update(last_read_at=at):
+            # First mark-all of the user
+            cls.objects.update_or_create(user_id=user_id, defaults={'last_read_at': at})
+        return at
+
+
+class NotificationOutbox(models.Model):
+    """
+    A notification written inside the caller's transaction, turned into a
+    NotificationEvent and pushed by the relay after commit (see outbox.py).
+    Rows are deleted once relayed; the auto id gives the relay its order.
+    """
+    user = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='+')
+    title = models.CharField(max_length=100)
+    message = models.TextField()
+    type = models.CharField(max_length=50, choices=NotificationEvent.NOTIFICATION_TYPES, default='other')
+    category = models.CharField(max_length=20, choices=NotificationEvent.CATEGORIES, default='system')
+    metadata = models.JSONField(null=True, blank=True)
+    show_as_dialog = models.BooleanField(default=False)
+    priority = models.CharField(max_length=10, choices=NotificationEvent.PRIORITY_CHOICES, default='medium')
+    is_promotional = models.BooleanField(default=False)
+    push_data = models.JSONField(null=True, blank=True)  # FCM data payload
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Notification Outbox Entry'
+        verbose_name_plural = 'Notification Outbox'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.title}"
+
+
+class NotificationCampaign(BaseModel):
+    """An admin notification to many users, created and pushed in chunks by a Celery task (see campaign_service.py)"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    AUDIENCE_CHOICES = [
+        ('all', 'All users'),
+        ('active', 'Active users'),
+        ('role', 'Active users with a role'),
+        ('users', 'Listed users'),
+    ]
+
+    created_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    title = models.CharField(max_length=100)
+    message = models.TextField()
+    type = models.CharField(max_length=50, choices=NotificationEvent.NOTIFICATION_TYPES, default='other')
+    category = models.CharField(max_length=20, choices=NotificationEvent.CATEGORIES, default='system')
+    metadata = models.JSONField(null=True, blank=True)
+    send_push = models.BooleanField(default=True, help_text="Push as well as create the in-app notifications")
+    push_data = models.JSONField(null=True, blank=True)  # FCM data payload
+
+    audience = models.CharField(max_length=10, choices=AUDIENCE_CHOICES, default='active')
+    role = models.CharField(max_length=20, blank=True)
+    user_ids = models.JSONField(null=True, blank=True)
+
+    # Progress: users are taken in id order, cursor is the last one done
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    total_users = models.PositiveIntegerField(null=True, blank=True)
+    cursor = models.UUIDField(null=True, blank=True)
+    processed = models.PositiveIntegerField(default=0)
+    chunks = models.PositiveIntegerField(default=0)
+    delivered_realtime = models.PositiveIntegerField(default=0)
+    pushed = models.PositiveIntegerField(default=0)
+    push_failed = models.PositiveIntegerField(default=0)
+    no_token = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Notification Campaign'
+        verbose_name_plural = 'Notification Campaigns'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='ntf_cmp_st_cr_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.status})"
+
+    @property
+    def elapsed_seconds(self):
+        if not self.started_at:
+            return None
+        return ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+
+    @property
+    def users_per_second(self):
+        elapsed = self.elapsed_seconds
+        if not elapsed:
+            return None
+        return round(self.processed / elapsed, 1)
 
 
 class UserPreferences(BaseModel):
@@ -105,6 +295,8 @@ class UserPreferences(BaseModel):
     enable_push_notifications = models.BooleanField(default=True)
     enable_sms_notifications = models.BooleanField(default=False)
     enable_email_notifications = models.BooleanField(default=True)
+    # Minutes before a parking session ends to be alerted; empty uses the zone's thresholds
+    parking_alert_minutes = models.JSONField(default=list, blank=True)
     
     # Display Preferences
     theme_mode = models.CharField(
@@ -175,6 +367,12 @@ class ChatConversation(BaseModel):
     
     def __str__(self):
         return f"Chat #{self.id} - {self.user.phone}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        
+        from apps.notifications.counters import conversation_changed
+        conversation_changed([self.user_id, self.assigned_agent_id])
 
 
 class ChatMessage(BaseModel):
@@ -202,4 +400,12 @@ class ChatMessage(BaseModel):
         ]
     
     def __str__(self):
-        return f"Message in conversation {self.conversation.id}"
\ No newline at end of file
+        return f"Message in conversation {self.conversation.id}"
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        
+        if adding:
+            from apps.notifications.counters import chat_message_added
+            chat_message_added(self)
\ No newline at end of file
@@ -3,12 +3,16 @@ Notification Trigger Functions
 
 Helper functions to create and send notifications for common events
 in the parking system (parking sessions, payments, violations, etc.)
+
+Notifications go through the outbox (see outbox.py): each trigger writes one
+row in the caller's transaction, and the NotificationEvent is created and
+pushed by the relay after commit.
 """
 
 import logging
 from django.utils import timezone
 from .models import NotificationEvent
-from .firebase_service import send_notification_to_user
+from . import outbox
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +29,7 @@ def notify_parking_started(session):
     title = "Parking Session Started"
     message = f"Your parking at {session.zone.name} has started. Session ends at {session.planned_end_time.strftime('%I:%M %p')}"
     
-    notification = NotificationEvent.objects.create(
+    notification = NotificationEvent(
         user=user,
         title=title,
         message=message,
@@ -41,21 +45,15 @@ def notify_parking_started(session):
         }
     )
     
-    send_notification_to_user(
-        user=user,
-        title=title,
-        body=message,
-        data={
-            'type': 'parking_started',
-            'session_id': str(session.id),
-            'zone_id': str(session.zone.id),
-            'slot_code': session.parking_slot.slot_code if session.parking_slot else '',
-            'show_dialog': 'true',  # Flag to show in-app dialog
-        },
-        notification_event=notification
-    )
+    outbox.enqueue(notification, {
+        'type': 'parking_started',
+        'session_id': str(session.id),
+        'zone_id': str(session.zone.id),
+        'slot_code': session.parking_slot.slot_code if session.parking_slot else '',
+        'show_dialog': 'true',  # Flag to show in-app dialog
+    })
     
-    logger.info(f"Sent parking started notification to user {user.id} for session {session.id}")
+    logger.info(f"Queued parking started notification to user {user.id} for session {session.id}")
 
 
 def notify_parking_expiring_soon(session, minutes_remaining: int):
@@ -72,7 +70,7 @@ def notify_parking_expiring_soon(session, minutes_remaining: int):
     message = f"Your parking session at {session.zone.name} expires in {minutes_remaining} minutes."
     
     # Create notification event
-    notification = NotificationEvent.objects.create(
+    notification = NotificationEvent(
         user=user,
         title=title,
         message=message,
@@ -87,30 +85,28 @@ def notify_parking_expiring_soon(session, minutes_remaining: int):
         }
     )
     
-    # Send push notification
-    send_notification_to_user(
-        user=user,
-        title=title,
-        body=message,
-        data={
-            'type': 'parking_expiring',
-            'session_id': str(session.id),
-            'zone_id': str(session.zone.id),
-            'minutes_remaining': str(minutes_remaining),
-            'show_dialog': 'true',  # Flag to show in-app dialog
-        },
-        notification_event=notification
-    )
+    # Saved and pushed once the transaction commits
+    outbox.enqueue(notification, {
+        'type': 'parking_expiring',
+        'session_id': str(session.id),
+        'zone_id': str(session.zone.id),
+        'minutes_remaining': str(minutes_remaining),
+        'show_dialog': 'true',  # Flag to show in-app dialog
+    })
     
-    logger.info(f"Sent parking expiring notification to user {user.id} for session {session.id}")
+    logger.info(f"Queued parking expiring notification to user {user.id} for session {session.id}")
 
 
-def notify_parking_ended(session):
+def build_parking_ended_notification(session):
     """
-    Notify user that their parking session has ended
+    Build (but don't save) the parking ended NotificationEvent and its push data.
+    Shared by notify_parking_ended and the bulk expiry pipeline.
     
     Args:
         session: ParkingSession instance
+    
+    Returns:
+        tuple: (unsaved NotificationEvent, push data dict)
     """
     user = session.vehicle.user
     
@@ -127,7 +123,7 @@ def notify_parking_ended(session):
         title = "Parking Session Ended"
         message = f"Your parking session at {session.zone.name} has ended. Total cost: {symbol} {session.final_cost}"
     
-    notification = NotificationEvent.objects.create(
+    notification = NotificationEvent(
         user=user,
         title=title,
         message=message,
@@ -141,22 +137,29 @@ def notify_parking_ended(session):
             'duration_minutes': session.duration_minutes,
         }
     )
+    push_data = {
+        'type': 'parking_ended',
+        'session_id': str(session.id),
+        'zone_id': str(session.zone.id),
+        'final_cost': str(session.final_cost),
+        'show_dialog': 'true',  # Flag to show in-app dialog
+    }
+    return notification, push_data
+
+
+def notify_parking_ended(session):
+    """
+    Notify user that their parking session has ended
     
-    send_notification_to_user(
-        user=user,
-        title=title,
-        body=message,
-        data={
-            'type': 'parking_ended',
-            'session_id': str(session.id),
-            'zone_id': str(session.zone.id),
-            'final_cost': str(session.final_cost),
-            'show_dialog': 'true',  # Flag to show in-app dialog
-        },
-        notification_event=notification
-    )
+    Args:
+        session: ParkingSession instance
+    """
+    user = session.vehicle.user
+    notification, push_data = build_parking_ended_notification(session)
     
-    logger.info(f"Sent parking ended notification to user {user.id} for session {session.id}")
+    outbox.enqueue(notification, push_data)
+    
+    logger.info(f"Queued parking ended notification to user {user.id} for session {session.id}")
 
 
 def notify_payment_success(payment):
@@ -186,7 +189,7 @@ def notify_payment_success(payment):
     title = "Payment Successful"
     message = f"Your payment of {symbol} {amount} was successful."
     
-    notification = NotificationEvent.objects.create(
+    notification = NotificationEvent(
         user=user,
         title=title,
         message=message,
@@ -199,20 +202,14 @@ def notify_payment_success(payment):
         }
     )
     
-    send_notification_to_user(
-        user=user,
-        title=title,
-        body=message,
-        data={
-            'type': 'payment_success',
-            'payment_id': str(payment_id),
-            'amount': str(amount),
-            'show_dialog': 'true',  # Flag to show in-app dialog
-        },
-        notification_event=notification
-    )
+    outbox.enqueue(notification, {
+        'type': 'payment_success',
+        'payment_id': str(payment_id),
+        'amount': str(amount),
+        'show_dialog': 'true',  # Flag to show in-app dialog
+    })
     
-    logger.info(f"Sent payment success notification to user {user.id} for payment {payment_id}")
+    logger.info(f"Queued payment success notification to user {user.id} for payment {payment_id}")
 
 
 def notify_payment_failed(payment, reason: str = ""):
@@ -233,7 +230,7 @@ def notify_payment_failed(payment, reason: str = ""):
     if reason:
         message += f" Reason: {reason}"
     
-    notification = NotificationEvent.objects.create(
+    notification = NotificationEvent(
         user=user,
         title=title,
         message=message,
@@ -246,19 +243,13 @@ def notify_payment_failed(payment, reason: str = ""):
         }
     )
     
-    send_notification_to_user(
-        user=user,
-        title=title,
-        body=message,
-        data={
-            'type': 'payment_failed',
-            'payment_id': str(payment.id),
-            'amount': str(payment.amount),
-        },
-        notification_event=notification
-    )
+    outbox.enqueue(notification, {
+        'type': 'payment_failed',
+        'payment_id': str(payment.id),
+        'amount': str(payment.amount),
+    })
     
-    logger.info(f"Sent payment failed notification to user {user.id} for payment {payment.id}")
+    logger.info(f"Queued payment failed notification to user {user.id} for payment {payment.id}")
 
 
 def notify_violation_issued(violation):
@@ -276,7 +267,7 @@ def notify_violation_issued(violation):
     title = "Parking Violation Issued"
     message = f"A parking violation has been issued for {violation.vehicle.license_plate}. Fine: {symbol} {violation.fine_amount}"
     
-    notification = NotificationEvent.objects.create(
+    notification = NotificationEvent(
         user=user,
         title=title,
         message=message,
@@ -291,19 +282,13 @@ def notify_violation_issued(violation):
         }
     )
     
-    send_notification_to_user(
-        user=user,
-        title=title,
-        body=message,
-        data={
-            'type': 'violation_issued',
-            'violation_id': str(violation.id),
-            'fine_amount': str(violation.fine_amount),
-        },
-        notification_event=notification
-    )
+    outbox.enqueue(notification, {
+        'type': 'violation_issued',
+        'violation_id': str(violation.id),
+        'fine_amount': str(violation.fine_amount),
+    })
     
-    logger.info(f"Sent violation notification to user {user.id} for violation {violation.id}")
+    logger.info(f"Queued violation notification to user {user.id} for violation {violation.id}")
 
 
 def notify_custom(user, title: str, message: str, category: str = 'system', data: dict = None):
@@ -317,7 +302,7 @@ def notify_custom(user, title: str, message: str, category: str = 'system', data
         category: Notification category
         data: Optional custom data dictionary
     """
-    notification = NotificationEvent.objects.create(
+    notification = NotificationEvent(
         user=user,
         title=title,
         message=message,
@@ -326,18 +311,12 @@ def notify_custom(user, title: str, message: str, category: str = 'system', data
         metadata=data or {}
     )
     
-    send_notification_to_user(
-        user=user,
-        title=title,
-        body=message,
-        data={
-            'type': 'custom',
-            **(data or {})
-        },
-        notification_event=notification
-    )
+    outbox.enqueue(notification, {
+        'type': 'custom',
+        **(data or {})
+    })
     
-    logger.info(f"Sent custom notification to user {user.id}")
+    logger.info(f"Queued custom notification to user {user.id}")
 
 
 def notify_officer_zone_assignment(officer, zone):
@@ -351,7 +330,7 @@ def notify_officer_zone_assignment(officer, zone):
     title = "Zone Assignment"
     message = f"You have been assigned to monitor {zone.name}."
     
-    notification = NotificationEvent.objects.create(
+    notification = NotificationEvent(
         user=officer,
         title=title,
         message=message,
@@ -363,18 +342,12 @@ def notify_officer_zone_assignment(officer, zone):
         }
     )
     
-    send_notification_to_user(
-        user=officer,
-        title=title,
-        body=message,
-        data={
-            'type': 'zone_assignment',
-            'zone_id': str(zone.id),
-        },
-        notification_event=notification
-    )
+    outbox.enqueue(notification, {
+        'type': 'zone_assignment',
+        'zone_id': str(zone.id),
+    })
     
-    logger.info(f"Sent zone assignment notification to officer {officer.id}")
+    logger.info(f"Queued zone assignment notification to officer {officer.id}")
 
 
 def notify_wallet_refund(wallet_transaction, parking_session):
@@ -393,7 +366,7 @@ def notify_wallet_refund(wallet_transaction, parking_session):
     title = "Wallet Refund"
     message = f"You've been refunded {symbol} {wallet_transaction.amount} for ending your parking session early at {parking_session.zone.name}."
     
-    notification = NotificationEvent.objects.create(
+    notification = NotificationEvent(
         user=user,
         title=title,
         message=message,
@@ -407,21 +380,15 @@ def notify_wallet_refund(wallet_transaction, parking_session):
         }
     )
     
-    send_notification_to_user(
-        user=user,
-        title=title,
-        body=message,
-        data={
-            'type': 'wallet_refund',
-            'wallet_transaction_id': str(wallet_transaction.id),
-            'session_id': str(parking_session.id),
-            'amount': str(wallet_transaction.amount),
-            'show_dialog': 'true',  # Flag to show in-app dialog
-        },
-        notification_event=notification
-    )
+    outbox.enqueue(notification, {
+        'type': 'wallet_refund',
+        'wallet_transaction_id': str(wallet_transaction.id),
+        'session_id': str(parking_session.id),
+        'amount': str(wallet_transaction.amount),
+        'show_dialog': 'true',  # Flag to show in-app dialog
+    })
     
-    logger.info(f"Sent wallet refund notification to user {user.id} for {wallet_transaction.amount}")
+    logger.info(f"Queued wallet refund notification to user {user.id} for {wallet_transaction.amount}")
 
 
 def notify_reservation_confirmed(reservation):
@@ -435,7 +402,7 @@ def notify_reservation_confirmed(reservation):
     title = "Reservation Confirmed"
     message = f"Your parking reservation at {reservation.zone.name} is confirmed for {start_time}."
     
-    notification = NotificationEvent.objects.create(
+    notification = NotificationEvent(
         user=user,
         title=title,
         message=message,
@@ -448,19 +415,13 @@ def notify_reservation_confirmed(reservation):
         }
     )
     
-    send_notification_to_user(
-        user=user,
-        title=title,
-        body=message,
-        data={
-            'type': 'reservation_confirmed',
-            'reservation_id': str(reservation.id),
-            'zone_name': reservation.zone.name,
-            'show_dialog': 'true',
-        },
-        notification_event=notification
-    )
-    logger.info(f"Sent reservation confirmed notification to user {user.id}")
+    outbox.enqueue(notification, {
+        'type': 'reservation_confirmed',
+        'reservation_id': str(reservation.id),
+        'zone_name': reservation.zone.name,
+        'show_dialog': 'true',
+    })
+    logger.info(f"Queued reservation confirmed notification to user {user.id}")
 
 
 def notify_reservation_cancelled(reservation):
@@ -473,7 +434,7 @@ def notify_reservation_cancelled(reservation):
     title = "Reservation Cancelled"
     message = f"Your parking reservation at {reservation.zone.name} has been cancelled."
     
-    notification = NotificationEvent.objects.create(
+    notification = NotificationEvent(
         user=user,
         title=title,
         message=message,
@@ -485,15 +446,9 @@ def notify_reservation_cancelled(reservation):
         }
     )
     
-    send_notification_to_user(
-        user=user,
-        title=title,
-        body=message,
-        data={
-            'type': 'reservation_cancelled',
-            'reservation_id': str(reservation.id),
-            'show_dialog': 'true',
-        },
-        notification_event=notification
-    )
-    logger.info(f"Sent reservation cancelled notification to user {user.id}")
+    outbox.enqueue(notification, {
+        'type': 'reservation_cancelled',
+        'reservation_id': str(reservation.id),
+        'show_dialog': 'true',
+    })
+    logger.info(f"Queued reservation cancelled notification to user {user.id}")
@@ -0,0 +1,132 @@
+"""
+Transactional notification outbox.
+
+The notify_* triggers used to create the NotificationEvent and queue its push
+inside the caller's transaction, so paths such as starting or ending a parking
+session held their row locks through that ORM work and a broker round trip,
+and pushed notifications for work that was later rolled back. They now write
+one NotificationOutbox row, which commits or rolls back with the caller's
+work, and ask for a relay once the transaction commits.
+
+The relay drains the outbox in batches of NOTIFICATION_OUTBOX_BATCH_SIZE:
+each batch is taken with SKIP LOCKED (so relays running at once split the
+rows), turned into NotificationEvents with one bulk_create and deleted in the
+same transaction. After it commits, connected users get theirs over the
+WebSocket and the rest go to the push dispatcher. A beat entry relays
+whatever a lost relay request left behind.
+"""
+from django.conf import settings
+from django.db import transaction
+import logging
+import weakref
+
+from . import counters
+
+logger = logging.getLogger(__name__)
+
+# NotificationEvent fields copied through the outbox
+EVENT_FIELDS = ('user_id', 'title', 'message', 'type', 'category', 'metadata',
+                'show_as_dialog', 'priority', 'is_promotional')
+
+
+def enqueue(notification, push_data=None):
+    """
+    Write an unsaved NotificationEvent to the outbox, to be saved and pushed
+    with push_data once the current transaction commits.
+    """
+    from .models import NotificationOutbox
+    entry = NotificationOutbox.objects.create(
+        push_data=push_data, **{field: getattr(notification, field) for field in EVENT_FIELDS}
+    )
+    _relay_on_commit()
+    return entry
+
+
+def enqueue_many(notifications_with_data) -> list:
+    """Write many (unsaved NotificationEvent, push_data) pairs to the outbox with one insert, see enqueue."""
+    from .models import NotificationOutbox
+    entries = NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(push_data=push_data, **{field: getattr(notification, field) for field in EVENT_FIELDS})
+        for notification, push_data in notifications_with_data
+    ])
+    if entries:
+        _relay_on_commit()
+    return entries
+
+
+class _RelayRequest:
+    """The relay requested by one transaction, run by on_commit"""
+
+    def __call__(self):
+        request_relay()
+
+
+def _relay_on_commit() -> None:
+    # One relay request per transaction, however many notifications it wrote.
+    # The connection only holds a weak reference to the pending request: Django
+    # drops its on-commit callbacks once they ran, or when the transaction (or
+    # the savepoint that registered them) rolls back, which frees the request
+    # and so clears the flag for the next transaction.
+    connection = transaction.get_connection()
+    pending = getattr(connection, 'notification_relay_request', None)
+    if connection.in_atomic_block and pending is not None and pending() is not None:
+        return
+    relay_request = _RelayRequest()
+    connection.notification_relay_request = weakref.ref(relay_request)
+    transaction.on_commit(relay_request)
+
+
+def request_relay() -> None:
+    from . import tasks
+    try:
+        tasks.relay_notification_outbox_task.delay()
+    except Exception as e:
+        # The rows stay in the outbox for the scheduled relay
+        logger.warning(f"Could not queue the notification outbox relay: {e}")
+
+
+def relay(batch_size=None, max_batches=None) -> dict:
+    """
+    Relay outbox rows until it is empty or max_batches were taken.
+    Returns {'relayed', 'batches', 'pushed'}.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_OUTBOX_BATCH_SIZE
+    max_batches = max_batches or settings.NOTIFICATION_OUTBOX_MAX_BATCHES
+    totals = {'relayed': 0, 'batches': 0, 'pushed': 0}
+    while totals['batches'] < max_batches:
+        events_with_data = relay_batch(batch_size)
+        if not events_with_data:
+            break
+        totals['relayed'] += len(events_with_data)
+        totals['batches'] += 1
+        totals['pushed'] += deliver(events_with_data)
+        if len(events_with_data) < batch_size:
+            break
+    if totals['relayed']:
+        logger.info(f"Relayed notification outbox: {totals}")
+    return totals
+
+
+@transaction.atomic
+def relay_batch(batch_size) -> list:
+    """Turn the oldest batch_size outbox rows into NotificationEvents. Returns [(event, push_data)]."""
+    from .models import NotificationEvent, NotificationOutbox
+    entries = list(NotificationOutbox.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size])
+    if not entries:
+        return []
+    events = NotificationEvent.objects.bulk_create([
+        NotificationEvent(**{field: getattr(entry, field) for field in EVENT_FIELDS}) for entry in entries
+    ])
+    NotificationOutbox.objects.filter(id__in=[entry.id for entry in entries]).delete()
+    counters.notifications_added(events)
+    return [(event, entry.push_data) for event, entry in zip(events, entries)]
+
+
+def deliver(events_with_data) -> int:
+    """Socket delivery for connected users, batched FCM pushes for the rest. Returns the number left for FCM."""
+    from . import push_dispatcher
+    from .firebase_service import deliver_events_over_socket
+    payload = deliver_events_over_socket(events_with_data)
+    if payload:
+        push_dispatcher.dispatch_events(payload)
+    return len(payload)
@@ -0,0 +1,203 @@
+"""
+Batched delivery of FCM pushes.
+
+Pushes used to go out one Celery task per user, each re-loading the User and
+NotificationEvent and making its own FCM request. The dispatcher takes a whole
+set of pushes, loads what it needs in one query and sends them in batches of up
+to FCM_BATCH_SIZE messages (FCM's limit is 500 per send_each call), with at most
+FCM_DISPATCH_WORKERS batches in flight at once. Results are written back in bulk:
+one UPDATE for the events that were sent, one per distinct error for the rest,
+and one UPDATE clearing every token FCM reported as unregistered.
+
+With FCM_STANDIN_URL set, batches go to the local stand-in (manage.py
+fcm_standin) instead of Firebase, so throughput can be measured offline.
+"""
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+import logging
+import requests
+
+from firebase_admin import messaging
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 500
+UNREGISTERED_ERROR = "Device token unregistered"
+
+# ref: the NotificationEvent id, or None for pushes without one
+Push = namedtuple('Push', 'ref user_id token title body data')
+# error is None for a sent push
+Result = namedtuple('Result', 'error unregistered')
+
+_standin_session = None
+
+
+def batch_size() -> int:
+    return max(1, min(settings.FCM_BATCH_SIZE, MAX_BATCH_SIZE))
+
+
+def enabled() -> bool:
+    return settings.FIREBASE_ENABLED or bool(settings.FCM_STANDIN_URL)
+
+
+def _send_firebase(batch) -> list:
+    from . import firebase_service
+    if not firebase_service._firebase_initialized:
+        firebase_service.initialize_firebase()
+
+    results = [None] * len(batch)
+    messages, positions = [], []
+    for position, push in enumerate(batch):
+        try:
+            messages.append(firebase_service.build_message(push.token, push.title, push.body, push.data))
+            positions.append(position)
+        except ValueError as e:
+            # e.g. non-string data values: only this push fails
+            results[position] = Result(str(e), False)
+
+    if messages:
+        response = messaging.send_each(messages)
+        for position, sent in zip(positions, response.responses):
+            if sent.success:
+                results[position] = Result(None, False)
+            else:
+                unregistered = isinstance(sent.exception, messaging.UnregisteredError)
+                results[position] = Result(UNREGISTERED_ERROR if unregistered else str(sent.exception), unregistered)
+    return results
+
+
+def _send_standin(batch) -> list:
+    global _standin_session
+    if _standin_session is None:
+        _standin_session = requests.Session()
+    response = _standin_session.post(
+        f"{settings.FCM_STANDIN_URL.rstrip('/')}/batch",
+        json={'messages': [
+            {'token': push.token, 'title': push.title, 'body': push.body, 'data': push.data or {}}
+            for push in batch
+        ]},
+        timeout=30
+    )
+    response.raise_for_status()
+    results = []
+    for sent in response.json()['responses']:
+        error = sent.get('error')
+        if error is None:
+            results.append(Result(None, False))
+        elif error['code'] == 'UNREGISTERED':
+            results.append(Result(UNREGISTERED_ERROR, True))
+        else:
+            results.append(Result(error.get('message') or error['code'], False))
+    return results
+
+
+def _send_batch(batch) -> list:
+    try:
+        if settings.FCM_STANDIN_URL:
+            return _send_standin(batch)
+        return _send_firebase(batch)
+    except Exception as e:
+        # The whole batch failed (network, auth...)
+        logger.error(f"FCM batch of {len(batch)} failed: {e}")
+        return [Result(str(e), False)] * len(batch)
+
+
+def send(pushes) -> dict:
+    """
+    Send pushes in batches on a bounded pool and record the results. Returns
+    {'sent', 'failed', 'unregistered', 'batches'}.
+    """
+    pushes = list(pushes)
+    stats = {'sent': 0, 'failed': 0, 'unregistered': 0, 'batches': 0}
+    if not pushes:
+        return stats
+
+    size = batch_size()
+    batches = [pushes[start:start + size] for start in range(0, len(pushes), size)]
+    stats['batches'] = len(batches)
+    workers = max(1, min(settings.FCM_DISPATCH_WORKERS, len(batches)))
+    sent_refs, errors, unregistered = [], defaultdict(list), {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch, results in zip(batches, pool.map(_send_batch, batches)):
+            for push, result in zip(batch, results):
+                if result.error is None:
+                    stats['sent'] += 1
+                    if push.ref:
+                        sent_refs.append(push.ref)
+                    continue
+                stats['failed'] += 1
+                if push.ref:
+                    errors[result.error].append(push.ref)
+                if result.unregistered:
+                    unregistered[push.token] = push.user_id
+
+    stats['unregistered'] = len(unregistered)
+    record_results(sent_refs, errors)
+    clear_tokens(unregistered)
+    logger.info(f"Pushed {len(pushes)} notifications in {len(batches)} batches: {stats}")
+    return stats
+
+
+def record_results(sent_refs, errors) -> None:
+    """Mark sent NotificationEvents in one UPDATE, and failed ones in one per distinct error"""
+    from .models import NotificationEvent
+    if sent_refs:
+        NotificationEvent.objects.filter(id__in=sent_refs).update(sent_via_push=True, push_sent_at=timezone.now())
+    for error, refs in errors.items():
+        NotificationEvent.objects.filter(id__in=refs).update(push_error=error)
+
+
+def clear_tokens(unregistered) -> None:
+    """Forget every device token FCM reported as unregistered ({token: user_id}), in one UPDATE"""
+    from apps.accounts.models import User
+    from apps.accounts.user_cache import user_changed
+    if not unregistered:
+        return
+    with transaction.atomic():
+        User.objects.filter(fcm_device_token__in=list(unregistered)).update(
+            fcm_device_token=None, fcm_token_updated_at=None
+        )
+        # update() skips User.save, which would drop the cached snapshots
+        for user_id in set(unregistered.values()):
+            user_changed(user_id, ['fcm_device_token'])
+    logger.warning(f"Cleared {len(unregistered)} unregistered FCM tokens")
+
+
+def dispatch_events(payload) -> dict:
+    """
+    Push saved NotificationEvents. payload is a list of [notification_event_id,
+    data] pairs (see send_notification_events). Events whose user has no
+    device token are skipped.
+    """
+    from .models import NotificationEvent
+    if not enabled():
+        logger.debug("Firebase is disabled, skipping push notifications")
+        return {'sent': 0, 'failed': 0, 'unregistered': 0, 'batches': 0, 'no_token': len(payload)}
+
+    data_by_id = {str(event_id): data for event_id, data in payload}
+    rows = NotificationEvent.objects.filter(id__in=list(data_by_id)).values_list(
+        'id', 'user_id', 'user__fcm_device_token', 'title', 'message'
+    )
+    pushes = [
+        Push(event_id, user_id, token, title, message, data_by_id.get(str(event_id)))
+        for event_id, user_id, token, title, message in rows if token
+    ]
+    stats = send(pushes)
+    stats['no_token'] = len(data_by_id) - len(pushes)
+    return stats
+
+
+def push_to_users(user_ids, title: str, body: str, data=None) -> dict:
+    """The same push to every user in user_ids that has a device token"""
+    from apps.accounts.models import User
+    if not enabled():
+        logger.debug("Firebase is disabled, skipping push notifications")
+        return {'sent': 0, 'failed': 0, 'unregistered': 0, 'batches': 0}
+
+    rows = User.objects.filter(id__in=list(user_ids), fcm_device_token__isnull=False).exclude(
+        fcm_device_token=''
+    ).values_list('id', 'fcm_device_token')
+    return send(Push(None, user_id, token, title, body, data) for user_id, token in rows)
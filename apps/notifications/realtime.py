@@ -0,0 +1,102 @@
+"""
+Real-time delivery of user events over the per-user WebSocket group (user_<id>).
+
+UserEventsConsumer keeps a presence counter per user in the cache while the user
+has live connections. Notifications for a user who is connected are delivered
+over the socket instead of FCM; offline users still get the push.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Connections refresh their presence every PRESENCE_HEARTBEAT seconds; a crashed
+# worker's connections stop counting once PRESENCE_TTL passes without a refresh
+PRESENCE_TTL = 90
+PRESENCE_HEARTBEAT = 30
+
+
+def user_group_name(user_id) -> str:
+    return f"user_{user_id}"
+
+
+def presence_key(user_id) -> str:
+    return f"ws_online_{user_id}"
+
+
+def connection_opened(user_id) -> None:
+    key = presence_key(user_id)
+    cache.add(key, 0, PRESENCE_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between add and incr
+        cache.set(key, 1, PRESENCE_TTL)
+
+
+def connection_alive(user_id) -> None:
+    if not cache.touch(presence_key(user_id), PRESENCE_TTL):
+        connection_opened(user_id)
+
+
+def connection_closed(user_id) -> None:
+    key = presence_key(user_id)
+    try:
+        if cache.decr(key) <= 0:
+            cache.delete(key)
+    except ValueError:
+        pass
+
+
+def is_online(user_id) -> bool:
+    try:
+        return (cache.get(presence_key(user_id)) or 0) > 0
+    except Exception:
+        # Presence unknown: let the caller fall back to FCM
+        return False
+
+
+def online_user_ids(user_ids) -> set:
+    """The subset of user_ids with a live connection, in one cache round trip"""
+    keys = {presence_key(user_id): user_id for user_id in set(user_ids)}
+    try:
+        counts = cache.get_many(list(keys))
+    except Exception:
+        return set()
+    return {keys[key] for key, count in counts.items() if count and count > 0}
+
+
+def send_to_user(user_id, payload: dict) -> bool:
+    """Send payload to the user's live connections. Returns False if it wasn't sent."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return False
+    try:
+        async_to_sync(channel_layer.group_send)(user_group_name(user_id), {'type': 'user.event', 'payload': payload})
+        return True
+    except Exception as e:
+        logger.warning(f"Could not send real-time event to user {user_id}: {e}")
+        return False
+
+
+def notification_payload(title: str, body: str, data=None, notification_event=None) -> dict:
+    notification = {'title': title, 'message': body}
+    if notification_event is not None:
+        notification.update({
+            'id': str(notification_event.id),
+            'type': notification_event.type,
+            'category': notification_event.category,
+            'metadata': notification_event.metadata,
+            'created_at': notification_event.created_at.isoformat() if notification_event.created_at else None,
+        })
+    return {'type': 'notification', 'notification': notification, 'data': data or {}}
+
+
+def deliver_notification(user_id, title: str, body: str, data=None, notification_event=None) -> bool:
+    """Deliver a notification over the socket if the user is connected. False means use FCM."""
+    if not is_online(user_id):
+        return False
+    return send_to_user(user_id, notification_payload(title, body, data, notification_event))
@@ -2,11 +2,13 @@
 Serializers for Notifications App
 """
 from rest_framework import serializers
-from .models import NotificationEvent, UserPreferences, ChatConversation, ChatMessage
+from .counters import conversation_unread_counts, notification_counts
+from .models import NotificationEvent, NotificationCampaign, UserPreferences, ChatConversation, ChatMessage
 
 
 class NotificationSerializer(serializers.ModelSerializer):
     """Serialize notification events"""
+    is_read = serializers.BooleanField(source='read_state', read_only=True)
     
     class Meta:
         model = NotificationEvent
@@ -19,6 +21,7 @@ class NotificationSerializer(serializers.ModelSerializer):
 
 class NotificationListSerializer(serializers.ModelSerializer):
     """Simplified notification serializer for list views"""
+    is_read = serializers.BooleanField(source='read_state', read_only=True)
     
     class Meta:
         model = NotificationEvent
@@ -26,43 +29,53 @@ class NotificationListSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
+class NotificationCampaignSerializer(serializers.ModelSerializer):
+    """Progress and throughput of an admin notification campaign"""
+    elapsed_seconds = serializers.FloatField(read_only=True)
+    users_per_second = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = NotificationCampaign
+        fields = [
+            'id', 'title', 'message', 'type', 'category', 'send_push', 'audience', 'role',
+            'status', 'total_users', 'processed', 'chunks', 'delivered_realtime', 'pushed',
+            'push_failed', 'no_token', 'started_at', 'finished_at', 'elapsed_seconds',
+            'users_per_second', 'error', 'created_at'
+        ]
+        read_only_fields = fields
+
+
 class NotificationSummarySerializer(serializers.Serializer):
-    """Summary of notification counts"""
+    """Summary of notification counts (from the cached counters, see counters.py)"""
     unread_count = serializers.SerializerMethodField()
     total_count = serializers.SerializerMethodField()
     parking_count = serializers.SerializerMethodField()
     violation_count = serializers.SerializerMethodField()
     payment_count = serializers.SerializerMethodField()
     
+    def _counts(self):
+        if not hasattr(self, '_cached_counts'):
+            request = self.context.get('request')
+            if request and request.user.is_authenticated:
+                self._cached_counts = notification_counts(request.user.id)
+            else:
+                self._cached_counts = {}
+        return self._cached_counts
+    
     def get_unread_count(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return request.user.notifications.filter(is_read=False).count()
-        return 0
+        return self._counts().get('unread', 0)
     
     def get_total_count(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return request.user.notifications.count()
-        return 0
+        return self._counts().get('total', 0)
     
     def get_parking_count(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return request.user.notifications.filter(category='parking').count()
-        return 0
+        return self._counts().get('parking', 0)
     
     def get_violation_count(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return request.user.notifications.filter(category='violations').count()
-        return 0
+        return self._counts().get('violations', 0)
     
     def get_payment_count(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return request.user.notifications.filter(category='payments').count()
-        return 0
+        return self._counts().get('payments', 0)
 
 
 class UserPreferencesSerializer(serializers.ModelSerializer):
@@ -75,13 +88,21 @@ class UserPreferencesSerializer(serializers.ModelSerializer):
             'enable_parking_notifications', 'enable_violation_notifications',
             'enable_payment_notifications', 'enable_promotional_notifications',
             'enable_push_notifications', 'enable_sms_notifications',
-            'enable_email_notifications',
+            'enable_email_notifications', 'parking_alert_minutes',
             'theme_mode', 'font_size',
             'biometric_enabled', 'two_factor_enabled',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def validate_parking_alert_minutes(self, value):
+        from apps.parking.services.session_alert_service import MAX_THRESHOLDS
+        if not isinstance(value, list) or not all(isinstance(m, int) and 0 < m <= 24 * 60 for m in value):
+            raise serializers.ValidationError("Must be a list of minutes between 1 and 1440.")
+        if len(set(value)) > MAX_THRESHOLDS:
+            raise serializers.ValidationError(f"At most {MAX_THRESHOLDS} alerts can be set.")
+        return sorted(set(value), reverse=True)
+
 
 class CreateNotificationSerializer(serializers.ModelSerializer):
     """Serializer for creating notifications (admin/backend use)"""
@@ -141,11 +162,19 @@ class ChatConversationSerializer(serializers.ModelSerializer):
     
     def get_agent_phone(self, obj):
         if obj.assigned_agent:
-            return obj.assigned_agent.phone
+            return str(obj.assigned_agent.phone)
         return None
     
     def get_unread_count(self, obj):
-        return obj.messages.filter(is_read=False).count()
+        # Read for the whole page at once from the cached counters
+        if not hasattr(self, '_unread_counts'):
+            conversations = [obj]
+            if isinstance(self.parent, serializers.ListSerializer) and self.parent.instance is not None:
+                conversations = list(self.parent.instance)
+            self._unread_counts = conversation_unread_counts([conversation.id for conversation in conversations])
+        if obj.id not in self._unread_counts:
+            self._unread_counts.update(conversation_unread_counts([obj.id]))
+        return self._unread_counts[obj.id]
     
     def get_last_message(self, obj):
         last_msg = obj.messages.last()
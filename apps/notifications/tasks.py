@@ -1,6 +1,6 @@
 from celery import shared_task
 from django.contrib.auth import get_user_model
-from . import firebase_service, twilio_service
+from . import counters, firebase_service, outbox, push_dispatcher, twilio_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,6 +30,58 @@ def send_firebase_notification_task(user_id, title, body, data=None, notificatio
     except Exception as e:
         logger.error(f"Error in send_firebase_notification_task: {e}")
 
+@shared_task
+def send_notification_events_task(payload):
+    """
+    Async task to push a batch of NotificationEvents.
+    payload is a list of [notification_event_id, data] pairs.
+    """
+    stats = push_dispatcher.dispatch_events(payload)
+    return f"Pushed {stats['sent']}/{len(payload)} notifications in {stats['batches']} batches."
+
+@shared_task
+def send_push_to_users_task(user_ids, title, body, data=None):
+    """
+    Async task to send the same push to many users in FCM batches.
+    """
+    stats = push_dispatcher.push_to_users(user_ids, title, body, data)
+    return f"Pushed {stats['sent']}/{len(user_ids)} users in {stats['batches']} batches."
+
+@shared_task
+def relay_notification_outbox_task():
+    """
+    Async task to turn outbox rows into NotificationEvents and push them.
+    Queued after each commit that wrote to the outbox, and on beat as a safety net.
+    """
+    totals = outbox.relay()
+    return f"Relayed {totals['relayed']} notifications in {totals['batches']} batches."
+
+@shared_task
+def repair_notification_counters_task():
+    """
+    Recompute the cached unread counters of recently active users from the database.
+    """
+    totals = counters.repair_recent()
+    return f"Repaired counters of {totals['repaired']}/{totals['users']} users, {totals['conversations']} conversations."
+
+@shared_task(bind=True, acks_late=True, max_retries=3)
+def run_campaign_task(self, campaign_id):
+    """
+    Async task to work through a notification campaign in chunks.
+    Queues the next run when its time budget is spent.
+    """
+    from .campaign_service import CampaignService
+    try:
+        finished = CampaignService.run(campaign_id)
+    except Exception as e:
+        if self.request.retries >= self.max_retries:
+            CampaignService.fail(campaign_id, str(e))
+            raise
+        raise self.retry(exc=e, countdown=30 * 2 ** self.request.retries)
+    if not finished:
+        run_campaign_task.delay(campaign_id)
+    return f"Campaign {campaign_id}: {'finished' if finished else 'continues'}."
+
 @shared_task
 def send_twilio_verification_task(to_phone, channel='sms'):
     """
@@ -16,7 +16,7 @@ urlpatterns = [
     
     # Notification endpoints
     path('notifications/', api_views.NotificationListAPIView.as_view(), name='notification-list'),
-    path('notifications/<int:pk>/', api_views.NotificationDetailAPIView.as_view(), name='notification-detail'),
+    path('notifications/<uuid:pk>/', api_views.NotificationDetailAPIView.as_view(), name='notification-detail'),
     path('notifications/summary/', api_views.NotificationSummaryAPIView.as_view(), name='notification-summary'),
     path('notifications/mark-all-as-read/', api_views.MarkAllNotificationsAsReadAPIView.as_view(), name='mark-all-as-read'),
     
@@ -29,6 +29,8 @@ urlpatterns = [
     # Admin endpoints
     path('create/<int:user_id>/', api_views.CreateNotificationAPIView.as_view(), name='create-notification'),
     path('bulk-create/', api_views.BulkCreateNotificationsAPIView.as_view(), name='bulk-create-notifications'),
+    path('campaigns/', api_views.NotificationCampaignListAPIView.as_view(), name='notification-campaigns'),
+    path('campaigns/<uuid:pk>/', api_views.NotificationCampaignDetailAPIView.as_view(), name='notification-campaign-detail'),
     
     # FCM Push Notification endpoints
     path('fcm/register-token/', api_views.RegisterFCMTokenAPIView.as_view(), name='fcm-register-token'),
@@ -9,9 +9,10 @@ from rest_framework.views import APIView
 from apps.common.constants import ParkingStatus, SlotStatus
 from .models import Zone, ParkingSlot, ParkingSession, Reservation
 from .serializers import ZoneSerializer, ParkingSessionSerializer, ReservationSerializer
+from .services.slot_allocation_service import SlotAllocationService
 
 class ZoneListView(generics.ListAPIView):
-    queryset = Zone.objects.filter(is_active=True)
+    queryset = Zone.objects.filter(is_active=True).select_related('occupancy')
     serializer_class = ZoneSerializer
     permission_classes = [IsAuthenticated]
 
@@ -20,9 +21,9 @@ class ZoneAvailabilityView(APIView):
 
     def get(self, request, zone_id):
         try:
-            zone = Zone.objects.get(id=zone_id, is_active=True)
-            available_slots = zone.slots.filter(status=SlotStatus.AVAILABLE).count()
-            total_slots = zone.slots.count()
+            zone = Zone.objects.select_related('occupancy').get(id=zone_id, is_active=True)
+            available_slots = zone.available_slots_count
+            total_slots = zone.total_slots_count
             
             return Response({
                 'zone': ZoneSerializer(zone).data,
@@ -55,9 +56,10 @@ class StartParkingView(APIView):
             # Handle slot selection
             parking_slot = None
             if slot_id:
-                parking_slot = ParkingSlot.objects.get(id=slot_id, zone=zone, status=SlotStatus.AVAILABLE)
-                parking_slot.status = SlotStatus.OCCUPIED
-                parking_slot.save()
+                parking_slot = SlotAllocationService.claim_slot(zone, slot_id=slot_id)
+                if not parking_slot:
+                    return Response({'error': 'Selected parking slot is not available'},
+                                  status=status.HTTP_400_BAD_REQUEST)
             
             # Create session
             planned_end = timezone.now() + timedelta(hours=duration_hours)
@@ -68,19 +68,9 @@ def officer_zones(request):
         )
     
     # Get assigned zones with stats
-    zones = request.user.assigned_zones.filter(is_active=True).prefetch_related('slots')
+    zones = request.user.assigned_zones.filter(is_active=True).select_related('occupancy')
     
-    zones_data = []
-    for zone in zones:
-        # Get active sessions count in this zone
-        active_sessions = ParkingSession.objects.filter(
-            zone=zone,
-            status=ParkingStatus.ACTIVE
-        ).count()
-        
-        zone_data = ZoneSerializer(zone).data
-        zone_data['active_sessions'] = active_sessions
-        zones_data.append(zone_data)
+    zones_data = [ZoneSerializer(zone).data for zone in zones]
     
     return Response({
         'zones': zones_data,
@@ -111,7 +101,7 @@ def officer_zone_sessions(request, zone_id):
         )
     
     try:
-        zone = Zone.objects.get(id=zone_id, is_active=True)
+        zone = Zone.objects.select_related('occupancy').get(id=zone_id, is_active=True)
         
         # Get active and expired sessions
         sessions = ParkingSession.objects.filter(
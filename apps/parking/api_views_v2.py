@@ -11,7 +11,7 @@ import logging
 from django.utils import timezone
 from django.db import transaction
 from decimal import Decimal
-from django.db.models import Q
+from django.db.models import Q, F, Case, When
 from rest_framework import status, generics
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -21,11 +21,17 @@ from rest_framework.views import APIView
 from apps.common.constants import ParkingStatus, SlotStatus
 from .models import Zone, ParkingSlot, ParkingSession, Reservation
 from .serializers_v2 import (
-    ZoneListSerializer, ZoneDetailSerializer, ParkingSessionSerializer,
+    ZoneListSerializer, ZoneNearbySerializer, ZoneDetailSerializer, ParkingSessionSerializer,
     ReservationSerializer, StartParkingSerializer, EndParkingSerializer,
-    CreateReservationSerializer
+    CreateReservationSerializer, ReservationSearchSerializer
 )
-from apps.payments.models import WalletTransaction
+from .services.zone_search_service import ZoneSearchService, zone_list_cache, ZONE_LIST_VERSION_KEY
+from .services.slot_allocation_service import SlotAllocationService
+from .services.capacity_ledger_service import CapacityLedgerService, BUCKET_MINUTES
+from apps.payments.wallet_service import WalletService, InsufficientFunds
+from apps.common.idempotency import idempotent
+
+logger = logging.getLogger(__name__)
 
 class ZoneListAPIView(generics.ListAPIView):
     """List all active parking zones"""
@@ -34,7 +40,7 @@ class ZoneListAPIView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = Zone.objects.filter(is_active=True)
+        queryset = Zone.objects.filter(is_active=True).select_related('occupancy')
         
         # Filter by user's country
         if hasattr(self.request.user, 'country') and self.request.user.country:
@@ -58,13 +64,61 @@ class ZoneListAPIView(generics.ListAPIView):
         # Filter by availability
         available_only = self.request.query_params.get('available_only', 'false').lower() == 'true'
         if available_only:
-            queryset = queryset.exclude(slots__status=SlotStatus.AVAILABLE, slots__isnull=False).distinct()
+            # Same capacity rule as Zone.capacity, evaluated against the occupancy counters
+            queryset = queryset.annotate(
+                live_capacity=Case(
+                    When(total_slots__gt=0, then=F('total_slots')),
+                    default=F('occupancy__slots_total')
+                )
+            ).filter(live_capacity__gt=F('occupancy__active_sessions'))
         
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        data = zone_list_cache.get_or_compute(
+            ZoneSearchService.zone_list_key('zones', request),
+            lambda: super(ZoneListAPIView, self).list(request, *args, **kwargs).data,
+            version_key=ZONE_LIST_VERSION_KEY
+        )
+        return Response(data)
+
+class ZoneNearbyAPIView(generics.ListAPIView):
+    """List active zones within `radius` meters of `lat`/`lon`, closest first"""
+    serializer_class = ZoneNearbySerializer
+    permission_classes = [IsAuthenticated]
+    
+    DEFAULT_RADIUS_METERS = 2000
+    MAX_RADIUS_METERS = 50000
+    
+    def list(self, request, *args, **kwargs):
+        try:
+            latitude = float(request.query_params['lat'])
+            longitude = float(request.query_params['lon'])
+            radius = float(request.query_params.get('radius', self.DEFAULT_RADIUS_METERS))
+        except (KeyError, ValueError):
+            return Response({
+                'error': 'lat and lon are required and lat, lon and radius must be numbers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or not 0 < radius <= self.MAX_RADIUS_METERS:
+            return Response({
+                'error': f'Invalid coordinates or radius (radius must be between 0 and {self.MAX_RADIUS_METERS} meters)'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = Zone.objects.filter(is_active=True).select_related('occupancy')
+        if hasattr(request.user, 'country') and request.user.country and not request.user.is_superuser:
+            queryset = queryset.filter(country=request.user.country)
+        
+        zones = ZoneSearchService.nearby(latitude, longitude, radius, queryset=queryset)
+        
+        page = self.paginate_queryset(zones)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(zones, many=True).data)
+
 class ZoneDetailAPIView(generics.RetrieveAPIView):
     """Get detailed information about a specific zone"""
-    queryset = Zone.objects.filter(is_active=True)
+    queryset = Zone.objects.filter(is_active=True).select_related('occupancy')
     serializer_class = ZoneDetailSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'pk'
@@ -75,12 +129,13 @@ class ZoneAvailabilityAPIView(APIView):
     
     def get(self, request, zone_id):
         try:
-            zone = Zone.objects.get(id=zone_id, is_active=True)
+            zone = Zone.objects.select_related('occupancy').get(id=zone_id, is_active=True)
+            occupancy = zone.get_occupancy()
             
-            available_slots = zone.available_slots_count
-            occupied_slots = zone.occupied_slots_count
-            reserved_slots = zone.slots.filter(status=SlotStatus.RESERVED).count()
-            disabled_slots = zone.slots.filter(status=SlotStatus.DISABLED).count()
+            available_slots = occupancy.slots_available
+            occupied_slots = occupancy.slots_occupied
+            reserved_slots = occupancy.slots_reserved
+            disabled_slots = occupancy.slots_disabled
             total_slots = zone.capacity
             
             return Response({
@@ -107,11 +162,11 @@ class StartParkingAPIView(APIView):
     """Start a parking session"""
     permission_classes = [IsAuthenticated]
     
+    @idempotent('parking_start')
     @transaction.atomic
     def post(self, request):
         serializer = StartParkingSerializer(data=request.data)
         if not serializer.is_valid():
-            logger = logging.getLogger(__name__)
             logger.error(f"StartParkingAPIView: Serializer validation failed: {serializer.errors}. Data: {request.data}")
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
@@ -119,7 +174,6 @@ class StartParkingAPIView(APIView):
             vehicle = request.user.vehicles.get(id=serializer.validated_data['vehicle_id'], is_active=True)
             zone = Zone.objects.get(id=serializer.validated_data['zone_id'], is_active=True)
             duration_hours = float(serializer.validated_data.get('duration_hours', 1))
-            logger = logging.getLogger(__name__)
             
             # Check for active session
             active_session = ParkingSession.objects.filter(
@@ -139,33 +193,6 @@ class StartParkingAPIView(APIView):
                     'session': ParkingSessionSerializer(active_session).data
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Handle slot assignment
-            parking_slot = None
-            slot_id = serializer.validated_data.get('slot_id')
-            
-            if slot_id:
-                try:
-                    parking_slot = ParkingSlot.objects.get(
-                        id=slot_id,
-                        zone=zone,
-                        status=SlotStatus.AVAILABLE
-                    )
-                except ParkingSlot.DoesNotExist:
-                    return Response({
-                        'error': 'Selected parking slot is not available'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                # Auto-assign first available slot
-                parking_slot = zone.slots.filter(status=SlotStatus.AVAILABLE).first()
-                if not parking_slot:
-                    return Response({
-                        'error': 'No available slots in this zone'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Update slot status
-            parking_slot.status = SlotStatus.OCCUPIED
-            parking_slot.save()
-            
             # Create parking session with proper decimal handling
             planned_end = timezone.now() + timedelta(hours=duration_hours)
             estimated_cost = zone.hourly_rate * Decimal(str(duration_hours))
@@ -176,24 +203,35 @@ class StartParkingAPIView(APIView):
             initial_status = ParkingStatus.ACTIVE
             
             if payment_method == 'wallet':
-                if request.user.wallet_balance < estimated_cost:
+                # Checked and deducted in one statement, so concurrent spends can't overdraw
+                try:
+                    wallet_tx = WalletService.debit(
+                        request.user,
+                        estimated_cost,
+                        'payment',
+                        f'Parking payment for zone {zone.name}',
+                        allow_negative=False
+                    )
+                except InsufficientFunds as e:
                     return Response({
-                        'error': f'Insufficient wallet balance. Required: UGX {estimated_cost}, Available: UGX {request.user.wallet_balance}'
+                        'error': f'Insufficient wallet balance. Required: UGX {estimated_cost}, Available: UGX {e.balance}'
                     }, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Deduct from wallet
-                request.user.wallet_balance -= estimated_cost
-                request.user.save()
-                
-                # Create wallet transaction
-                wallet_tx = WalletTransaction.objects.create(
-                    user=request.user,
-                    amount=estimated_cost,
-                    transaction_type='payment',
-                    status='completed',
-                    description=f'Parking payment for zone {zone.name}'
-                )
-                
+            
+            # Claim a slot (row-locked with SKIP LOCKED until this transaction commits)
+            slot_id = serializer.validated_data.get('slot_id')
+            parking_slot = SlotAllocationService.claim_slot(
+                zone,
+                slot_id=slot_id,
+                slot_type=serializer.validated_data.get('slot_type')
+            )
+            if not parking_slot:
+                # Undo the debit
+                transaction.set_rollback(True)
+                return Response({
+                    'error': 'Selected parking slot is not available' if slot_id else 'No available slots in this zone'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            if payment_method == 'wallet':
                 # Send payment success notification
                 from apps.notifications.notification_triggers import notify_payment_success
                 notify_payment_success(wallet_tx)
@@ -221,7 +259,8 @@ class StartParkingAPIView(APIView):
             }, status=status.HTTP_201_CREATED)
             
         except Exception as e:
-            print(f"DEBUG ERROR: {str(e)}")
+            logger.exception(f"StartParkingAPIView: could not start parking: {e}")
+            transaction.set_rollback(True)
             return Response({
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
@@ -264,7 +303,7 @@ class EndParkingAPIView(APIView):
                 'error': 'Parking session not found'
             }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
-            print(f"DEBUG ERROR: {str(e)}")
+            logger.exception(f"EndParkingAPIView: could not end session: {e}")
             return Response({
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
@@ -273,6 +312,7 @@ class ExtendParkingAPIView(APIView):
     """Extend an active parking session"""
     permission_classes = [IsAuthenticated]
     
+    @idempotent('parking_extend')
     @transaction.atomic
     def post(self, request):
         session_id = request.data.get('session_id')
@@ -311,7 +351,7 @@ class ExtendParkingAPIView(APIView):
                 'error': 'Parking session not found'
             }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
-            print(f"DEBUG ERROR: {str(e)}")
+            logger.exception(f"ExtendParkingAPIView: could not extend session: {e}")
             return Response({
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
@@ -340,17 +380,11 @@ class CancelParkingSessionAPIView(APIView):
             refund_amount = session.cancel_session()
             
             if refund_amount > 0:
-                # Credit user wallet
-                user = request.user
-                user.wallet_balance += refund_amount
-                user.save()
-                
-                # Create wallet transaction record
-                WalletTransaction.objects.create(
-                    user=user,
-                    amount=refund_amount,
-                    transaction_type='refund',
-                    description=f"Refund for cancelled session at {session.zone.name}",
+                WalletService.credit(
+                    request.user,
+                    refund_amount,
+                    'refund',
+                    f"Refund for cancelled session at {session.zone.name}",
                     parking_session=session
                 )
             
@@ -398,6 +432,7 @@ class CreateReservationAPIView(APIView):
     """Create a parking reservation"""
     permission_classes = [IsAuthenticated]
     
+    @idempotent('reservation_create')
     def post(self, request):
         serializer = CreateReservationSerializer(data=request.data)
         if not serializer.is_valid():
@@ -458,6 +493,51 @@ class CreateReservationAPIView(APIView):
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
+class ReservationSearchAPIView(APIView):
+    """
+    Where can I park between start_time and end_time near lat/lon?
+    Returns nearby zones, bookable ones first, each with its free capacity per 15 minute bucket.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        serializer = ReservationSearchSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
+        
+        queryset = Zone.objects.filter(is_active=True).select_related('occupancy')
+        if hasattr(request.user, 'country') and request.user.country and not request.user.is_superuser:
+            queryset = queryset.filter(country=request.user.country)
+        zones = ZoneSearchService.nearby(params['lat'], params['lon'], params['radius'], queryset=queryset)
+        
+        buckets, free = CapacityLedgerService.free_capacity(zones, params['start_time'], params['end_time'])
+        
+        results = []
+        for zone in zones:
+            min_free = max(min(free[zone.id], default=0), 0)
+            results.append({
+                'zone': ZoneNearbySerializer(zone, context={'request': request}).data,
+                'bookable': min_free > 0,
+                'min_free': min_free,
+                'estimated_cost': float(zone.hourly_rate * Decimal(str((params['end_time'] - params['start_time']).total_seconds() / 3600))),
+                'free_capacity': [
+                    {'time': bucket.isoformat(), 'free': max(count, 0)}
+                    for bucket, count in zip(buckets, free[zone.id])
+                ],
+            })
+        
+        # Bookable zones first, then closest (zones are already ordered by distance)
+        results.sort(key=lambda result: not result['bookable'])
+        
+        return Response({
+            'start_time': params['start_time'],
+            'end_time': params['end_time'],
+            'bucket_minutes': BUCKET_MINUTES,
+            'count': len(results),
+            'results': results[:params['limit']]
+        }, status=status.HTTP_200_OK)
+
 class UserReservationsAPIView(generics.ListAPIView):
     """List user's parking reservations"""
     permission_classes = [IsAuthenticated]
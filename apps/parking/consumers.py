@@ -0,0 +1,87 @@
+import json
+import uuid
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+
+from apps.common.constants import UserRole
+
+# Close codes for a zone the socket can't watch
+CLOSE_INVALID_ZONE = 4400
+CLOSE_ZONE_NOT_FOUND = 4404
+
+
+class ZoneOccupancyConsumer(AsyncWebsocketConsumer):
+    """
+    Live occupancy of one zone for officers and the admin dashboard.
+
+    On connect the client gets a full snapshot ({"type": "snapshot", "data": ...},
+    same shape as the officer live-status endpoint), then one {"type": "delta", ...}
+    message per change published by ZoneLiveStatusService: session_started,
+    session_ended, session_extended, sessions_ended (bulk expiry), slot and
+    slot_removed. Deltas are keyed by session/slot id so applying one that the
+    snapshot already reflects is harmless.
+
+    A malformed zone id closes the socket with CLOSE_INVALID_ZONE and a zone
+    that doesn't exist (or no longer does) with CLOSE_ZONE_NOT_FOUND, after an
+    {"type": "error", ...} frame when it was already being watched.
+    """
+
+    async def connect(self):
+        from apps.parking.services.zone_live_service import ZoneLiveStatusService
+
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated or not (
+            user.is_superuser or user.role in (UserRole.OFFICER, UserRole.ADMIN)
+        ):
+            await self.close()
+            return
+
+        # Accepted first so the client sees why a bad zone is refused
+        try:
+            self.zone_id = str(uuid.UUID(self.scope['url_route']['kwargs']['zone_id']))
+        except ValueError:
+            await self.accept()
+            await self.close(code=CLOSE_INVALID_ZONE)
+            return
+
+        # Join before taking the snapshot so no change falls between the two
+        self.group_name = ZoneLiveStatusService.group_name(self.zone_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+
+        snapshot = await self.get_snapshot()
+        await self.accept()
+        if snapshot is None:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await self.close(code=CLOSE_ZONE_NOT_FOUND)
+            return
+        await self.send(text_data=json.dumps({'type': 'snapshot', 'data': snapshot}))
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data):
+        # Clients only listen; a "snapshot" message asks for a fresh snapshot (e.g. after a reconnect)
+        try:
+            message = json.loads(text_data or '{}')
+        except ValueError:
+            return
+        if isinstance(message, dict) and message.get('type') == 'snapshot':
+            snapshot = await self.get_snapshot()
+            if snapshot is None:
+                await self.send(text_data=json.dumps({'type': 'error', 'error': 'zone_not_found'}))
+                await self.close(code=CLOSE_ZONE_NOT_FOUND)
+                return
+            await self.send(text_data=json.dumps({'type': 'snapshot', 'data': snapshot}))
+
+    # Receive a change from the zone group
+    async def zone_delta(self, event):
+        await self.send(text_data=json.dumps({'type': 'delta', **event['event']}))
+
+    @database_sync_to_async
+    def get_snapshot(self):
+        from apps.parking.models import Zone
+        from apps.parking.services.zone_live_service import ZoneLiveStatusService
+
+        zone = Zone.all_objects.filter(id=self.zone_id).first()
+        return ZoneLiveStatusService.live_status(zone) if zone else None
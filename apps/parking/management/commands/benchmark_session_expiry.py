@@ -0,0 +1,108 @@
+from datetime import timedelta
+from decimal import Decimal
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.accounts.models import User, Vehicle
+from apps.common.models import Country
+from apps.notifications.models import NotificationEvent, NotificationOutbox
+from apps.parking.models import Zone, ParkingSlot, ParkingSession, SessionDeadline
+from apps.parking.services.occupancy_service import OccupancyService
+from apps.parking.services.session_expiry_service import SessionExpiryService, DEFAULT_CHUNK_SIZE
+from apps.common.constants import ParkingStatus, SlotStatus
+from apps.common.management.harness import HarnessCommand
+
+BENCH_ZONE_CODE = 'BENCHEXP'
+
+
+class Command(HarnessCommand):
+    help = 'Benchmark SessionExpiryService on a large batch of simultaneously expiring sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=10000, help='Sessions expiring at once')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data')
+
+    def handle(self, *args, **options):
+        n, chunk_size = options['sessions'], options['chunk_size']
+        self.stdout.write(f"Preparing {n} expired sessions...")
+        self._cleanup()
+
+        now = timezone.now()
+        zone = Zone.all_objects.create(
+            country=Country.objects.first(), name='Benchmark Zone Expiry', code=BENCH_ZONE_CODE,
+            hourly_rate=Decimal('1000'), latitude=0, longitude=0
+        )
+        users = User.objects.bulk_create([
+            # Every third driver can't cover the overdue charge and gets a violation
+            User(phone=f"+2567108{i:05d}", email=f"bench_exp_{i}@example.com", first_name='Bench',
+                 last_name='Driver', password='!', wallet_balance=Decimal('0') if i % 3 == 0 else Decimal('50000'))
+            for i in range(n)
+        ], batch_size=1000)
+        vehicles = Vehicle.objects.bulk_create([
+            Vehicle(user=user, license_plate=f"BEXP{i:06d}", make='Bench', model='Car', color='Grey')
+            for i, user in enumerate(users)
+        ], batch_size=1000)
+        slots = ParkingSlot.objects.bulk_create([
+            ParkingSlot(zone=zone, slot_code=f"E{i:05d}", status=SlotStatus.OCCUPIED) for i in range(n)
+        ], batch_size=1000)
+        sessions = ParkingSession.objects.bulk_create([
+            ParkingSession(
+                vehicle=vehicle, zone=zone, parking_slot=slot,
+                start_time=now - timedelta(hours=1, minutes=30),
+                planned_end_time=now - timedelta(minutes=30),
+                estimated_cost=Decimal('1000'), status=ParkingStatus.ACTIVE
+            )
+            for vehicle, slot in zip(vehicles, slots)
+        ], batch_size=1000)
+        SessionDeadline.objects.bulk_create([
+            SessionDeadline(session=session, due_at=session.planned_end_time) for session in sessions
+        ], batch_size=1000)
+        OccupancyService.rebuild(zone.id)
+
+        self.stdout.write(f"Expiring {n} sessions in chunks of {chunk_size}...")
+        with CaptureQueriesContext(connection) as queries:
+            started = time.monotonic()
+            stats = SessionExpiryService.expire_overdue(now=now, chunk_size=chunk_size)
+            elapsed = time.monotonic() - started
+
+        self.stdout.write(
+            f"Expired {stats.get('expired', 0)} sessions in {elapsed:.2f}s "
+            f"({stats.get('expired', 0) / elapsed:.0f} sessions/s, {len(queries)} queries)"
+        )
+        self.stdout.write(
+            f"Charged {stats.get('charged', 0)}, violations {stats.get('violations', 0)}, "
+            f"overdue total UGX {stats.get('amount', 0)}"
+        )
+
+        drift = OccupancyService.reconcile(zone_ids=[zone.id], repair=False)
+        remaining = ParkingSession.objects.filter(zone=zone, status=ParkingStatus.ACTIVE).count()
+        deadlines = SessionDeadline.objects.filter(session__zone=zone).count()
+        if remaining == 0 and deadlines == 0 and not drift and stats.get('expired') == n:
+            self.stdout.write(self.style.SUCCESS(
+                "SUCCESS: All sessions expired from the deadline queue and occupancy counters in sync"
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"FAILED: {remaining} sessions still active, {deadlines} deadlines left, drift: {drift}"
+            ))
+
+        # Each expiry notification is saved by the outbox relay, or still waiting in the outbox
+        notified = sum(
+            model.objects.filter(user__email__startswith='bench_exp_', type='parking_ended').count()
+            for model in (NotificationEvent, NotificationOutbox)
+        )
+        if notified == n:
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Every expired session was handed one expiry notification"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: {notified} expiry notifications for {n} expired sessions"))
+
+        if not options['keep']:
+            self._cleanup()
+
+    def _cleanup(self):
+        Zone.all_objects.filter(code=BENCH_ZONE_CODE).delete()
+        User.objects.filter(email__startswith='bench_exp_').delete()
@@ -0,0 +1,145 @@
+from datetime import timedelta
+from decimal import Decimal
+import asyncio
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from apps.accounts.models import User, Vehicle
+from apps.common.constants import UserRole
+from apps.common.models import Country
+from apps.parking.consumers import CLOSE_INVALID_ZONE, CLOSE_ZONE_NOT_FOUND
+from apps.parking.models import Zone, ParkingSlot, ParkingSession
+from apps.parking.routing import websocket_urlpatterns
+from apps.parking.services.occupancy_service import OccupancyService
+from apps.parking.services.zone_live_service import ZoneLiveStatusService
+from apps.common.management.harness import HarnessCommand
+
+BENCH_ZONE_CODE = 'BENCHWS'
+
+IN_MEMORY_LAYER = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        'CONFIG': {'capacity': 1000},
+    }
+}
+
+
+class Command(HarnessCommand):
+    help = 'Benchmark ZoneOccupancyConsumer fan-out with many subscribers per zone on an in-memory channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=300, help='WebSocket clients watching the zone')
+        parser.add_argument('--events', type=int, default=50, help='Deltas to publish')
+
+    def handle(self, *args, **options):
+        n_subscribers, n_events = options['subscribers'], options['events']
+        self._cleanup()
+        country = Country.objects.first()
+        self.zone = Zone.all_objects.create(
+            country=country, name='Benchmark Zone Fanout', code=BENCH_ZONE_CODE,
+            hourly_rate=Decimal('1000'), latitude=0, longitude=0
+        )
+        self.slots = ParkingSlot.objects.bulk_create([
+            ParkingSlot(zone=self.zone, slot_code=f"W{i:04d}") for i in range(max(n_events, 1))
+        ])
+        OccupancyService.rebuild(self.zone.id)
+        self.officer = User.objects.create(
+            email='bench_ws_officer@example.com', phone='+256710990001', first_name='Bench', role=UserRole.OFFICER
+        )
+        driver = User.objects.create(email='bench_ws_driver@example.com', phone='+256710990002', first_name='Bench')
+        self.vehicle = Vehicle.objects.create(user=driver, license_plate='BWS0001', make='Bench', model='Car', color='Grey')
+
+        try:
+            with override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER):
+                asyncio.run(self._run(n_subscribers, n_events))
+        finally:
+            self._cleanup()
+
+    async def _run(self, n_subscribers, n_events):
+        application = URLRouter(websocket_urlpatterns)
+        path = f"/ws/zones/{self.zone.id}/"
+
+        # 1. Connect the subscribers; each gets the initial snapshot
+        self.stdout.write(f"1. Connecting {n_subscribers} subscribers to {path}...")
+        started = time.monotonic()
+        communicators = []
+        for _ in range(n_subscribers):
+            communicator = WebsocketCommunicator(application, path)
+            communicator.scope['user'] = self.officer
+            connected, _ = await communicator.connect()
+            if not connected:
+                self.stdout.write(self.style.ERROR("FAILED: Subscriber was refused"))
+                return
+            snapshot = await communicator.receive_json_from()
+            assert snapshot['type'] == 'snapshot'
+            communicators.append(communicator)
+        self.stdout.write(f"Connected in {time.monotonic() - started:.2f}s")
+
+        # 2. A real parking write reaches every subscriber as a delta
+        self.stdout.write("2. Starting a parking session through the ORM...")
+        session = await sync_to_async(ParkingSession.objects.create)(
+            vehicle=self.vehicle, zone=self.zone, parking_slot=self.slots[0],
+            planned_end_time=timezone.now() + timedelta(hours=1), estimated_cost=Decimal('1000')
+        )
+        received = await asyncio.gather(*(c.receive_json_from(timeout=5) for c in communicators))
+        if all(m['event'] == 'session_started' and m['session']['id'] == str(session.id) for m in received):
+            self.stdout.write(self.style.SUCCESS(f"SUCCESS: All {n_subscribers} subscribers got session_started"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: Unexpected deltas: {received[:3]}"))
+
+        # 3. Raw fan-out throughput: publish deltas and wait until every subscriber has them all
+        self.stdout.write(f"3. Publishing {n_events} slot deltas...")
+        channel_layer = get_channel_layer()
+        group = ZoneLiveStatusService.group_name(self.zone.id)
+        started = time.monotonic()
+        for slot in self.slots[:n_events]:
+            await channel_layer.group_send(group, {'type': 'zone.delta', 'event': {
+                'event': 'slot', 'slot_id': str(slot.id), 'slot_code': slot.slot_code, 'status': 'occupied'
+            }})
+
+        async def drain(communicator):
+            return [await communicator.receive_json_from(timeout=10) for _ in range(n_events)]
+
+        deliveries = await asyncio.gather(*(drain(c) for c in communicators))
+        elapsed = time.monotonic() - started
+        delivered = sum(len(d) for d in deliveries)
+        self.stdout.write(
+            f"Delivered {delivered} deltas ({n_events} x {n_subscribers}) in {elapsed:.2f}s "
+            f"({delivered / elapsed:.0f} deltas/s, {elapsed * 1000 / n_events:.1f}ms per delta to all subscribers)"
+        )
+        if delivered == n_events * n_subscribers:
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Every subscriber received every delta"))
+        else:
+            self.stdout.write(self.style.ERROR("FAILED: Deltas were lost"))
+
+        # 4. Zones that can't be watched close the socket with a 44xx code instead of an error
+        results = []
+        for zone_id in ('1234-abcd', uuid.uuid4()):
+            communicator = WebsocketCommunicator(application, f"/ws/zones/{zone_id}/")
+            communicator.scope['user'] = self.officer
+            await communicator.connect()
+            results.append((await communicator.receive_output(timeout=5)).get('code'))
+        await sync_to_async(Zone.all_objects.filter(id=self.zone.id).delete)()
+        await communicators[0].send_json_to({'type': 'snapshot'})
+        error = await communicators[0].receive_json_from(timeout=5)
+        results.append((error.get('error'), (await communicators[0].receive_output(timeout=5)).get('code')))
+        if results == [CLOSE_INVALID_ZONE, CLOSE_ZONE_NOT_FOUND, ('zone_not_found', CLOSE_ZONE_NOT_FOUND)]:
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Malformed and missing zones close the socket cleanly"))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"FAILED: Malformed id, missing zone, deleted zone snapshot gave {results}"
+            ))
+
+        for communicator in communicators:
+            await communicator.disconnect()
+
+    def _cleanup(self):
+        Zone.all_objects.filter(code=BENCH_ZONE_CODE).delete()
+        User.objects.filter(email__startswith='bench_ws_').delete()
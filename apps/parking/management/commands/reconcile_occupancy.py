@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from apps.parking.services.occupancy_service import OccupancyService
+
+
+class Command(BaseCommand):
+    help = 'Compare zone occupancy counters with slot/session rows and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zone', action='append', dest='zones', help='Zone ID to check (repeatable, default: all zones)')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without repairing it')
+
+    def handle(self, *args, **options):
+        repair = not options['dry_run']
+        drifted = OccupancyService.reconcile(zone_ids=options['zones'], repair=repair)
+
+        for zone_id, diff in drifted:
+            details = ', '.join(f"{field}: {stored} -> {actual}" for field, (stored, actual) in diff.items())
+            self.stdout.write(self.style.WARNING(f"Zone {zone_id}: {details}"))
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All zone occupancy counters are in sync'))
+        elif repair:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drifted)} zones"))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(drifted)} zones drifted (dry run, nothing changed)"))
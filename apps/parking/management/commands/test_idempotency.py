@@ -0,0 +1,105 @@
+from decimal import Decimal
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apps.accounts.authentication import start_device_session
+from apps.accounts.models import User, Vehicle
+from apps.common.idempotency import fingerprint, idempotency_cache_key
+from apps.parking.models import Zone, ParkingSlot, ParkingSession
+from apps.payments.models import WalletTransaction
+from apps.payments.wallet_service import WalletService
+from apps.common.management.harness import HarnessCommand
+
+BENCH_ZONE_CODE = 'BENCHIDEM'
+BENCH_PHONE = '+256710880004'
+START_URL = '/api/user/parking/start/'
+
+
+class Command(HarnessCommand):
+    help = 'Verify Idempotency-Key handling on parking start: replays, concurrent duplicates and key reuse'
+
+    def handle(self, *args, **options):
+        self._cleanup()
+        zone = Zone.all_objects.create(
+            name='Benchmark Zone Idempotency', code=BENCH_ZONE_CODE,
+            hourly_rate=Decimal('1000'), latitude=0, longitude=0
+        )
+        ParkingSlot.objects.bulk_create([ParkingSlot(zone=zone, slot_code=f"I{i}") for i in range(3)])
+        user = User.objects.create(phone=BENCH_PHONE, first_name='Bench', password='!')
+        vehicle = Vehicle.objects.create(user=user, license_plate='IDEM001', make='Test', model='Car', color='Red')
+        WalletService.credit(user, Decimal('5000'), 'topup', 'Benchmark top-up')
+        refresh = start_device_session(user)
+        user.save()
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        body = {'vehicle_id': str(vehicle.id), 'zone_id': str(zone.id), 'duration_hours': 1}
+        try:
+            self._verify_replay(client, body, user)
+            self._verify_concurrent_duplicate(client, body, user)
+            self._verify_reuse(client, body)
+        finally:
+            self._cleanup()
+
+    def _verify_replay(self, client, body, user):
+        key = uuid.uuid4().hex
+        first = client.post(START_URL, body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        with CaptureQueriesContext(connection) as queries:
+            retry = client.post(START_URL, body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+        sessions = ParkingSession.objects.filter(vehicle__user=user).count()
+        debits = WalletTransaction.objects.filter(user=user, transaction_type='payment').count()
+        if (first.status_code == 201 and retry.status_code == 201 and retry.json() == first.json()
+                and retry.headers.get('Idempotent-Replayed') == 'true' and sessions == 1 and debits == 1):
+            self.stdout.write(self.style.SUCCESS(
+                f"SUCCESS: Retry replayed the stored response with {len(queries)} queries; one session, one debit"
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"FAILED: statuses {first.status_code}/{retry.status_code}, {sessions} sessions, {debits} debits"
+            ))
+
+    def _verify_concurrent_duplicate(self, client, body, user):
+        # A first attempt that is still running: the duplicate waits for its response
+        key = uuid.uuid4().hex
+        first_attempt = Request(APIRequestFactory().post(START_URL, body, format='json'), parsers=[JSONParser()])
+        first_attempt.user = user
+        cache_key = idempotency_cache_key('parking_start', first_attempt, key)
+        cache.set(cache_key, {'state': 'in_flight', 'fingerprint': fingerprint(first_attempt)}, 60)
+
+        def finish_first_attempt():
+            time.sleep(0.3)
+            entry = cache.get(cache_key)
+            cache.set(cache_key, {**entry, 'state': 'done', 'status': 201, 'data': {'message': 'first'}}, 60)
+
+        threading.Thread(target=finish_first_attempt).start()
+
+        started = time.perf_counter()
+        duplicate = client.post(START_URL, body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        waited = time.perf_counter() - started
+        if duplicate.status_code == 201 and duplicate.json() == {'message': 'first'}:
+            self.stdout.write(self.style.SUCCESS(f"SUCCESS: Concurrent duplicate waited {waited:.2f}s for the first response"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: Concurrent duplicate got {duplicate.status_code} {duplicate.json()}"))
+
+    def _verify_reuse(self, client, body):
+        key = uuid.uuid4().hex
+        client.post(START_URL, body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        reused = client.post(START_URL, {**body, 'duration_hours': 2}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        if reused.status_code == 422:
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Reusing a key for a different request is refused"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: Reused key got {reused.status_code}"))
+
+    def _cleanup(self):
+        ParkingSession.objects.filter(zone__code=BENCH_ZONE_CODE).delete()
+        Zone.all_objects.filter(code=BENCH_ZONE_CODE).delete()
+        User.objects.filter(phone=BENCH_PHONE).delete()
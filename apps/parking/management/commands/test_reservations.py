@@ -1,9 +1,10 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
-from apps.parking.models import Zone, Reservation
+from apps.parking.models import Zone, Reservation, ParkingSession
 from apps.accounts.models import User, Vehicle
 from apps.parking.services.reservation_service import ReservationService
+from apps.parking.services.capacity_ledger_service import CapacityLedgerService
 
 class Command(BaseCommand):
     help = 'Verify ReservationService Logic'
@@ -26,8 +27,10 @@ class Command(BaseCommand):
         zone.total_slots = 1
         zone.save()
         
-        # Cleanup
+        # Cleanup (queryset delete bypasses the ledger, so rebuild it)
         Reservation.objects.filter(zone=zone).delete()
+        ParkingSession.objects.filter(zone=zone).delete()
+        CapacityLedgerService.rebuild(zone.id)
 
         now = timezone.now() + timedelta(hours=1)
         end = now + timedelta(hours=2)
@@ -67,3 +70,35 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS(f"SUCCESS: Reservation created. Status: {res3.status}"))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"FAILED: {e}"))
+
+        # 5. Cancelling releases the ledger buckets
+        self.stdout.write("4. Cancelling first reservation and retrying the overlap (Should Succeed)...")
+        ReservationService.cancel_reservation(Reservation.objects.get(id=res1.id))
+        try:
+            res4 = ReservationService.create_reservation(vehicle2, zone, now, end)
+            self.stdout.write(self.style.SUCCESS(f"SUCCESS: Reservation created. Status: {res4.status}"))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"FAILED: {e}"))
+
+        # 6. Active sessions hold capacity until their planned end, overstaying ones for the horizon
+        self.stdout.write("5. Checking a window after an active session's planned end (Should be free)...")
+        window_start = timezone.now() + timedelta(minutes=30)
+        window_end = window_start + timedelta(minutes=15)
+        session = ParkingSession.objects.create(
+            vehicle=vehicle, zone=zone, planned_end_time=timezone.now() + timedelta(minutes=5),
+            estimated_cost=zone.hourly_rate
+        )
+        available = CapacityLedgerService.available(zone, window_start, window_end)
+        if available == zone.capacity:
+            self.stdout.write(self.style.SUCCESS(f"SUCCESS: Session ending before the window leaves {available} free"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: {available} free, expected {zone.capacity}"))
+
+        session.planned_end_time = timezone.now() - timedelta(minutes=5)
+        session.save()
+        available = CapacityLedgerService.available(zone, window_start, window_end)
+        if available == zone.capacity - 1:
+            self.stdout.write(self.style.SUCCESS(f"SUCCESS: Overstaying session still holds its slot ({available} free)"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: {available} free, expected {zone.capacity - 1}"))
+        session.delete()
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def backfill_occupancy(apps, schema_editor):
+    Zone = apps.get_model('parking', 'Zone')
+    ZoneOccupancy = apps.get_model('parking', 'ZoneOccupancy')
+    ParkingSlot = apps.get_model('parking', 'ParkingSlot')
+    ParkingSession = apps.get_model('parking', 'ParkingSession')
+
+    status_fields = {
+        'available': 'slots_available',
+        'occupied': 'slots_occupied',
+        'reserved': 'slots_reserved',
+        'disabled': 'slots_disabled',
+    }
+
+    rows = {}
+    for zone_id in Zone.objects.values_list('id', flat=True):
+        rows[zone_id] = ZoneOccupancy(zone_id=zone_id)
+
+    for slot in ParkingSlot.objects.values('zone_id', 'status').annotate(n=models.Count('id')):
+        occupancy = rows[slot['zone_id']]
+        occupancy.slots_total += slot['n']
+        field = status_fields.get(slot['status'])
+        if field:
+            setattr(occupancy, field, getattr(occupancy, field) + slot['n'])
+
+    for session in ParkingSession.objects.filter(status='active').values('zone_id').annotate(n=models.Count('id')):
+        rows[session['zone_id']].active_sessions = session['n']
+
+    ZoneOccupancy.objects.bulk_create(rows.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0016_parkingsession_prk_sess_veh_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parkingsession',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('completed', 'Completed'), ('expired', 'Expired'), ('cancelled', 'Cancelled'), ('pending_payment', 'Pending Payment')], default='active', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ZoneOccupancy',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('active_sessions', models.IntegerField(default=0)),
+                ('slots_total', models.IntegerField(default=0)),
+                ('slots_available', models.IntegerField(default=0)),
+                ('slots_occupied', models.IntegerField(default=0)),
+                ('slots_reserved', models.IntegerField(default=0)),
+                ('slots_disabled', models.IntegerField(default=0)),
+                ('zone', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='parking.zone')),
+            ],
+            options={
+                'verbose_name_plural': 'Zone occupancies',
+            },
+        ),
+        migrations.RunPython(backfill_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:44
+
+from django.db import migrations, models
+import math
+
+GRID_CELL_DEGREES = 0.01
+
+
+def backfill_grid(apps, schema_editor):
+    Zone = apps.get_model('parking', 'Zone')
+    zones = list(Zone.objects.only('id', 'latitude', 'longitude'))
+    for zone in zones:
+        zone.grid_lat = math.floor(float(zone.latitude) / GRID_CELL_DEGREES)
+        zone.grid_lon = math.floor(float(zone.longitude) / GRID_CELL_DEGREES)
+    Zone.objects.bulk_update(zones, ['grid_lat', 'grid_lon'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0017_zoneoccupancy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zone',
+            name='grid_lat',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='grid_lon',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='zone',
+            index=models.Index(fields=['grid_lat', 'grid_lon'], name='prk_zone_grid_idx'),
+        ),
+        migrations.RunPython(backfill_grid, migrations.RunPython.noop),
+    ]
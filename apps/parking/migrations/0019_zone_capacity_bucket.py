@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+BUCKET_SECONDS = 15 * 60
+
+
+def backfill_buckets(apps, schema_editor):
+    Reservation = apps.get_model('parking', 'Reservation')
+    ZoneCapacityBucket = apps.get_model('parking', 'ZoneCapacityBucket')
+
+    counts = {}
+    reservations = Reservation.objects.filter(
+        status__in=['pending_payment', 'confirmed'],
+        reserved_until__gt=datetime.now(dt_timezone.utc)
+    ).values_list('zone_id', 'reserved_from', 'reserved_until')
+    for zone_id, start_time, end_time in reservations:
+        first = int(start_time.timestamp()) - int(start_time.timestamp()) % BUCKET_SECONDS
+        for ts in range(first, int(end_time.timestamp()), BUCKET_SECONDS):
+            key = (zone_id, datetime.fromtimestamp(ts, tz=dt_timezone.utc))
+            counts[key] = counts.get(key, 0) + 1
+
+    ZoneCapacityBucket.objects.bulk_create([
+        ZoneCapacityBucket(zone_id=zone_id, bucket_start=bucket_start, reserved=reserved)
+        for (zone_id, bucket_start), reserved in counts.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0018_zone_grid_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZoneCapacityBucket',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('bucket_start', models.DateTimeField()),
+                ('reserved', models.IntegerField(default=0)),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capacity_buckets', to='parking.zone')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket_start'], name='prk_capb_start_idx')],
+                'unique_together': {('zone', 'bucket_start')},
+            },
+        ),
+        migrations.RunPython(backfill_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def backfill_deadlines(apps, schema_editor):
+    ParkingSession = apps.get_model('parking', 'ParkingSession')
+    SessionDeadline = apps.get_model('parking', 'SessionDeadline')
+    SessionDeadline.objects.bulk_create([
+        SessionDeadline(session_id=session_id, due_at=planned_end_time)
+        for session_id, planned_end_time in ParkingSession.objects.filter(
+            status='active'
+        ).values_list('id', 'planned_end_time')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0019_zone_capacity_bucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionDeadline',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('due_at', models.DateTimeField()),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='deadline', to='parking.parkingsession')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['due_at'], name='prk_ddl_due_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_deadlines, migrations.RunPython.noop),
+    ]
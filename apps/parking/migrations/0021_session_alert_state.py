@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def backfill_alert_states(apps, schema_editor):
+    # Zones and users have no custom thresholds yet, so every session gets the defaults
+    ParkingSession = apps.get_model('parking', 'ParkingSession')
+    SessionAlertState = apps.get_model('parking', 'SessionAlertState')
+    now = timezone.now()
+    thresholds = sorted(set(settings.PARKING_ALERT_THRESHOLDS), reverse=True)
+    states = []
+    for session_id, planned_end_time in ParkingSession.objects.filter(
+        status='active', planned_end_time__gt=now
+    ).values_list('id', 'planned_end_time'):
+        fired = 0
+        pending = []
+        for i, minutes in enumerate(thresholds):
+            alert_at = planned_end_time - timedelta(minutes=minutes)
+            if alert_at <= now:
+                fired |= 1 << i
+            else:
+                pending.append(alert_at)
+        states.append(SessionAlertState(
+            session_id=session_id, thresholds=thresholds, fired=fired, next_alert_at=min(pending, default=None)
+        ))
+    SessionAlertState.objects.bulk_create(states, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0020_session_deadline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zone',
+            name='alert_thresholds',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='SessionAlertState',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('thresholds', models.JSONField(default=list)),
+                ('fired', models.PositiveSmallIntegerField(default=0)),
+                ('next_alert_at', models.DateTimeField(blank=True, null=True)),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='alert_state', to='parking.parkingsession')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['next_alert_at'], name='prk_alert_next_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_alert_states, migrations.RunPython.noop),
+    ]
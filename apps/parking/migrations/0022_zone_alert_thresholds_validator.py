@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:52
+
+import apps.parking.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0021_session_alert_state'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='zone',
+            name='alert_thresholds',
+            field=models.JSONField(blank=True, default=list, validators=[apps.parking.models.validate_alert_thresholds]),
+        ),
+    ]
@@ -1,11 +1,22 @@
-from django.db import models
-from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from decimal import Decimal
 from apps.common.models import BaseModel, RegionalModel
 from apps.common.constants import ParkingStatus, SlotStatus
 
+def validate_alert_thresholds(value):
+    """Alert minutes as SessionAlertService expects them: a list of whole minutes between 1 and 1440"""
+    from apps.parking.services.session_alert_service import MAX_ALERT_MINUTES, MAX_THRESHOLDS
+    if not isinstance(value, list) or not all(
+        isinstance(m, int) and not isinstance(m, bool) and 0 < m <= MAX_ALERT_MINUTES for m in value
+    ):
+        raise ValidationError(_("Must be a list of minutes between 1 and %(max)s."), params={'max': MAX_ALERT_MINUTES})
+    if len(value) > MAX_THRESHOLDS:
+        raise ValidationError(_("At most %(max)s alerts can be set."), params={'max': MAX_THRESHOLDS})
+
+
 class Zone(RegionalModel, BaseModel):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -19,6 +30,10 @@ class Zone(RegionalModel, BaseModel):
     latitude = models.DecimalField(max_digits=9, decimal_places=6)
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
     radius_meters = models.IntegerField(default=100)
+
+    # Spatial grid bucket of the zone centre, maintained in save() (see ZoneSearchService)
+    grid_lat = models.IntegerField(default=0, editable=False)
+    grid_lon = models.IntegerField(default=0, editable=False)
     
     # Zone images and diagram
     zone_image = models.ImageField(upload_to='zones/images/', null=True, blank=True, 
@@ -26,6 +41,9 @@ class Zone(RegionalModel, BaseModel):
     diagram_image = models.ImageField(upload_to='zones/diagrams/', null=True, blank=True,
                                      help_text=_("Parking layout diagram (like airplane seat map)"))
     
+    # Minutes before the planned end at which drivers are alerted; empty uses PARKING_ALERT_THRESHOLDS
+    alert_thresholds = models.JSONField(default=list, blank=True, validators=[validate_alert_thresholds])
+
     # Diagram configuration
     diagram_width = models.IntegerField(default=800, help_text=_("Diagram width in pixels"))
     diagram_height = models.IntegerField(default=600, help_text=_("Diagram height in pixels"))
@@ -33,14 +51,33 @@ class Zone(RegionalModel, BaseModel):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        from apps.parking.services.zone_search_service import ZoneSearchService
+        self.grid_lat, self.grid_lon = ZoneSearchService.grid_cell(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'grid_lat', 'grid_lon'}
+        super().save(*args, **kwargs)
+        ZoneSearchService.invalidate_search_radius()
+        ZoneSearchService.invalidate_zone_lists()
+
+    def get_occupancy(self):
+        """Denormalized occupancy counters, rebuilt on first access if missing"""
+        try:
+            return self.occupancy
+        except ObjectDoesNotExist:
+            from apps.parking.services.occupancy_service import OccupancyService
+            self.occupancy = OccupancyService.rebuild(self.id)
+            return self.occupancy
+
     @property
     def available_slots_count(self):
-        return self.slots.filter(status=SlotStatus.AVAILABLE).count()
+        return self.get_occupancy().slots_available
 
     @property
     def active_sessions_count(self):
         """Get number of active parking sessions in this zone"""
-        return self.sessions.filter(status=ParkingStatus.ACTIVE).count()
+        return self.get_occupancy().active_sessions
 
     @property
     def available_slots(self):
@@ -54,7 +91,7 @@ class Zone(RegionalModel, BaseModel):
 
     @property
     def total_slots_count(self):
-        return self.slots.count()
+        return self.get_occupancy().slots_total
 
     @property
     def capacity(self):
@@ -78,8 +115,29 @@ class Zone(RegionalModel, BaseModel):
             models.Index(fields=['created_at'], name='prk_zone_created_idx'),
             models.Index(fields=['code'], name='prk_zone_code_idx'),
             models.Index(fields=['is_active', 'country'], name='prk_zone_act_cnt_idx'),
+            models.Index(fields=['grid_lat', 'grid_lon'], name='prk_zone_grid_idx'),
         ]
 
+class ZoneOccupancy(BaseModel):
+    """
+    Denormalized live counters for a zone, maintained by OccupancyService on every
+    session/slot status change so listing endpoints don't have to COUNT rows.
+    Use `manage.py reconcile_occupancy` to detect and repair drift.
+    """
+    zone = models.OneToOneField(Zone, on_delete=models.CASCADE, related_name='occupancy')
+    active_sessions = models.IntegerField(default=0)
+    slots_total = models.IntegerField(default=0)
+    slots_available = models.IntegerField(default=0)
+    slots_occupied = models.IntegerField(default=0)
+    slots_reserved = models.IntegerField(default=0)
+    slots_disabled = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Zone occupancies'
+
+    def __str__(self):
+        return f"{self.zone_id} - {self.active_sessions} active / {self.slots_total} slots"
+
 class ParkingSlot(BaseModel):
     zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='slots')
     slot_code = models.CharField(max_length=10)  # A1, B2, etc.
@@ -113,6 +171,39 @@ class ParkingSlot(BaseModel):
     def __str__(self):
         return f"{self.zone.name} - {self.slot_code}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted status so save() can adjust the zone counters
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        from apps.parking.services.occupancy_service import OccupancyService
+        from apps.parking.services.zone_live_service import ZoneLiveStatusService
+
+        update_fields = kwargs.get('update_fields')
+        adding = self._state.adding
+        old_status = None if adding else getattr(self, '_loaded_status', self.status)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            status_written = adding or update_fields is None or 'status' in update_fields
+            if status_written:
+                OccupancyService.slot_status_changed(self.zone_id, old_status, self.status)
+                self._loaded_status = self.status
+            ZoneLiveStatusService.slot_changed(self, old_status if status_written else self.status)
+
+    def delete(self, *args, **kwargs):
+        from apps.parking.services.occupancy_service import OccupancyService
+        from apps.parking.services.zone_live_service import ZoneLiveStatusService
+
+        slot_id = self.id
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            OccupancyService.slot_status_changed(self.zone_id, getattr(self, '_loaded_status', self.status), None)
+            ZoneLiveStatusService.zone_changed(self.zone_id, {'event': 'slot_removed', 'slot_id': str(slot_id)})
+        return result
+
 class ZoneBoundary(BaseModel):
     zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='boundaries')
     name = models.CharField(max_length=50)
@@ -192,6 +283,35 @@ class ParkingSession(BaseModel):
     def __str__(self):
         return f"{self.vehicle.license_plate} - {self.zone.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted status/deadline so save() can adjust the zone counters and expiry queue
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_planned_end = instance.__dict__.get('planned_end_time')
+        return instance
+
+    def save(self, *args, **kwargs):
+        from apps.parking.services.occupancy_service import OccupancyService
+        from apps.parking.services.deadline_service import SessionDeadlineService
+        from apps.parking.services.session_alert_service import SessionAlertService
+        from apps.parking.services.zone_live_service import ZoneLiveStatusService
+
+        update_fields = kwargs.get('update_fields')
+        adding = self._state.adding
+        old_status = None if adding else getattr(self, '_loaded_status', self.status)
+        old_planned_end = None if adding else getattr(self, '_loaded_planned_end', self.planned_end_time)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if update_fields is None or 'status' in update_fields:
+                OccupancyService.session_status_changed(self.zone_id, old_status, self.status)
+                self._loaded_status = self.status
+            if update_fields is None or {'status', 'planned_end_time'} & set(update_fields):
+                SessionDeadlineService.session_changed(self, old_status, old_planned_end)
+                SessionAlertService.session_changed(self, old_status, old_planned_end)
+                self._loaded_planned_end = self.planned_end_time
+            ZoneLiveStatusService.session_changed(self, old_status, old_planned_end)
+
     def clean(self):
         if self.parking_slot and self.parking_slot.zone != self.zone:
             raise ValidationError(_("Parking slot must belong to the selected zone"))
@@ -217,7 +337,7 @@ class ParkingSession(BaseModel):
 
     def end_session(self):
         from decimal import Decimal
-        from apps.payments.models import WalletTransaction
+        from apps.payments.wallet_service import WalletService
         from apps.notifications.notification_triggers import notify_wallet_refund
         
         self.actual_end_time = timezone.now()
@@ -229,17 +349,11 @@ class ParkingSession(BaseModel):
             refund_amount = self.estimated_cost - self.final_cost
             
             # Credit wallet
-            user = self.vehicle.user
-            user.wallet_balance += refund_amount
-            user.save(update_fields=['wallet_balance'])
-            
-            # Create wallet transaction record
-            wallet_tx = WalletTransaction.objects.create(
-                user=user,
-                amount=refund_amount,
-                transaction_type='refund',
-                description=f'Refund for early session end at {self.zone.name}',
-                status='completed',
+            wallet_tx = WalletService.credit(
+                self.vehicle.user,
+                refund_amount,
+                'refund',
+                f'Refund for early session end at {self.zone.name}',
                 parking_session=self,
                 metadata={
                     'session_id': str(self.id),
@@ -323,6 +437,41 @@ class ParkingSession(BaseModel):
         ]
         return "\r\n".join(data)
 
+class SessionDeadline(BaseModel):
+    """
+    Pending expiry of an active parking session, keyed by its planned_end_time.
+    Rows are written on start/extend and claimed (deleted) once by SessionExpiryService.expire_chunk.
+    """
+    session = models.OneToOneField(ParkingSession, on_delete=models.CASCADE, related_name='deadline')
+    due_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['due_at'], name='prk_ddl_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.session_id} due {self.due_at}"
+
+class SessionAlertState(BaseModel):
+    """
+    Pre-expiry alerts of an active parking session.
+    thresholds are the minutes-before-end resolved when the session was (re)scheduled;
+    bit i of fired is set once thresholds[i] has been handled, so no alert is sent twice.
+    """
+    session = models.OneToOneField(ParkingSession, on_delete=models.CASCADE, related_name='alert_state')
+    thresholds = models.JSONField(default=list)
+    fired = models.PositiveSmallIntegerField(default=0)
+    next_alert_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_alert_at'], name='prk_alert_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.session_id} next alert {self.next_alert_at}"
+
 class Reservation(BaseModel):
     STATUS_CHOICES = [
         ('pending_payment', _('Pending Payment')),
@@ -356,4 +505,40 @@ class Reservation(BaseModel):
         ]
 
     def __str__(self):
-        return f"{self.vehicle.license_plate} - {self.zone.name} ({self.status})"
\ No newline at end of file
+        return f"{self.vehicle.license_plate} - {self.zone.name} ({self.status})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted status so save() can update the capacity ledger
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        from apps.parking.services.capacity_ledger_service import CapacityLedgerService
+
+        update_fields = kwargs.get('update_fields')
+        old_status = None if self._state.adding else getattr(self, '_loaded_status', self.status)
+        with transaction.atomic():
+            if update_fields is None or 'status' in update_fields:
+                CapacityLedgerService.reservation_status_changed(self, old_status, self.status)
+            super().save(*args, **kwargs)
+            self._loaded_status = self.status
+
+class ZoneCapacityBucket(BaseModel):
+    """
+    Number of reservations holding capacity in a zone during one 15 minute bucket.
+    Maintained by CapacityLedgerService whenever a reservation starts or stops holding capacity.
+    """
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='capacity_buckets')
+    bucket_start = models.DateTimeField()
+    reserved = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['zone', 'bucket_start']
+        indexes = [
+            models.Index(fields=['bucket_start'], name='prk_capb_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.zone_id} @ {self.bucket_start:%Y-%m-%d %H:%M} - {self.reserved} reserved"
\ No newline at end of file
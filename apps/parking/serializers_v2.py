@@ -1,3 +1,4 @@
+from datetime import timedelta
 from rest_framework import serializers
 from .models import Zone, ParkingSlot, ParkingSession, Reservation
 
@@ -57,6 +58,15 @@ class ZoneListSerializer(serializers.ModelSerializer):
     def get_occupancy_rate(self, obj):
         return round(obj.occupancy_rate, 2)
 
+class ZoneNearbySerializer(ZoneListSerializer):
+    distance_meters = serializers.SerializerMethodField()
+    
+    class Meta(ZoneListSerializer.Meta):
+        fields = ZoneListSerializer.Meta.fields + ['distance_meters']
+    
+    def get_distance_meters(self, obj):
+        return round(obj.distance_meters)
+
 class ParkingSessionSerializer(serializers.ModelSerializer):
     zone_name = serializers.CharField(source='zone.name', read_only=True)
     vehicle_plate = serializers.CharField(source='vehicle.license_plate', read_only=True)
@@ -73,9 +83,25 @@ class StartParkingSerializer(serializers.Serializer):
     vehicle_id = serializers.UUIDField()
     zone_id = serializers.UUIDField()
     slot_id = serializers.UUIDField(required=False)
+    slot_type = serializers.ChoiceField(choices=['regular', 'disabled', 'electric', 'compact', 'motorcycle'], required=False)
     duration_hours = serializers.DecimalField(max_digits=10, decimal_places=5, default=1, min_value=0.25, max_value=24)
     payment_method = serializers.ChoiceField(choices=['wallet', 'pesapal'], default='wallet')
 
+class ReservationSearchSerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(min_value=1, max_value=50000, default=2000)
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
+
+    def validate(self, data):
+        if data['end_time'] <= data['start_time']:
+            raise serializers.ValidationError("End time must be after start time")
+        if data['end_time'] - data['start_time'] > timedelta(hours=24):
+            raise serializers.ValidationError("Search window cannot exceed 24 hours")
+        return data
+
 class EndParkingSerializer(serializers.Serializer):
     session_id = serializers.UUIDField()
 
@@ -126,8 +152,7 @@ class ZoneSerializer(serializers.ModelSerializer):
     
     def get_active_sessions(self, obj):
         """Get count of active sessions in this zone"""
-        from apps.common.constants import ParkingStatus
-        return obj.sessions.filter(status=ParkingStatus.ACTIVE).count()
+        return obj.active_sessions_count
 
 
 class ParkingSessionDetailSerializer(serializers.ModelSerializer):
@@ -0,0 +1,171 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from datetime import timedelta, timezone as dt_timezone
+from bisect import bisect_right
+import logging
+
+from apps.parking.models import Zone, ZoneCapacityBucket, Reservation, ParkingSession
+from apps.common.constants import ParkingStatus
+
+logger = logging.getLogger(__name__)
+
+BUCKET_MINUTES = 15
+BUCKET_SECONDS = BUCKET_MINUTES * 60
+
+# Reservation statuses that hold capacity in the ledger
+HOLDING_STATUSES = ('pending_payment', 'confirmed')
+
+# Sessions already past their planned end are assumed to leave within this long
+ACTIVE_SESSION_HORIZON = timedelta(hours=1)
+
+
+class CapacityLedgerService:
+    """
+    Per-zone reservation ledger in fixed 15 minute buckets.
+
+    Each ZoneCapacityBucket row counts the reservations overlapping that quarter hour.
+    Reserving locks and increments only the buckets of the requested window, so
+    bookings for different windows in the same zone don't block each other, and an
+    availability check is a MIN of free capacity over the window's buckets.
+    """
+
+    @staticmethod
+    def bucket_starts(start_time, end_time) -> list:
+        """Start of every bucket overlapping [start_time, end_time)"""
+        epoch = int(start_time.timestamp())
+        first = epoch - epoch % BUCKET_SECONDS
+        return [
+            timezone.datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+            for ts in range(first, int(end_time.timestamp()), BUCKET_SECONDS)
+        ]
+
+    @staticmethod
+    def free_capacity(zones, start_time, end_time) -> tuple:
+        """
+        Free capacity of many zones over the buckets of a window, in one pass.
+
+        Two queries load the ledger buckets and the active sessions of every zone.
+        Each bucket's free capacity is the zone capacity minus the reservations in
+        that bucket and the sessions still parked then, judged by their
+        planned_end_time. Sessions with no planned end, or already past it,
+        count until ACTIVE_SESSION_HORIZON from now. Returns (bucket_starts, {zone_id: [free per bucket]}).
+        """
+        buckets = CapacityLedgerService.bucket_starts(start_time, end_time)
+        index = {bucket: i for i, bucket in enumerate(buckets)}
+        zones = list(zones)
+        zone_ids = [zone.id for zone in zones]
+
+        reserved = {zone_id: [0] * len(buckets) for zone_id in zone_ids}
+        rows = ZoneCapacityBucket.objects.filter(
+            zone_id__in=zone_ids,
+            bucket_start__in=buckets
+        ).values_list('zone_id', 'bucket_start', 'reserved')
+        for zone_id, bucket_start, count in rows:
+            reserved[zone_id][index[bucket_start]] = count
+
+        now = timezone.now()
+        overstay_until = now + ACTIVE_SESSION_HORIZON
+        session_ends = {zone_id: [] for zone_id in zone_ids}
+        sessions = ParkingSession.objects.filter(
+            zone_id__in=zone_ids,
+            status=ParkingStatus.ACTIVE
+        ).values_list('zone_id', 'planned_end_time')
+        for zone_id, planned_end in sessions:
+            session_ends[zone_id].append(planned_end if planned_end and planned_end > now else overstay_until)
+
+        free = {}
+        for zone in zones:
+            ends = sorted(session_ends[zone.id])
+            capacity = zone.capacity
+            free[zone.id] = [
+                # Sessions still parked at the bucket start are those ending after it
+                capacity - reserved[zone.id][i] - (len(ends) - bisect_right(ends, bucket))
+                for i, bucket in enumerate(buckets)
+            ]
+        return buckets, free
+
+    @staticmethod
+    def available(zone: Zone, start_time, end_time) -> int:
+        """Slots still bookable for the whole window"""
+        _, free = CapacityLedgerService.free_capacity([zone], start_time, end_time)
+        return min(free[zone.id], default=0)
+
+    @staticmethod
+    @transaction.atomic
+    def reserve(zone: Zone, start_time, end_time) -> None:
+        """
+        Take one unit of capacity in every bucket of the window.
+        Raises ValueError (and rolls back) if any bucket is already full.
+        """
+        buckets = CapacityLedgerService.bucket_starts(start_time, end_time)
+        ZoneCapacityBucket.objects.bulk_create(
+            [ZoneCapacityBucket(zone_id=zone.id, bucket_start=b) for b in buckets],
+            ignore_conflicts=True
+        )
+
+        # Lock in a fixed order so overlapping windows can't deadlock each other
+        rows = list(
+            ZoneCapacityBucket.objects.select_for_update()
+            .filter(zone_id=zone.id, bucket_start__in=buckets)
+            .order_by('bucket_start')
+        )
+        # Free capacity is read after locking so it reflects committed competitors
+        _, free = CapacityLedgerService.free_capacity([zone], start_time, end_time)
+        if min(free[zone.id], default=0) <= 0:
+            raise ValueError("No parking slots available for the selected time.")
+
+        ZoneCapacityBucket.objects.filter(id__in=[row.id for row in rows]).update(
+            reserved=F('reserved') + 1,
+            updated_at=timezone.now()
+        )
+
+    @staticmethod
+    def release(zone_id, start_time, end_time) -> None:
+        """Give back one unit of capacity in every bucket of the window"""
+        ZoneCapacityBucket.objects.filter(
+            zone_id=zone_id,
+            bucket_start__in=CapacityLedgerService.bucket_starts(start_time, end_time),
+            reserved__gt=0
+        ).update(reserved=F('reserved') - 1, updated_at=timezone.now())
+
+    @staticmethod
+    def reservation_status_changed(reservation: Reservation, old_status, new_status) -> None:
+        """Pass old_status=None for a new reservation"""
+        was_holding = old_status in HOLDING_STATUSES
+        is_holding = new_status in HOLDING_STATUSES
+        if is_holding and not was_holding:
+            CapacityLedgerService.reserve(reservation.zone, reservation.reserved_from, reservation.reserved_until)
+        elif was_holding and not is_holding:
+            CapacityLedgerService.release(reservation.zone_id, reservation.reserved_from, reservation.reserved_until)
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild(zone_id) -> int:
+        """Recompute a zone's future buckets from its holding reservations. Returns buckets written."""
+        now = timezone.now()
+        counts = {}
+        reservations = Reservation.objects.filter(
+            zone_id=zone_id,
+            status__in=HOLDING_STATUSES,
+            reserved_until__gt=now
+        ).values_list('reserved_from', 'reserved_until')
+        for start_time, end_time in reservations:
+            for bucket in CapacityLedgerService.bucket_starts(start_time, end_time):
+                counts[bucket] = counts.get(bucket, 0) + 1
+
+        current_bucket = CapacityLedgerService.bucket_starts(now, now + timedelta(seconds=1))[0]
+        ZoneCapacityBucket.objects.filter(zone_id=zone_id, bucket_start__gte=current_bucket).delete()
+        ZoneCapacityBucket.objects.bulk_create([
+            ZoneCapacityBucket(zone_id=zone_id, bucket_start=bucket, reserved=reserved)
+            for bucket, reserved in counts.items()
+            if bucket >= current_bucket
+        ])
+        return len(counts)
+
+    @staticmethod
+    def prune(before=None) -> int:
+        """Delete buckets that ended before the given time (default: one day ago)"""
+        before = before or timezone.now() - timedelta(days=1)
+        deleted, _ = ZoneCapacityBucket.objects.filter(bucket_start__lt=before - timedelta(minutes=BUCKET_MINUTES)).delete()
+        return deleted
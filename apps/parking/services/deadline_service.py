@@ -0,0 +1,52 @@
+import logging
+
+from apps.parking.models import ParkingSession, SessionDeadline
+from apps.common.constants import ParkingStatus
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class SessionDeadlineService:
+    """
+    Expiry queue for active parking sessions.
+
+    Each active session has one SessionDeadline row due at its planned_end_time,
+    written when the session starts or is extended and removed when it ends.
+    The expiry pipeline (SessionExpiryService) claims due rows in due_at order
+    from an index, so a run costs the number of sessions actually expiring
+    rather than the size of the active set, and deletes them with the sessions
+    it expired: each expiry is handled once.
+    """
+
+    @staticmethod
+    def schedule(session: ParkingSession) -> None:
+        SessionDeadline.objects.update_or_create(
+            session_id=session.id,
+            defaults={'due_at': session.planned_end_time}
+        )
+
+    @staticmethod
+    def session_changed(session: ParkingSession, old_status, old_planned_end) -> None:
+        """Keep the queue in step with a session's status and planned_end_time"""
+        if session.status == ParkingStatus.ACTIVE:
+            if old_status != ParkingStatus.ACTIVE or old_planned_end != session.planned_end_time:
+                # Started, re-activated or extended: (re)arm the deadline
+                SessionDeadlineService.schedule(session)
+        elif old_status == ParkingStatus.ACTIVE:
+            SessionDeadline.objects.filter(session_id=session.id).delete()
+
+    @staticmethod
+    def claim_due(now, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+        """
+        Lock up to batch_size due deadlines, oldest first, for the caller's transaction.
+        Rows locked by a concurrent worker are skipped, so no deadline is handed out twice.
+        Returns {session_id: deadline_id}; the caller deletes the deadlines it handled.
+        """
+        return dict(
+            SessionDeadline.objects.select_for_update(skip_locked=True)
+            .filter(due_at__lte=now)
+            .order_by('due_at')
+            .values_list('session_id', 'id')[:batch_size]
+        )
@@ -0,0 +1,151 @@
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+import logging
+
+from apps.parking.models import Zone, ZoneOccupancy, ParkingSlot, ParkingSession
+from apps.common.constants import ParkingStatus, SlotStatus
+
+logger = logging.getLogger(__name__)
+
+# Slot status -> counter column on ZoneOccupancy
+SLOT_STATUS_FIELDS = {
+    SlotStatus.AVAILABLE: 'slots_available',
+    SlotStatus.OCCUPIED: 'slots_occupied',
+    SlotStatus.RESERVED: 'slots_reserved',
+    SlotStatus.DISABLED: 'slots_disabled',
+}
+
+COUNTER_FIELDS = ['active_sessions', 'slots_total'] + list(SLOT_STATUS_FIELDS.values())
+
+
+class OccupancyService:
+    """
+    Maintains the denormalized per-zone occupancy counters.
+
+    Counters are adjusted with F() expressions once the session/slot write that
+    caused them commits, so readers never need to COUNT rows. The update is not
+    part of the writer's transaction: every parking start in a zone would
+    otherwise hold that zone's single counter row locked until it commits,
+    serializing the starts that claim_slot's SKIP LOCKED lets run in parallel.
+    A delta lost to a crash after commit, or applied on top of a concurrent
+    rebuild, is corrected by the reconcile_zone_occupancy beat task.
+    """
+
+    @staticmethod
+    def apply_deltas(zone_id, deltas) -> None:
+        """Add the given {counter: delta} values to a zone's counters once the transaction commits."""
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        # robust: the write is committed by then, a failed counter update is left to the reconciler
+        transaction.on_commit(lambda: OccupancyService._apply_deltas(zone_id, deltas), robust=True)
+
+    @staticmethod
+    def _apply_deltas(zone_id, deltas) -> None:
+        updated = ZoneOccupancy.objects.filter(zone_id=zone_id).update(
+            updated_at=timezone.now(),
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+        if not updated:
+            # No counter row yet: build it from the (already written) source rows
+            OccupancyService.rebuild(zone_id)
+
+    @staticmethod
+    def session_status_changed(zone_id, old_status, new_status) -> None:
+        was_active = old_status == ParkingStatus.ACTIVE
+        is_active = new_status == ParkingStatus.ACTIVE
+        if was_active != is_active:
+            OccupancyService.apply_deltas(zone_id, {'active_sessions': 1 if is_active else -1})
+
+    @staticmethod
+    def slot_status_changed(zone_id, old_status, new_status) -> None:
+        """Pass old_status=None for a new slot and new_status=None for a deleted one."""
+        if old_status == new_status:
+            return
+
+        deltas = {}
+        if old_status is None:
+            deltas['slots_total'] = 1
+        elif old_status in SLOT_STATUS_FIELDS:
+            deltas[SLOT_STATUS_FIELDS[old_status]] = -1
+
+        if new_status is None:
+            deltas['slots_total'] = deltas.get('slots_total', 0) - 1
+        elif new_status in SLOT_STATUS_FIELDS:
+            deltas[SLOT_STATUS_FIELDS[new_status]] = deltas.get(SLOT_STATUS_FIELDS[new_status], 0) + 1
+
+        OccupancyService.apply_deltas(zone_id, deltas)
+
+    @staticmethod
+    def count_from_source(zone_ids=None) -> dict:
+        """
+        Count the real occupancy for the given zones (or all zones) straight from
+        the slot and session tables. Returns {zone_id: {counter: value}}.
+        """
+        zones = Zone.all_objects.all()
+        if zone_ids is not None:
+            zones = zones.filter(id__in=zone_ids)
+        counts = {zone_id: dict.fromkeys(COUNTER_FIELDS, 0) for zone_id in zones.values_list('id', flat=True)}
+
+        slots = ParkingSlot.objects.filter(zone_id__in=counts.keys()).values('zone_id', 'status').annotate(n=Count('id'))
+        for row in slots:
+            zone_counts = counts[row['zone_id']]
+            zone_counts['slots_total'] += row['n']
+            field = SLOT_STATUS_FIELDS.get(row['status'])
+            if field:
+                zone_counts[field] += row['n']
+
+        sessions = ParkingSession.objects.filter(
+            zone_id__in=counts.keys(),
+            status=ParkingStatus.ACTIVE
+        ).values('zone_id').annotate(n=Count('id'))
+        for row in sessions:
+            counts[row['zone_id']]['active_sessions'] = row['n']
+
+        return counts
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild(zone_id) -> ZoneOccupancy:
+        """Create or overwrite a zone's counters from the source tables."""
+        occupancy, created = ZoneOccupancy.objects.get_or_create(zone_id=zone_id)
+        if not created:
+            occupancy = ZoneOccupancy.objects.select_for_update().get(pk=occupancy.pk)
+
+        counts = OccupancyService.count_from_source([zone_id]).get(zone_id, {})
+        for field, value in counts.items():
+            setattr(occupancy, field, value)
+        occupancy.save()
+        return occupancy
+
+    @staticmethod
+    def reconcile(zone_ids=None, repair=True) -> list:
+        """
+        Compare stored counters with the source tables.
+        Returns a list of (zone_id, {counter: (stored, actual)}) for every zone that drifted.
+        Missing counter rows are reported with stored=None.
+        """
+        actual = OccupancyService.count_from_source(zone_ids)
+        stored = {
+            occ.zone_id: occ for occ in ZoneOccupancy.objects.filter(zone_id__in=actual.keys())
+        }
+
+        drifted = []
+        for zone_id, counts in actual.items():
+            occupancy = stored.get(zone_id)
+            diff = {
+                field: (getattr(occupancy, field) if occupancy else None, value)
+                for field, value in counts.items()
+                if occupancy is None or getattr(occupancy, field) != value
+            }
+            if not diff:
+                continue
+
+            drifted.append((zone_id, diff))
+            if repair:
+                # Re-count under the row lock so concurrent F() updates are not lost
+                OccupancyService.rebuild(zone_id)
+                logger.warning(f"Repaired occupancy drift for zone {zone_id}: {diff}")
+
+        return drifted
@@ -7,8 +7,9 @@ import logging
 from typing import Optional
 
 from apps.parking.models import Zone, Reservation, ParkingSession, ParkingSlot
-from apps.common.constants import ParkingStatus, SlotStatus, TransactionStatus
-from apps.payments.models import WalletTransaction
+from apps.common.constants import ParkingStatus, SlotStatus
+from apps.payments.wallet_service import WalletService
+from apps.parking.services.capacity_ledger_service import CapacityLedgerService
 from apps.notifications.notification_triggers import notify_reservation_confirmed, notify_reservation_cancelled
 
 logger = logging.getLogger(__name__)
@@ -18,40 +19,12 @@ class ReservationService:
     def check_availability(zone: Zone, start_time: timezone.datetime, end_time: timezone.datetime) -> bool:
         """
         Check if there are available slots in the zone for the given time range.
-        This is a complex check involving:
-        1. Total capacity
-        2. Existing confirmed reservations overlapping the period
-        3. Active parking sessions overlapping the start period
+        Uses the capacity ledger: in every 15 minute bucket of the window, zone
+        capacity minus the reservations in that bucket and the active sessions
+        still parked then, by their planned_end_time (ACTIVE_SESSION_HORIZON from
+        now if it has none or is already past). The busiest bucket decides.
         """
-        total_capacity = zone.capacity
-        if total_capacity <= 0:
-            return False
-
-        # 1. Count overlapping confirmed/pending reservations
-        overlapping_reservations = Reservation.objects.filter(
-            zone=zone,
-            status__in=['confirmed', 'pending_payment'],
-            reserved_from__lt=end_time,
-            reserved_until__gt=start_time
-        ).count()
-
-        # 2. Count active sessions (only if start_time is "now" or very soon)
-        # For future bookings, we assume current sessions will end, unless they are long-term? 
-        # For simplicity in this MVP: 
-        # If booking is for NOW, we check active sessions.
-        # If booking is for FUTURE, we mostly rely on reservations. 
-        # A more robust system would track "estimated end time" of active sessions.
-        
-        active_sessions = 0
-        if start_time < timezone.now() + timedelta(hours=1):
-             active_sessions = ParkingSession.objects.filter(
-                zone=zone,
-                status=ParkingStatus.ACTIVE
-            ).count()
-
-        available_slots = total_capacity - (overlapping_reservations + active_sessions)
-        
-        return available_slots > 0
+        return CapacityLedgerService.available(zone, start_time, end_time) > 0
 
     @staticmethod
     @transaction.atomic
@@ -62,16 +35,10 @@ class ReservationService:
         end_time: timezone.datetime
     ) -> Reservation:
         """
-        Create a reservation with concurrency locking.
+        Create a reservation. Capacity is taken from the ledger buckets of the
+        window when the reservation is saved (see Reservation.save), which raises
+        ValueError if any bucket is full. Only overlapping bookings contend.
         """
-        # Lock the zone for update to prevent race conditions during availability check
-        # Note: This locks the zone row, effectively serializing bookings for this zone.
-        # For high volume, we might need a more granular lock (e.g. Redis) or slots.
-        _ = Zone.objects.select_for_update().get(id=zone.id)
-
-        if not ReservationService.check_availability(zone, start_time, end_time):
-             raise ValueError("No parking slots available for the selected time.")
-
         # Calculate cost
         duration_seconds = (end_time - start_time).total_seconds()
         duration_hours = Decimal(str(duration_seconds / 3600))
@@ -91,8 +58,8 @@ class ReservationService:
         
         # Schedule expiration task
         from apps.parking.tasks import expire_reservation_task
-        # Schedules task to run after 15 minutes
-        expire_reservation_task.apply_async((reservation.id,), countdown=900)
+        # Schedules task to run after 15 minutes, once the reservation is committed
+        transaction.on_commit(lambda: expire_reservation_task.apply_async((str(reservation.id),), countdown=900))
 
         return reservation
 
@@ -105,18 +72,13 @@ class ReservationService:
         user = reservation.vehicle.user
         
         if payment_method == 'wallet':
-            if user.wallet_balance < reservation.cost:
-                raise ValueError(f"Insufficient funds. Required: {reservation.cost}")
-            
-            user.wallet_balance -= reservation.cost
-            user.save(update_fields=['wallet_balance'])
-            
-            WalletTransaction.objects.create(
-                user=user,
-                amount=reservation.cost,
-                transaction_type='payment',
-                status=TransactionStatus.COMPLETED,
-                description=f"Reservation for {reservation.zone.name}",
+            # Raises InsufficientFunds (a ValueError) rather than overdraw
+            WalletService.debit(
+                user,
+                reservation.cost,
+                'payment',
+                f"Reservation for {reservation.zone.name}",
+                allow_negative=False,
                 metadata={'reservation_id': str(reservation.id)}
             )
             
@@ -141,16 +103,11 @@ class ReservationService:
         if reservation.status == 'confirmed':
              if timezone.now() < reservation.reserved_from:
                  # Refund logic
-                 user = reservation.vehicle.user
-                 user.wallet_balance += reservation.cost
-                 user.save(update_fields=['wallet_balance'])
-                 
-                 WalletTransaction.objects.create(
-                    user=user,
-                    amount=reservation.cost,
-                    transaction_type='refund',
-                    status=TransactionStatus.COMPLETED,
-                    description=f"Refund for reservation cancellation {reservation.id}",
+                 WalletService.credit(
+                    reservation.vehicle.user,
+                    reservation.cost,
+                    'refund',
+                    f"Refund for reservation cancellation {reservation.id}",
                     metadata={'reservation_id': str(reservation.id)}
                 )
 
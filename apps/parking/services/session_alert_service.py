@@ -0,0 +1,199 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+import logging
+
+from apps.parking.models import ParkingSession, SessionAlertState
+from apps.common.constants import ParkingStatus
+from apps.notifications.models import NotificationEvent
+from apps.notifications.firebase_service import send_notification_events
+from apps.notifications.counters import notifications_added
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+# fired is a PositiveSmallIntegerField bitmask
+MAX_THRESHOLDS = 15
+MAX_ALERT_MINUTES = 24 * 60
+
+
+class SessionAlertService:
+    """
+    Pre-expiry alerts ("ends in N minutes") for active parking sessions.
+
+    Each active session has one SessionAlertState row holding the thresholds that
+    apply to it and a bitmask of those already handled. next_alert_at is the time
+    the next unhandled threshold is due, so a run only touches rows that are due.
+    Due rows are claimed with SKIP LOCKED and their bits set in the same
+    transaction as the notifications are written, so an overlapping or repeated
+    run can't send an alert twice. A late run sends only the most urgent alert
+    that is due and marks the earlier ones as handled.
+    """
+
+    @staticmethod
+    def thresholds_for(session: ParkingSession) -> list:
+        """
+        Alert minutes for a session, most distant first: the driver's preference,
+        else the zone's, else PARKING_ALERT_THRESHOLDS. Empty if parking
+        notifications are off.
+        """
+        user = session.vehicle.user
+        preferences = getattr(user, 'preferences', None)
+        if preferences is not None and not preferences.enable_parking_notifications:
+            return []
+        sources = (
+            ('preference', preferences.parking_alert_minutes if preferences is not None else None),
+            ('zone', session.zone.alert_thresholds),
+            ('settings', settings.PARKING_ALERT_THRESHOLDS),
+        )
+        for source, minutes in sources:
+            valid = SessionAlertService._valid_minutes(minutes, source, session)
+            if valid:
+                return sorted(set(valid), reverse=True)[:MAX_THRESHOLDS]
+        return []
+
+    @staticmethod
+    def _valid_minutes(minutes, source, session) -> list:
+        """The whole minutes in 1..MAX_ALERT_MINUTES of a configured value; anything else is logged and skipped"""
+        if not minutes:
+            return []
+        if not isinstance(minutes, (list, tuple)):
+            logger.warning(f"Ignoring {source} alert thresholds {minutes!r} for session {session.id}: not a list")
+            return []
+        valid, invalid = [], []
+        for m in minutes:
+            ok = isinstance(m, int) and not isinstance(m, bool) and 0 < m <= MAX_ALERT_MINUTES
+            (valid if ok else invalid).append(m)
+        if invalid:
+            logger.warning(f"Ignoring {source} alert thresholds {invalid!r} for session {session.id}")
+        return valid
+
+    @staticmethod
+    def _next_alert_at(planned_end, thresholds, fired):
+        due = [
+            planned_end - timedelta(minutes=minutes)
+            for i, minutes in enumerate(thresholds)
+            if not fired & (1 << i)
+        ]
+        return min(due, default=None)
+
+    @staticmethod
+    def schedule(session: ParkingSession, now=None) -> None:
+        """(Re)arm a session's alerts. Thresholds already in the past are marked handled."""
+        now = now or timezone.now()
+        thresholds = SessionAlertService.thresholds_for(session)
+        fired = 0
+        for i, minutes in enumerate(thresholds):
+            if session.planned_end_time - timedelta(minutes=minutes) <= now:
+                fired |= 1 << i
+        SessionAlertState.objects.update_or_create(
+            session_id=session.id,
+            defaults={
+                'thresholds': thresholds,
+                'fired': fired,
+                'next_alert_at': SessionAlertService._next_alert_at(session.planned_end_time, thresholds, fired),
+            }
+        )
+
+    @staticmethod
+    def session_changed(session: ParkingSession, old_status, old_planned_end) -> None:
+        """Keep the alert state in step with a session's status and planned_end_time"""
+        if session.status == ParkingStatus.ACTIVE:
+            if old_status != ParkingStatus.ACTIVE or old_planned_end != session.planned_end_time:
+                # Started, re-activated or extended: alerts count down to the new end
+                SessionAlertService.schedule(session)
+        elif old_status == ParkingStatus.ACTIVE:
+            SessionAlertState.objects.filter(session_id=session.id).delete()
+
+    @staticmethod
+    def build_alert(session: ParkingSession, minutes_left: int) -> tuple:
+        """Unsaved NotificationEvent and push data for an "ends in N minutes" alert"""
+        notification = NotificationEvent(
+            user=session.vehicle.user,
+            title="Parking Session Alert",
+            message=f"Your parking session in {session.zone.name} ends in {minutes_left} minutes.",
+            type='parking_ended',
+            category='parking',
+            metadata={
+                'parking_session_id': str(session.id),
+                'minutes_left': minutes_left
+            }
+        )
+        push_data = {
+            'type': 'session_ending',
+            'session_id': str(session.id),
+            'minutes_left': str(minutes_left),
+        }
+        return notification, push_data
+
+    @staticmethod
+    @transaction.atomic
+    def claim_due(now=None, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+        """
+        Send the alerts of up to batch_size due sessions.
+        Returns {'claimed': rows claimed, 'sent': alerts sent}.
+        """
+        now = now or timezone.now()
+        states = list(
+            SessionAlertState.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(next_alert_at__lte=now)
+            .select_related('session__zone', 'session__vehicle__user')
+            .order_by('next_alert_at')[:batch_size]
+        )
+        if not states:
+            return {'claimed': 0, 'sent': 0}
+
+        notifications = []
+        pushes = []
+        finished = set()
+        for state in states:
+            session = state.session
+            if session.status != ParkingStatus.ACTIVE or session.planned_end_time <= now:
+                # Ended, or past its end: expiry takes over from here
+                finished.add(state.id)
+                continue
+
+            # Every unhandled threshold already reached is handled now; only the
+            # most urgent of them is worth sending
+            minutes_left = None
+            for i, minutes in enumerate(state.thresholds):
+                if state.fired & (1 << i):
+                    continue
+                if session.planned_end_time - timedelta(minutes=minutes) <= now:
+                    state.fired |= 1 << i
+                    minutes_left = minutes
+            state.next_alert_at = SessionAlertService._next_alert_at(
+                session.planned_end_time, state.thresholds, state.fired
+            )
+            state.updated_at = now
+
+            if minutes_left is not None:
+                notification, push_data = SessionAlertService.build_alert(session, minutes_left)
+                notifications.append(notification)
+                pushes.append((notification, push_data))
+
+        if finished:
+            SessionAlertState.objects.filter(id__in=finished).delete()
+        SessionAlertState.objects.bulk_update(
+            [state for state in states if state.id not in finished],
+            ['fired', 'next_alert_at', 'updated_at']
+        )
+        NotificationEvent.objects.bulk_create(notifications)
+        notifications_added(notifications)
+        transaction.on_commit(lambda: send_notification_events(pushes))
+
+        if notifications:
+            logger.info(f"Sent {len(notifications)} session alerts")
+        return {'claimed': len(states), 'sent': len(notifications)}
+
+    @staticmethod
+    def send_due(now=None, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Claim due alerts batch by batch until none are left. Returns alerts sent."""
+        sent = 0
+        while True:
+            stats = SessionAlertService.claim_due(now, batch_size)
+            sent += stats['sent']
+            if stats['claimed'] < batch_size:
+                return sent
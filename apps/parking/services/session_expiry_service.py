@@ -0,0 +1,206 @@
+from django.db import transaction
+from django.utils import timezone
+from collections import defaultdict
+from decimal import Decimal
+import logging
+
+from apps.parking.models import ParkingSession, ParkingSlot, SessionDeadline, SessionAlertState
+from apps.parking.services.deadline_service import SessionDeadlineService
+from apps.parking.services.occupancy_service import OccupancyService, SLOT_STATUS_FIELDS
+from apps.parking.services.zone_live_service import ZoneLiveStatusService
+from apps.common.constants import ParkingStatus, SlotStatus, ViolationType
+from apps.accounts.models import User
+from apps.payments.models import WalletTransaction
+from apps.payments.wallet_service import WalletService
+from apps.enforcement.models import Violation
+from apps.notifications.models import NotificationEvent
+from apps.notifications.notification_triggers import build_parking_ended_notification
+from apps.notifications import outbox
+from apps.notifications.counters import notifications_added
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class SessionExpiryService:
+    """
+    Set-based expiry of overdue parking sessions.
+
+    Sessions are expired a chunk at a time, claimed from the deadline queue
+    (SessionDeadlineService.claim_due) rather than by scanning the active
+    sessions, so concurrent runs split the due sessions. Each chunk does a fixed number of
+    statements: two session updates, one slot update, one wallet debit with
+    its ledger entries (WalletService.bulk_debit), and bulk_creates for
+    violations and notifications. The chunk's expiry notifications are written
+    to the notification outbox in the same transaction that deletes its
+    deadlines, so every expired session is notified exactly once.
+    """
+
+    @staticmethod
+    def expire_overdue(now=None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+        """Expire every ACTIVE session past its planned_end_time. Returns aggregate stats."""
+        now = now or timezone.now()
+        totals = defaultdict(int)
+        while True:
+            stats = SessionExpiryService.expire_chunk(now, chunk_size)
+            for key, value in stats.items():
+                totals[key] += value
+            # Deadlines of sessions locked elsewhere are left for the next run
+            if stats['claimed'] < chunk_size or not stats['expired']:
+                break
+        return dict(totals)
+
+    @staticmethod
+    @transaction.atomic
+    def expire_chunk(now, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+        deadlines = SessionDeadlineService.claim_due(now, chunk_size)
+        sessions = list(
+            ParkingSession.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(id__in=list(deadlines), status=ParkingStatus.ACTIVE, planned_end_time__lte=now)
+            .select_related('vehicle__user__country', 'zone', 'parking_slot')
+            .order_by('planned_end_time')
+        )
+        stats = {'claimed': len(deadlines), 'expired': len(sessions), 'charged': 0, 'violations': 0,
+                 'amount': Decimal('0')}
+        # Claimed deadlines of sessions no longer active, including the ones expired below.
+        # Sessions locked by a concurrent end or extend still read as active and keep theirs.
+        handled = SessionDeadline.objects.filter(id__in=list(deadlines.values())).exclude(
+            session__status=ParkingStatus.ACTIVE
+        )
+        if not sessions:
+            handled.delete()
+            return stats
+
+        # 1. Close the sessions
+        charges = []
+        for session in sessions:
+            session.actual_end_time = now
+            session.final_cost = session.calculate_cost()
+            session.status = ParkingStatus.EXPIRED
+            session.updated_at = now
+
+            planned_seconds = (session.planned_end_time - session.start_time).total_seconds()
+            duration_seconds = (now - session.start_time).total_seconds()
+            overdue_hours = Decimal(str(max(0, duration_seconds - planned_seconds) / 3600))
+            overdue_charge = (overdue_hours * session.zone.hourly_rate).quantize(Decimal('0.01'))
+            if overdue_charge > 0:
+                charges.append((session, overdue_hours, overdue_charge))
+
+        session_ids = [session.id for session in sessions]
+        # Everything but the cost is the same for the whole chunk
+        ParkingSession.objects.filter(id__in=session_ids).update(
+            status=ParkingStatus.EXPIRED, actual_end_time=now, updated_at=now
+        )
+        ParkingSession.objects.bulk_update(sessions, ['final_cost'])
+        handled.delete()
+        SessionAlertState.objects.filter(session_id__in=session_ids).delete()
+
+        # 2. Free the slots; bulk writes bypass the model hooks, so apply counter deltas per zone
+        zone_deltas = defaultdict(lambda: defaultdict(int))
+        zone_events = defaultdict(lambda: {
+            'event': 'sessions_ended', 'status': str(ParkingStatus.EXPIRED), 'session_ids': [], 'freed_slots': []
+        })
+        freed_slots = []
+        for session in sessions:
+            zone_deltas[session.zone_id]['active_sessions'] -= 1
+            zone_events[session.zone_id]['session_ids'].append(str(session.id))
+            slot = session.parking_slot
+            if slot and slot.status != SlotStatus.AVAILABLE:
+                freed_slots.append(slot.id)
+                zone_events[session.zone_id]['freed_slots'].append({'slot_id': str(slot.id), 'slot_code': slot.slot_code})
+                if slot.status in SLOT_STATUS_FIELDS:
+                    zone_deltas[session.zone_id][SLOT_STATUS_FIELDS[slot.status]] -= 1
+                zone_deltas[session.zone_id]['slots_available'] += 1
+        if freed_slots:
+            ParkingSlot.objects.filter(id__in=freed_slots).update(status=SlotStatus.AVAILABLE, updated_at=now)
+        for zone_id, deltas in zone_deltas.items():
+            OccupancyService.apply_deltas(zone_id, deltas)
+            # One delta per zone for the whole chunk
+            ZoneLiveStatusService.zone_changed(zone_id, zone_events[zone_id])
+
+        # 3. Overdue charges: one locked balance read and one bulk debit for all users in the chunk
+        notifications = []
+        pushes = [build_parking_ended_notification(session) for session in sessions]
+
+        wallet_transactions = []
+        violations = []
+        if charges:
+            user_ids = sorted({session.vehicle.user_id for session, _, _ in charges})
+            balances = dict(
+                User.objects.select_for_update().filter(id__in=user_ids).order_by('id').values_list('id', 'wallet_balance')
+            )
+            debits = defaultdict(Decimal)
+
+            for session, overdue_hours, overdue_charge in charges:
+                user = session.vehicle.user
+                sufficient = balances[user.id] >= overdue_charge
+                # Negative balances are allowed; insufficient funds also raise a violation
+                balances[user.id] -= overdue_charge
+                debits[user.id] += overdue_charge
+                user.wallet_balance = balances[user.id]
+
+                wallet_transactions.append(WalletTransaction(
+                    user_id=user.id,
+                    amount=overdue_charge,
+                    transaction_type='payment',
+                    description=f'Overdue parking charge for {session.zone.name} - {overdue_hours:.2f} hours',
+                    parking_session=session
+                ))
+
+                if sufficient:
+                    notifications.append(NotificationEvent(
+                        user_id=user.id,
+                        title="Overdue Parking Charge",
+                        message=f"UGX {overdue_charge} has been deducted from your wallet for {overdue_hours:.2f} hours of overdue parking.",
+                        type='payment_successful',
+                        category='payments',
+                        metadata={
+                            'parking_session_id': str(session.id),
+                            'amount': float(overdue_charge)
+                        }
+                    ))
+                    stats['charged'] += 1
+                else:
+                    violation = Violation(
+                        vehicle=session.vehicle,
+                        officer=None,  # System generated
+                        zone=session.zone,
+                        parking_session=session,
+                        violation_type=ViolationType.OVERDUE_PARKING,
+                        description=f'Vehicle parked {overdue_hours:.2f} hours beyond planned end time without payment',
+                        fine_amount=overdue_charge,
+                        latitude=session.zone.latitude,
+                        longitude=session.zone.longitude
+                    )
+                    violations.append(violation)
+                    notifications.append(NotificationEvent(
+                        user_id=user.id,
+                        title="Parking Violation Issued",
+                        message=f"A violation has been issued for {overdue_hours:.2f} hours of unpaid overdue parking at {session.zone.name}. Fine: UGX {overdue_charge}. Your wallet balance is now UGX {balances[user.id]}",
+                        type='violation_received',
+                        category='violations',
+                        metadata={
+                            'parking_session_id': str(session.id),
+                            'violation_id': str(violation.id),
+                            'fine_amount': float(overdue_charge),
+                            'wallet_balance': float(balances[user.id])
+                        }
+                    ))
+                    stats['violations'] += 1
+                stats['amount'] += overdue_charge
+
+            WalletService.bulk_debit(debits, wallet_transactions)
+
+        Violation.objects.bulk_create(violations)
+        NotificationEvent.objects.bulk_create(notifications)
+        notifications_added(notifications)
+
+        # 4. Expiry notifications are handed off with the chunk: saved and pushed by the outbox relay after commit
+        outbox.enqueue_many(pushes)
+
+        logger.info(
+            f"Expired {stats['expired']} sessions: {stats['charged']} charged, "
+            f"{stats['violations']} violations, UGX {stats['amount']} overdue"
+        )
+        return stats
@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.models import Case, When, IntegerField
+import logging
+from typing import Optional
+
+from apps.parking.models import Zone, ParkingSlot
+from apps.common.constants import SlotStatus
+
+logger = logging.getLogger(__name__)
+
+# Slot types any vehicle may fall back to when its preferred type is full
+FALLBACK_SLOT_TYPES = ['regular', 'compact']
+
+
+class SlotAllocationService:
+    """
+    Claims parking slots without contention.
+
+    Candidate slots are selected with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent
+    requests for the same zone each lock a different free slot instead of all queueing
+    behind (or double-booking) the first one.
+    """
+
+    @staticmethod
+    def slot_type_order(slot_type: Optional[str] = None, fallback: bool = True) -> list:
+        """Slot types to try, most preferred first"""
+        if not slot_type:
+            return list(FALLBACK_SLOT_TYPES)
+        if not fallback:
+            return [slot_type]
+        return [slot_type] + [t for t in FALLBACK_SLOT_TYPES if t != slot_type]
+
+    @staticmethod
+    def claim_slot(zone: Zone, slot_id=None, slot_type: Optional[str] = None, fallback: bool = True) -> Optional[ParkingSlot]:
+        """
+        Lock an available slot in the zone and mark it occupied.
+
+        With slot_id, only that slot is claimed. Otherwise the first free slot of the
+        preferred slot_type is taken, falling back to FALLBACK_SLOT_TYPES unless
+        fallback is False. Without a slot_type any free slot may be returned.
+        Returns None when nothing could be claimed.
+
+        Must run inside the caller's transaction so the slot stays locked until the
+        parking session referencing it is committed.
+        """
+        if not transaction.get_connection().in_atomic_block:
+            raise RuntimeError('SlotAllocationService.claim_slot must be called inside transaction.atomic')
+
+        candidates = ParkingSlot.objects.select_for_update(skip_locked=True).filter(
+            zone=zone,
+            status=SlotStatus.AVAILABLE
+        )
+
+        if slot_id:
+            candidates = candidates.filter(id=slot_id)
+        else:
+            order = SlotAllocationService.slot_type_order(slot_type, fallback)
+            if slot_type:
+                candidates = candidates.filter(slot_type__in=order)
+            # Without a preference any slot will do, general-purpose types first
+            candidates = candidates.annotate(
+                type_rank=Case(
+                    *[When(slot_type=t, then=rank) for rank, t in enumerate(order)],
+                    default=len(order),
+                    output_field=IntegerField()
+                )
+            ).order_by('type_rank', 'slot_code')
+
+        slot = candidates.first()
+        if slot is None:
+            return None
+
+        slot.status = SlotStatus.OCCUPIED
+        slot.save(update_fields=['status', 'updated_at'])
+        return slot
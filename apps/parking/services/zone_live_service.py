@@ -0,0 +1,194 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from datetime import datetime
+import logging
+import uuid
+
+from apps.parking.models import Zone, ZoneOccupancy, ParkingSession
+from apps.parking.services.occupancy_service import OccupancyService
+from apps.common.constants import ParkingStatus
+from apps.common.cache import CoalescingCache
+
+logger = logging.getLogger(__name__)
+
+# Changes invalidate the snapshot, so the TTL only bounds memory and missed events
+LIVE_STATUS_TTL = 300
+
+live_status_cache = CoalescingCache('zone_live', ttl=LIVE_STATUS_TTL, stale_ttl=30)
+
+
+class ZoneLiveStatusService:
+    """
+    Cached live status of a zone for officers (occupancy and its active sessions).
+
+    The cached snapshot (zone_live_{id}) holds no time-dependent values; remaining
+    and elapsed minutes are computed per request. Every write that changes a zone's
+    active sessions or slots calls zone_changed, which after commit replaces the
+    zone's version token (zone_live_ver_{id}). A snapshot is only fresh while its
+    version matches the token, so a snapshot built from pre-commit data by a
+    concurrent reader is rebuilt once the change lands; until the rebuild is done
+    other readers get the previous snapshot rather than queueing on the database.
+
+    Changes that carry an event are also pushed after commit to the zone's channel
+    group (zone_{id}), where ZoneOccupancyConsumer relays them to subscribed
+    officers and dashboards as small deltas.
+    """
+
+    @staticmethod
+    def snapshot_key(zone_id) -> str:
+        return f"zone_live_{zone_id}"
+
+    @staticmethod
+    def version_key(zone_id) -> str:
+        return f"zone_live_ver_{zone_id}"
+
+    @staticmethod
+    def group_name(zone_id) -> str:
+        return f"zone_{zone_id}"
+
+    @staticmethod
+    def zone_changed(zone_id, event: dict = None) -> None:
+        """
+        Publish a change of the zone's sessions or slots: invalidate the snapshot and
+        broadcast the event, if any, once the transaction commits.
+        """
+        def publish():
+            ZoneLiveStatusService.invalidate(zone_id)
+            if event is not None:
+                ZoneLiveStatusService.broadcast(zone_id, event)
+
+        transaction.on_commit(publish)
+
+    @staticmethod
+    def broadcast(zone_id, event: dict) -> None:
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(
+                ZoneLiveStatusService.group_name(zone_id),
+                {'type': 'zone.delta', 'event': event}
+            )
+        except Exception as e:
+            # Subscribers catch up from the next snapshot they request
+            logger.warning(f"Could not broadcast change of zone {zone_id}: {e}")
+
+    @staticmethod
+    def session_entry(session: ParkingSession) -> dict:
+        return {
+            'id': str(session.id),
+            'vehicle_plate': session.vehicle.license_plate,
+            'slot_code': session.parking_slot.slot_code if session.parking_slot else None,
+            'start_time': session.start_time.isoformat(),
+            'planned_end_time': session.planned_end_time.isoformat(),
+            'estimated_cost': float(session.estimated_cost)
+        }
+
+    @staticmethod
+    def session_changed(session: ParkingSession, old_status, old_planned_end) -> None:
+        """Publish the delta for a saved session (see ParkingSession.save)"""
+        was_active = old_status == ParkingStatus.ACTIVE
+        is_active = session.status == ParkingStatus.ACTIVE
+        event = None
+        if is_active and not was_active:
+            event = {'event': 'session_started', 'session': ZoneLiveStatusService.session_entry(session)}
+        elif was_active and not is_active:
+            event = {'event': 'session_ended', 'session_id': str(session.id), 'status': str(session.status)}
+        elif is_active and old_planned_end != session.planned_end_time:
+            event = {
+                'event': 'session_extended',
+                'session_id': str(session.id),
+                'planned_end_time': session.planned_end_time.isoformat()
+            }
+        if is_active or was_active:
+            # Officers' live view lists active sessions only
+            ZoneLiveStatusService.zone_changed(session.zone_id, event)
+
+    @staticmethod
+    def slot_changed(slot, old_status) -> None:
+        """Publish the delta for a saved slot (see ParkingSlot.save)"""
+        event = None
+        if slot.status != old_status:
+            event = {
+                'event': 'slot',
+                'slot_id': str(slot.id),
+                'slot_code': slot.slot_code,
+                'status': str(slot.status)
+            }
+        ZoneLiveStatusService.zone_changed(slot.zone_id, event)
+
+    @staticmethod
+    def invalidate(zone_id) -> None:
+        try:
+            cache.set(ZoneLiveStatusService.version_key(zone_id), uuid.uuid4().hex, None)
+        except Exception as e:
+            # The snapshot then lives until its TTL
+            logger.warning(f"Could not invalidate live status of zone {zone_id}: {e}")
+
+    @staticmethod
+    def build_snapshot(zone: Zone) -> dict:
+        active_sessions = ParkingSession.objects.filter(
+            zone=zone,
+            status=ParkingStatus.ACTIVE
+        ).select_related('vehicle', 'parking_slot')
+
+        # Read fresh: the zone instance may carry counters loaded before the change being published
+        total_slots = ZoneOccupancy.objects.filter(zone_id=zone.id).values_list('slots_total', flat=True).first()
+        if total_slots is None:
+            total_slots = OccupancyService.rebuild(zone.id).slots_total
+        sessions_data = [ZoneLiveStatusService.session_entry(session) for session in active_sessions]
+        return {
+            'zone_id': str(zone.id),
+            'zone_name': zone.name,
+            'total_slots': total_slots,
+            'occupied_slots': len(sessions_data),
+            'active_sessions': sessions_data
+        }
+
+    @staticmethod
+    def get_snapshot(zone: Zone) -> dict:
+        """Cached snapshot of the zone, rebuilt by one worker if missing or invalidated since it was built"""
+        return live_status_cache.get_or_compute(
+            ZoneLiveStatusService.snapshot_key(zone.id),
+            lambda: ZoneLiveStatusService.build_snapshot(zone),
+            version_key=ZoneLiveStatusService.version_key(zone.id)
+        )
+
+    @staticmethod
+    def render(snapshot: dict, now=None) -> dict:
+        """Response payload for a snapshot, with remaining/elapsed minutes as of now"""
+        now = now or timezone.now()
+        sessions_data = []
+        for session in snapshot['active_sessions']:
+            start_time = datetime.fromisoformat(session['start_time'])
+            planned_end_time = datetime.fromisoformat(session['planned_end_time'])
+            remaining_seconds = max(0, (planned_end_time - now).total_seconds())
+            sessions_data.append({
+                'id': session['id'],
+                'vehicle_plate': session['vehicle_plate'],
+                'slot_code': session['slot_code'],
+                'start_time': session['start_time'],
+                'planned_end_time': session['planned_end_time'],
+                'duration_minutes': int((now - start_time).total_seconds() / 60),
+                'remaining_minutes': int(remaining_seconds / 60),
+                'estimated_cost': session['estimated_cost']
+            })
+
+        total_slots = snapshot['total_slots']
+        occupied_slots = snapshot['occupied_slots']
+        return {
+            'zone_id': snapshot['zone_id'],
+            'zone_name': snapshot['zone_name'],
+            'total_slots': total_slots,
+            'occupied_slots': occupied_slots,
+            'available_slots': max(0, total_slots - occupied_slots),
+            'occupancy_rate': (occupied_slots * 100) // total_slots if total_slots > 0 else 0,
+            'active_sessions': sessions_data
+        }
+
+    @staticmethod
+    def live_status(zone: Zone) -> dict:
+        return ZoneLiveStatusService.render(ZoneLiveStatusService.get_snapshot(zone))
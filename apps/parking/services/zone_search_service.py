@@ -0,0 +1,109 @@
+from django.core.cache import caches
+from django.db.models import Max
+import math
+import uuid
+
+from apps.parking.models import Zone
+from apps.common.models import get_current_country
+from apps.common.cache import CoalescingCache
+
+# Size of one spatial grid bucket in degrees (~1.1 km of latitude)
+GRID_CELL_DEGREES = 0.01
+EARTH_RADIUS_METERS = 6371000
+METERS_PER_DEGREE_LAT = 111320
+
+SEARCH_RADIUS_CACHE_KEY = 'zone_max_radius_meters'
+
+# Zone list responses; occupancy figures in them may lag by up to the TTL
+ZONE_LIST_VERSION_KEY = 'zone_list_version'
+zone_list_cache = CoalescingCache('zone_list', ttl=30, stale_ttl=30, alias='zones_cache')
+
+
+class ZoneSearchService:
+    """
+    Nearby-zone lookup over a fixed lat/lon grid.
+
+    Every zone stores the grid bucket of its centre (Zone.grid_lat/grid_lon, indexed
+    together), so a radius search only reads the zones in the buckets overlapping the
+    search box instead of scanning the whole table. Candidates are then filtered and
+    ordered by exact haversine distance.
+    """
+
+    @staticmethod
+    def grid_cell(latitude, longitude) -> tuple:
+        return (
+            math.floor(float(latitude) / GRID_CELL_DEGREES),
+            math.floor(float(longitude) / GRID_CELL_DEGREES),
+        )
+
+    @staticmethod
+    def haversine_meters(lat1, lon1, lat2, lon2) -> float:
+        lat1, lon1, lat2, lon2 = map(math.radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
+        dlat = lat2 - lat1
+        dlon = lon2 - lon1
+        a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+        return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+    @staticmethod
+    def max_zone_radius() -> int:
+        """Largest zone radius, cached so the search box can be widened to reach zone edges"""
+        cache = caches['zones_cache']
+        radius = cache.get(SEARCH_RADIUS_CACHE_KEY)
+        if radius is None:
+            radius = Zone.all_objects.aggregate(r=Max('radius_meters'))['r'] or 0
+            cache.set(SEARCH_RADIUS_CACHE_KEY, radius)
+        return radius
+
+    @staticmethod
+    def invalidate_search_radius() -> None:
+        caches['zones_cache'].delete(SEARCH_RADIUS_CACHE_KEY)
+
+    @staticmethod
+    def zone_list_key(prefix: str, request) -> str:
+        """Cache key of a zone list response: regional context, the user's country and the query string"""
+        context_country = get_current_country()
+        user = request.user
+        user_country = 'all' if user.is_superuser or not getattr(user, 'country_id', None) else user.country_id
+        return f"{prefix}_{context_country.id if context_country else 'all'}_{user_country}_{request.GET.urlencode()}"
+
+    @staticmethod
+    def invalidate_zone_lists() -> None:
+        """Mark every cached zone list stale (a zone was added or edited)"""
+        caches['zones_cache'].set(ZONE_LIST_VERSION_KEY, uuid.uuid4().hex, None)
+
+    @staticmethod
+    def grid_bounds(latitude, longitude, reach_meters) -> tuple:
+        """(min_lat_cell, max_lat_cell, min_lon_cell, max_lon_cell) covering reach_meters around a point"""
+        latitude, longitude = float(latitude), float(longitude)
+        dlat = reach_meters / METERS_PER_DEGREE_LAT
+        # Longitude degrees shrink towards the poles; clamp so the box stays finite
+        dlon = reach_meters / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 0.01))
+
+        min_lat, min_lon = ZoneSearchService.grid_cell(latitude - dlat, max(longitude - dlon, -180))
+        max_lat, max_lon = ZoneSearchService.grid_cell(latitude + dlat, min(longitude + dlon, 180))
+        return min_lat, max_lat, min_lon, max_lon
+
+    @staticmethod
+    def nearby(latitude, longitude, radius_meters, queryset=None) -> list:
+        """
+        Zones whose area lies within radius_meters of the point, closest first.
+        Each returned zone has a `distance_meters` attribute (distance to the zone centre).
+        """
+        if queryset is None:
+            queryset = Zone.objects.filter(is_active=True)
+
+        reach = radius_meters + ZoneSearchService.max_zone_radius()
+        min_lat, max_lat, min_lon, max_lon = ZoneSearchService.grid_bounds(latitude, longitude, reach)
+        candidates = queryset.filter(
+            grid_lat__gte=min_lat, grid_lat__lte=max_lat,
+            grid_lon__gte=min_lon, grid_lon__lte=max_lon,
+        )
+
+        zones = []
+        for zone in candidates:
+            zone.distance_meters = ZoneSearchService.haversine_meters(latitude, longitude, zone.latitude, zone.longitude)
+            if zone.distance_meters - zone.radius_meters <= radius_meters:
+                zones.append(zone)
+
+        zones.sort(key=lambda zone: zone.distance_meters)
+        return zones
@@ -16,47 +16,27 @@ logger = logging.getLogger(__name__)
 @shared_task
 def check_expired_sessions():
     """
-    Periodic task to check for parking sessions that have exceeded their time.
+    Periodic task that expires the sessions due in the deadline queue: ended,
+    charged and notified in bulk chunks by SessionExpiryService.
     """
-    now = timezone.now()
-    # Find active sessions that have passed their planned end time
-    expired_sessions = ParkingSession.objects.filter(
-        status=ParkingStatus.ACTIVE,
-        planned_end_time__lt=now
+    from apps.parking.services.session_expiry_service import SessionExpiryService
+
+    stats = SessionExpiryService.expire_overdue()
+    return (
+        f"Expired {stats['expired']} sessions: {stats['charged']} charged, "
+        f"{stats['violations']} violations."
     )
-    
-    count = 0
-    for session in expired_sessions:
-        # Mark as completed/expired
-        # We use end_session() logic but maybe with a flag or just notify?
-        # For now, let's notify the user and potentially mark as 'completed' or 'expired'
-        # The prompt asked to "Mark status as expired", but ParkingStatus might not have 'EXPIRED'.
-        # Let's check constants. If not, COMPLETED is fine, or we add EXPIRED.
-        # Assuming we just want to notify for now or auto-complete.
-        # Let's auto-complete it to free the slot? Or keep it active and charge penalty?
-        # Plan says: "Mark status as expired". Let's assume we can use COMPLETED or call end_session.
-        # But if we end it, they might get a refund? No, planned_end_time passed means no refund usually.
-        
-        # Let's just notify for now if we don't want to change business logic too much.
-        # "Mark status as expired". Let's see models.py... ParkingStatus choices.
-        # Only ACTIVE, COMPLETED, CANCELLED.
-        # So we might need to add EXPIRED or just leave it.
-        # Let's send a notification.
-        
-        try:
-            user = session.vehicle.user
-            send_notification_to_user(
-                user,
-                title="Parking Session Expired",
-                body=f"Your parking session at {session.zone.name} has expired. Please extend or move your vehicle.",
-                data={'type': 'session_expired', 'session_id': str(session.id)}
-            )
-            logger.info(f"Notified user {user.phone} of expired session {session.id}")
-            count += 1
-        except Exception as e:
-            logger.error(f"Error processing expired session {session.id}: {e}")
 
-    return f"Checked expired sessions. Notified {count} users."
+@shared_task
+def send_session_alerts():
+    """
+    Periodic task that sends the due "session ends in N minutes" alerts.
+    Alert state is kept per session, so late or overlapping runs neither skip nor repeat alerts.
+    """
+    from apps.parking.services.session_alert_service import SessionAlertService
+
+    sent = SessionAlertService.send_due()
+    return f"Sent {sent} session alerts."
 
 @shared_task
 def cancel_overdue_reservations():
@@ -81,6 +61,49 @@ def cancel_overdue_reservations():
         
     return f"Cancelled {count} overdue reservations."
 
+@shared_task
+def expire_reservation_task(reservation_id):
+    """
+    Expire a reservation that is still unpaid 15 minutes after it was created,
+    releasing its capacity in the ledger.
+    """
+    try:
+        reservation = Reservation.objects.get(id=reservation_id)
+    except Reservation.DoesNotExist:
+        return f"Reservation {reservation_id} not found."
+
+    if reservation.status != 'pending_payment':
+        return f"Reservation {reservation_id} is {reservation.status}, nothing to expire."
+    if reservation.created_at > timezone.now() - timedelta(minutes=15):
+        return f"Reservation {reservation_id} is not overdue yet."
+
+    reservation.status = 'expired'
+    reservation.is_active = False
+    if reservation.parking_slot:
+        reservation.parking_slot.status = SlotStatus.AVAILABLE
+        reservation.parking_slot.save()
+    reservation.save()
+    return f"Expired reservation {reservation_id}."
+
+@shared_task
+def prune_capacity_buckets():
+    """Delete reservation capacity buckets that ended more than a day ago."""
+    from apps.parking.services.capacity_ledger_service import CapacityLedgerService
+
+    deleted = CapacityLedgerService.prune()
+    return f"Pruned {deleted} capacity buckets."
+
+@shared_task
+def reconcile_zone_occupancy():
+    """
+    Compare the denormalized zone occupancy counters with the source tables
+    and repair any zone that has drifted.
+    """
+    from apps.parking.services.occupancy_service import OccupancyService
+
+    drifted = OccupancyService.reconcile(repair=True)
+    return f"Reconciled zone occupancy. Repaired {len(drifted)} zones."
+
 @shared_task
 def validate_active_session_location():
     """
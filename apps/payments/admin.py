@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Transaction, PaymentMethod, Refund, Invoice, WalletTransaction, PaymentGatewayConfig
+from .models import Transaction, PaymentMethod, Refund, Invoice, WalletTransaction, PaymentGatewayConfig, WalletBalanceSnapshot
 
 @admin.register(PaymentGatewayConfig)
 class PaymentGatewayConfigAdmin(admin.ModelAdmin):
@@ -8,6 +8,13 @@ class PaymentGatewayConfigAdmin(admin.ModelAdmin):
     search_fields = ('name', 'gateway')
     ordering = ('-priority', 'name')
 
+    def delete_queryset(self, request, queryset):
+        # Bulk deletes skip PaymentGatewayConfig.delete
+        super().delete_queryset(request, queryset)
+
+        from apps.payments.gateway_cache import configs_changed
+        configs_changed()
+
 @admin.register(PaymentMethod)
 class PaymentMethodAdmin(admin.ModelAdmin):
     list_display = ('user', 'card_brand', 'card_last_four', 'is_default', 'is_active')
@@ -30,4 +37,10 @@ class RefundAdmin(admin.ModelAdmin):
 @admin.register(Invoice)
 class InvoiceAdmin(admin.ModelAdmin):
     list_display = ('invoice_number', 'transaction', 'created_at')
-    search_fields = ('invoice_number',)
\ No newline at end of file
+    search_fields = ('invoice_number',)
+@admin.register(WalletBalanceSnapshot)
+class WalletBalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('user', 'balance', 'ledger_balance', 'as_of')
+    list_filter = ('as_of',)
+    search_fields = ('user__phone',)
+    readonly_fields = ('user', 'balance', 'ledger_balance', 'as_of')
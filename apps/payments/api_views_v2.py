@@ -6,6 +6,7 @@ Payments API Endpoints for User App
 - Payment history
 """
 
+import logging
 import uuid
 from decimal import Decimal
 from django.db import transaction
@@ -20,11 +21,15 @@ from .serializers_v2 import (
     TransactionListSerializer, PesapalPaymentSerializer, WalletTransactionSerializer,
     PaymentGatewayConfigSerializer
 )
-from .models import Transaction, PaymentMethod, Invoice, WalletTransaction, PaymentGatewayConfig, PaymentGateway
+from .models import Transaction, PaymentMethod, Invoice, WalletTransaction, PaymentGateway
+from .gateway_cache import get_active_configs
+from .ipn_service import IPNService
 from .pesapal_service import PesapalService
 from apps.enforcement.models import Violation
 from apps.parking.models import ParkingSession, ParkingStatus, Reservation
 
+logger = logging.getLogger(__name__)
+
 class PaymentMethodsListAPIView(generics.ListAPIView):
     """List user's payment methods"""
     permission_classes = [IsAuthenticated]
@@ -342,82 +347,32 @@ class PesapalUserCallbackView(APIView):
         if not all([order_tracking_id, order_merchant_reference]):
             return Response({'error': 'Invalid parameters'}, status=status.HTTP_400_BAD_REQUEST)
             
+        trans = Transaction.objects.filter(pesapal_merchant_reference=order_merchant_reference).first()
+        if trans is None:
+            return Response({'error': 'Transaction not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        # The status is checked with Pesapal in the background (see ipn_service)
         try:
-            trans = Transaction.objects.get(pesapal_merchant_reference=order_merchant_reference)
-            
-            # Resolve config for the transaction's user
-            country = getattr(trans.user, 'country', None)
-            config_obj = PesapalService.get_config_for_country(country)
-            
-            if config_obj:
-                pesapal = PesapalService(config_obj=config_obj)
-            else:
-                pesapal = PesapalService()
-            
-            status_response = pesapal.get_transaction_status(order_tracking_id)
-            
-            # Update status logic (similar to IPN but for user feedback)
-            p_status = status_response.get('payment_status_description', '').lower()
-            if p_status == 'completed' and trans.status != 'completed':
-                trans.status = 'completed'
-                if trans.parking_session:
-                    trans.parking_session.end_session()
-                
-                if trans.reservation:
-                    from apps.parking.services.reservation_service import ReservationService
-                    ReservationService.confirm_reservation(trans.reservation, payment_method='pesapal')
-                
-                # Wallet topup
-                is_wallet_topup = trans.processor_response.get('is_wallet_topup', False) if trans.processor_response else False
-                if is_wallet_topup:
-                    with transaction.atomic():
-                        user = trans.user
-                        user.wallet_balance += trans.amount
-                        # Reload user to ensure balance update persistence if needed or rely on atomic block
-                        user.save()
-                        
-                        from django.utils.translation import gettext as _
-                        WalletTransaction.objects.create(
-                            user=user,
-                            amount=trans.amount,
-                            transaction_type='topup',
-                            description=_('Wallet top-up via PesaPal'),
-                            status='completed',
-                            related_transaction=trans
-                        )
-                        
-                        # Send wallet top-up notification
-                        from apps.notifications.notification_triggers import notify_payment_success
-                        wallet_tx = WalletTransaction.objects.filter(related_transaction=trans).first()
-                        if wallet_tx:
-                            notify_payment_success(wallet_tx)
-                else:
-                    # Send payment success notification for non-wallet payments
-                    from apps.notifications.notification_triggers import notify_payment_success
-                    notify_payment_success(trans)
-            elif p_status in ['failed', 'invalid', 'rejected']:
-                trans.status = 'failed'
-                
-            trans.processor_response = {**trans.processor_response, **status_response}
-            trans.save()
+            IPNService.enqueue(order_tracking_id, order_merchant_reference)
+        except Exception as e:
+            logger.error(f"Could not queue Pesapal callback for {order_tracking_id}: {e}")
+        trans.refresh_from_db(fields=['status'])
+        p_status = 'processing' if trans.status == 'pending' else trans.status
             
-            # Redirect to a simple success/failure HTML page or custom scheme
-            # For now, returning a JSON status that the app can intercept or a simple HTML
-            from django.http import HttpResponse
-            html_content = f"""
-            <html>
-                <head><title>Payment {p_status.title()}</title></head>
-                <body style="text-align: center; padding: 20px; font-family: sans-serif;">
-                    <h1>Payment {p_status.title()}</h1>
-                    <p>Reference: {order_merchant_reference}</p>
-                    <p>You can verify this in the app.</p>
-                </body>
-            </html>
-            """
-            return HttpResponse(html_content)
-
-        except Transaction.DoesNotExist:
-            return Response({'error': 'Transaction not found'}, status=status.HTTP_404_NOT_FOUND)
+        # Redirect to a simple success/failure HTML page or custom scheme
+        # For now, returning a JSON status that the app can intercept or a simple HTML
+        from django.http import HttpResponse
+        html_content = f"""
+        <html>
+            <head><title>Payment {p_status.title()}</title></head>
+            <body style="text-align: center; padding: 20px; font-family: sans-serif;">
+                <h1>Payment {p_status.title()}</h1>
+                <p>Reference: {order_merchant_reference}</p>
+                <p>You can verify this in the app.</p>
+            </body>
+        </html>
+        """
+        return HttpResponse(html_content)
 
 class PesapalIPNAPIView(APIView):
     """Handle PesaPal IPN callbacks"""
@@ -439,73 +394,25 @@ class PesapalIPNAPIView(APIView):
         if not all([order_tracking_id, order_merchant_reference]):
             return Response({'error': 'Invalid IPN parameters'}, status=status.HTTP_400_BAD_REQUEST)
         
+        # Acknowledge at once; the status is checked and applied in the background
         try:
-            trans = Transaction.objects.get(pesapal_merchant_reference=order_merchant_reference)
-            
-            # Resolve config for the transaction's user
-            country = getattr(trans.user, 'country', None)
-            config_obj = PesapalService.get_config_for_country(country)
-            
-            if config_obj:
-                pesapal = PesapalService(config_obj=config_obj)
-            else:
-                pesapal = PesapalService()
-            
-            status_response = pesapal.get_transaction_status(order_tracking_id)
-            
-            p_status = status_response.get('payment_status_description', '').lower()
-            if p_status == 'completed' and trans.status != 'completed':
-                trans.status = 'completed'
-                # Finalize parking session if exists
-                if trans.parking_session:
-                    trans.parking_session.end_session()
-                
-                if trans.reservation:
-                    from apps.parking.services.reservation_service import ReservationService
-                    ReservationService.confirm_reservation(trans.reservation, payment_method='pesapal')
-                
-                # If it's a wallet top-up, credit the wallet
-                is_wallet_topup = trans.processor_response.get('is_wallet_topup', False) if trans.processor_response else False
-                if is_wallet_topup:
-                    with transaction.atomic():
-                        user = trans.user
-                        user.wallet_balance += trans.amount
-                        user.save()
-                        
-                        from django.utils.translation import gettext as _
-                        WalletTransaction.objects.create(
-                            user=user,
-                            amount=trans.amount,
-                            transaction_type='topup',
-                            description=_('Wallet top-up via PesaPal'),
-                            status='completed',
-                            related_transaction=trans
-                        )
-                        
-                        # Send wallet top-up notification
-                        from apps.notifications.notification_triggers import notify_payment_success
-                        wallet_tx = WalletTransaction.objects.filter(related_transaction=trans).first()
-                        if wallet_tx:
-                            notify_payment_success(wallet_tx)
-                else:
-                    # Send payment success notification for non-wallet payments
-                    from apps.notifications.notification_triggers import notify_payment_success
-                    notify_payment_success(trans)
-            elif p_status in ['failed', 'invalid', 'rejected']:
-                trans.status = 'failed'
-            
-            trans.processor_response = {**trans.processor_response, **status_response}
-            trans.save()
-            
+            IPNService.enqueue(order_tracking_id, order_merchant_reference)
+        except Exception as e:
+            logger.error(f"Could not queue Pesapal IPN for {order_tracking_id}: {e}")
+            # Pesapal resends notifications it didn't get a 200 for
             return Response({
                 'orderNotificationType': notification_type,
                 'orderTrackingId': order_tracking_id,
                 'orderMerchantReference': order_merchant_reference,
-                'status': 200
-            }, status=status.HTTP_200_OK)
-            
-        except Transaction.DoesNotExist:
-            return Response({'error': 'Transaction not found'}, status=status.HTTP_404_NOT_FOUND)
+                'status': 500
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response({
+            'orderNotificationType': notification_type,
+            'orderTrackingId': order_tracking_id,
+            'orderMerchantReference': order_merchant_reference,
+            'status': 200
+        }, status=status.HTTP_200_OK)
 
 class AvailablePaymentGatewaysAPIView(generics.ListAPIView):
     """List available payment gateways for user's country"""
@@ -513,8 +420,5 @@ class AvailablePaymentGatewaysAPIView(generics.ListAPIView):
     serializer_class = PaymentGatewayConfigSerializer
     
     def get_queryset(self):
-        country = getattr(self.request.user, 'country', None)
-        return PaymentGatewayConfig.objects.filter(
-            country=country,
-            is_active=True
-        ).order_by('-priority', 'name')
+        # Cached per country, already ordered by priority
+        return get_active_configs(getattr(self.request.user, 'country_id', None))
@@ -0,0 +1,86 @@
+"""
+Cached payment gateway configuration.
+
+Every payment initiation, callback, IPN and gateway listing looked up the
+country's PaymentGatewayConfig rows. The active configs of each country
+(credentials included) are now kept in the default cache and, for
+GATEWAY_CONFIG_LOCAL_TTL seconds, in a per-process LRU, so the payment path
+reads them without a query.
+
+Rows are read through `all_objects` with an explicit country filter: the
+regional manager would add the request's country on top. Saving or deleting a
+config calls configs_changed, which after commit replaces the shared version
+token (gateway_config_ver) so every country is rebuilt on next use; other
+processes may keep their local copy for up to GATEWAY_CONFIG_LOCAL_TTL seconds.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+import copy
+import logging
+import uuid
+
+from apps.common.cache import CoalescingCache, LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached fields change so old entries are not read back
+CONFIGS_VERSION = 1
+VERSION_KEY = 'gateway_config_ver'
+
+gateway_config_cache = CoalescingCache('gateway_config', ttl=settings.GATEWAY_CONFIG_TTL)
+_local_configs = LocalLRUCache(maxsize=256, ttl=settings.GATEWAY_CONFIG_LOCAL_TTL)
+
+
+def configs_key(country_id) -> str:
+    return f"gateway_configs_v{CONFIGS_VERSION}_{country_id or 'global'}"
+
+
+def _attnames():
+    from .models import PaymentGatewayConfig
+    return [field.attname for field in PaymentGatewayConfig._meta.concrete_fields]
+
+
+def build_configs(country_id) -> list:
+    """Value rows of the country's active configs, highest priority first"""
+    from .models import PaymentGatewayConfig
+    return list(
+        PaymentGatewayConfig.all_objects.filter(country_id=country_id, is_active=True)
+        .order_by('-priority', 'name').values_list(*_attnames())
+    )
+
+
+def get_active_configs(country_id) -> list:
+    """The country's active PaymentGatewayConfigs (country_id None: the global ones), highest priority first"""
+    from .models import PaymentGatewayConfig
+    key = str(country_id)
+    rows = _local_configs.get(key)
+    if rows is None:
+        rows = gateway_config_cache.get_or_compute(
+            configs_key(country_id), lambda: build_configs(country_id), version_key=VERSION_KEY
+        )
+        _local_configs.set(key, rows)
+    attnames = _attnames()
+    # New instances every call, so callers can't change each other's copy
+    return [PaymentGatewayConfig.from_db(DEFAULT_DB_ALIAS, attnames, copy.deepcopy(list(row))) for row in rows]
+
+
+def get_config(country_id, gateway):
+    """The country's active config for gateway, or None"""
+    return next((config for config in get_active_configs(country_id) if config.gateway == gateway), None)
+
+
+def configs_changed() -> None:
+    """Drop every country's cached configs once the transaction commits (see PaymentGatewayConfig.save)"""
+    transaction.on_commit(invalidate)
+
+
+def invalidate() -> None:
+    _local_configs.clear()
+    try:
+        # Outlives any entry built under the previous token
+        gateway_config_cache.cache.set(
+            VERSION_KEY, uuid.uuid4().hex, gateway_config_cache.ttl + gateway_config_cache.stale_ttl
+        )
+    except Exception as e:
+        # Entries then live until their TTL
+        logger.warning(f"Could not invalidate cached gateway configs: {e}")
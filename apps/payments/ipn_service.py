@@ -0,0 +1,237 @@
+"""
+Asynchronous processing of Pesapal payment notifications.
+
+Pesapal's IPN and the user's redirect callback only name an order; what happened
+to it comes from a GetTransactionStatus call back to Pesapal. That call and what
+follows (wallet credit, parking session, reservation, notifications) used to run
+inside the webhook request, so a slow gateway held a web worker and made Pesapal
+time out and resend. The webhooks now enqueue() the order and answer at once;
+the process_pesapal_payment task does the rest on a Celery worker.
+
+- A notification for an order that is already queued is dropped. The
+  `pesapal_ipn_queued_{order_tracking_id}` marker is cleared just before the
+  status is fetched, so one arriving mid-processing queues one more run.
+- At most PESAPAL_STATUS_CONCURRENCY status checks run at once across all
+  workers; a task that finds no free slot is retried shortly.
+- apply() locks the Transaction row and only acts on a change of status, so the
+  IPN, the callback and the reconciler can race without fulfilling twice.
+- reconcile_pending() sweeps PENDING transactions Pesapal never notified us of.
+"""
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+import logging
+import uuid
+
+from apps.common.constants import ParkingStatus, TransactionStatus
+from .models import Transaction
+from .pesapal_service import PesapalService
+from .wallet_service import WalletService
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of process()
+NOT_FOUND = 'not_found'
+ALREADY_FINAL = 'already_final'
+BUSY = 'busy'
+UNAVAILABLE = 'unavailable'
+
+FAILED_STATUSES = ('failed', 'invalid', 'rejected')
+# A completed or refunded payment can't change again
+FINAL_STATUSES = (TransactionStatus.COMPLETED, TransactionStatus.REFUNDED)
+
+stats = Counter()
+
+
+def queued_key(order_tracking_id) -> str:
+    return f"pesapal_ipn_queued_{order_tracking_id}"
+
+
+def _clear_queued(order_tracking_id) -> None:
+    try:
+        cache.delete(queued_key(order_tracking_id))
+    except Exception:
+        pass
+
+
+def slot_key(slot) -> str:
+    return f"pesapal_status_slot_{slot}"
+
+
+class IPNService:
+
+    @staticmethod
+    def enqueue(order_tracking_id, merchant_reference=None) -> bool:
+        """
+        Queue processing of the order unless it is already queued; False if it
+        was. Raises if the task can't be queued, so the webhook can ask for a resend.
+        """
+        from .tasks import process_pesapal_payment
+        key = queued_key(order_tracking_id)
+        try:
+            if not cache.add(key, 1, settings.PESAPAL_IPN_DEDUPE_TTL):
+                stats['deduplicated'] += 1
+                return False
+        except Exception as e:
+            # Without the marker duplicates are queued, and apply() ignores them
+            logger.warning(f"IPN dedupe unavailable for {order_tracking_id}: {e}")
+        try:
+            process_pesapal_payment.delay(order_tracking_id, merchant_reference)
+        except Exception:
+            _clear_queued(order_tracking_id)
+            raise
+        stats['queued'] += 1
+        return True
+
+    @staticmethod
+    def abandon(order_tracking_id) -> None:
+        """Give up on a queued order: its next notification queues it again"""
+        _clear_queued(order_tracking_id)
+        logger.warning(f"IPN: Gave up on order {order_tracking_id}, left to a resend or the reconciler")
+
+    @staticmethod
+    def _acquire_slot():
+        """One of PESAPAL_STATUS_CONCURRENCY slots as (key, token), or None if all are taken"""
+        token = uuid.uuid4().hex
+        try:
+            for slot in range(settings.PESAPAL_STATUS_CONCURRENCY):
+                # Outlives the slowest status check, in case the worker dies holding it
+                if cache.add(slot_key(slot), token, settings.PESAPAL_READ_TIMEOUT * 2):
+                    return slot_key(slot), token
+        except Exception as e:
+            logger.warning(f"Pesapal concurrency limit unavailable: {e}")
+            return '', token
+        return None
+
+    @staticmethod
+    def _release_slot(slot) -> None:
+        key, token = slot
+        if not key:
+            return
+        try:
+            if cache.get(key) == token:
+                cache.delete(key)
+        except Exception:
+            pass
+
+    @staticmethod
+    def process(order_tracking_id, merchant_reference=None) -> str:
+        """Fetch the order's status from Pesapal and apply it. Returns the payment status or an outcome above."""
+        lookup = Q(pesapal_order_tracking_id=order_tracking_id)
+        if merchant_reference:
+            # The IPN can beat the tracking id being saved after SubmitOrderRequest
+            lookup |= Q(pesapal_merchant_reference=merchant_reference)
+        trans = Transaction.objects.filter(lookup).select_related('user__country').first()
+        if trans is None:
+            _clear_queued(order_tracking_id)
+            logger.error(f"IPN: No transaction for order {order_tracking_id} ({merchant_reference})")
+            return NOT_FOUND
+        if trans.status in FINAL_STATUSES:
+            _clear_queued(order_tracking_id)
+            stats['already_final'] += 1
+            return ALREADY_FINAL
+
+        slot = IPNService._acquire_slot()
+        if slot is None:
+            stats['busy'] += 1
+            return BUSY
+        try:
+            _clear_queued(order_tracking_id)
+            pesapal = PesapalService(config_obj=PesapalService.get_config_for_country(trans.user.country))
+            status_response = pesapal.get_transaction_status(order_tracking_id)
+        finally:
+            IPNService._release_slot(slot)
+        stats['status_checks'] += 1
+        if not status_response:
+            return UNAVAILABLE
+        return IPNService.apply(trans.id, order_tracking_id, status_response)
+
+    @staticmethod
+    @transaction.atomic
+    def apply(transaction_id, order_tracking_id, status_response) -> str:
+        """Record Pesapal's status of the transaction and fulfil it the first time it completes"""
+        trans = Transaction.objects.select_for_update().get(id=transaction_id)
+        p_status = (status_response.get('payment_status_description') or '').lower()
+        if p_status == 'completed' and trans.status != TransactionStatus.COMPLETED:
+            trans.status = TransactionStatus.COMPLETED
+            IPNService._fulfil(trans)
+            stats['completed'] += 1
+        elif p_status in FAILED_STATUSES and trans.status == TransactionStatus.PENDING:
+            trans.status = TransactionStatus.FAILED
+            stats['failed'] += 1
+
+        trans.pesapal_order_tracking_id = trans.pesapal_order_tracking_id or order_tracking_id
+        trans.processor_response = {**(trans.processor_response or {}), **status_response}
+        trans.save()
+        return p_status
+
+    @staticmethod
+    def _fulfil(trans) -> None:
+        from django.utils.translation import gettext as _
+        from apps.notifications.notification_triggers import notify_parking_started, notify_payment_success
+
+        session = trans.parking_session
+        if session is not None:
+            if session.status == ParkingStatus.PENDING_PAYMENT:
+                # Paid for up front: the session starts now
+                session.status = ParkingStatus.ACTIVE
+                session.save()
+                notify_parking_started(session)
+            elif session.status == ParkingStatus.ACTIVE:
+                session.end_session()
+
+        reservation = trans.reservation
+        if reservation is not None and reservation.status == 'pending_payment':
+            from apps.parking.services.reservation_service import ReservationService
+            ReservationService.confirm_reservation(reservation, payment_method='pesapal')
+
+        is_wallet_topup = trans.processor_response.get('is_wallet_topup', False) if trans.processor_response else False
+        if is_wallet_topup:
+            wallet_tx = WalletService.credit(
+                trans.user,
+                trans.amount,
+                'topup',
+                _('Wallet top-up via PesaPal'),
+                related_transaction=trans
+            )
+            notify_payment_success(wallet_tx)
+        else:
+            notify_payment_success(trans)
+
+    @staticmethod
+    def reconcile_pending(batch_size: int = None, now=None) -> dict:
+        """
+        Queue a status check for every PENDING Pesapal transaction between
+        PESAPAL_RECONCILE_MIN_AGE and PESAPAL_RECONCILE_MAX_AGE seconds old,
+        one batch at a time. Returns {'checked', 'queued'}.
+        """
+        batch_size = batch_size or settings.PESAPAL_RECONCILE_BATCH_SIZE
+        now = now or timezone.now()
+        pending = Transaction.objects.filter(
+            status=TransactionStatus.PENDING,
+            pesapal_order_tracking_id__isnull=False,
+            created_at__lte=now - timedelta(seconds=settings.PESAPAL_RECONCILE_MIN_AGE),
+            created_at__gt=now - timedelta(seconds=settings.PESAPAL_RECONCILE_MAX_AGE),
+        ).order_by('created_at', 'id').values_list(
+            'created_at', 'id', 'pesapal_order_tracking_id', 'pesapal_merchant_reference'
+        )
+
+        totals = {'checked': 0, 'queued': 0}
+        last = None
+        while True:
+            batch = pending
+            if last is not None:
+                batch = batch.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            for _, _, order_tracking_id, merchant_reference in batch:
+                if IPNService.enqueue(order_tracking_id, merchant_reference):
+                    totals['queued'] += 1
+            totals['checked'] += len(batch)
+            last = batch[-1]
+        return totals
@@ -0,0 +1,107 @@
+from decimal import Decimal
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from apps.accounts.models import User
+from apps.payments import pesapal_service
+from apps.payments.pesapal_service import PesapalService
+from apps.payments.pesapal_standin import PesapalStandIn
+
+
+class Command(BaseCommand):
+    help = 'Measure Pesapal calls and latency per payment against the local stand-in, cold vs cached'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payments', type=int, default=20)
+        parser.add_argument('--latency', type=float, default=50, help='Stand-in milliseconds per request')
+        parser.add_argument('--connect-latency', type=float, default=50, help='Stand-in milliseconds per new connection')
+
+    def handle(self, *args, **options):
+        server = PesapalStandIn(
+            latency=options['latency'] / 1000, connect_latency=options['connect_latency'] / 1000
+        ).start()
+        # A fresh account, so nothing cached by an earlier run is reused
+        account = override_settings(
+            PESAPAL_BASE_URL=server.base_url,
+            PESAPAL_CONSUMER_KEY=f"bench-{uuid.uuid4().hex}",
+            PESAPAL_CONSUMER_SECRET='bench-secret',
+        )
+        account.enable()
+        try:
+            user = User(phone='+256710880004', first_name='Bench', last_name='User', email='bench@jambopark.com')
+            n = options['payments']
+            self._measure(server, user, n, cold=True)
+            self._measure(server, user, n, cold=False)
+            self._verify_token_renewal(server)
+            self._verify_retry(server, user)
+        finally:
+            account.disable()
+            pesapal_service.reset()
+            server.stop()
+
+    def _forget(self, pesapal):
+        # What every call used to start from: no token, no IPN id, no open connection
+        pesapal.invalidate_token()
+        pesapal_service.ipn_cache.delete(pesapal.ipn_key())
+        pesapal_service.reset()
+
+    def _measure(self, server, user, n, cold):
+        pesapal = PesapalService()
+        if cold:
+            self._forget(pesapal)
+        server.reset_calls()
+        payments = statuses = 0.0
+        failures = 0
+        for _ in range(n):
+            if cold:
+                self._forget(pesapal)
+            started = time.perf_counter()
+            response = pesapal.create_payment(Decimal('5000'), str(uuid.uuid4()), 'Benchmark', user)
+            payments += time.perf_counter() - started
+            if not response.get('order_tracking_id'):
+                failures += 1
+                continue
+
+            if cold:
+                self._forget(pesapal)
+            started = time.perf_counter()
+            status_response = pesapal.get_transaction_status(response['order_tracking_id'])
+            statuses += time.perf_counter() - started
+            if not status_response or status_response.get('payment_status_description') != 'Completed':
+                failures += 1
+
+        calls = server.calls
+        label = 'cold' if cold else 'cached'
+        self.stdout.write(
+            f"{label}: payment {payments * 1000 / n:.1f}ms, status {statuses * 1000 / n:.1f}ms; "
+            f"per payment + status check: {calls['requests'] / n:.2f} Pesapal calls "
+            f"({calls['RequestToken'] / n:.2f} token, {calls['RegisterIPN'] / n:.2f} IPN), "
+            f"{calls['connections'] / n:.2f} new connections"
+        )
+        if failures:
+            self.stdout.write(self.style.ERROR(f"FAILED: {failures} of {n} payments did not complete"))
+
+    def _verify_token_renewal(self, server):
+        pesapal = PesapalService()
+        pesapal.get_token()
+        # Pesapal forgetting our token before it expires: the next call renews it once
+        server.tokens.clear()
+        server.reset_calls()
+        status_response = pesapal.get_transaction_status('unknown')
+        if status_response is not None and server.calls['RequestToken'] == 1:
+            self.stdout.write(self.style.SUCCESS("SUCCESS: A rejected cached token is renewed and the call retried"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: Token renewal, calls {dict(server.calls)}"))
+
+    def _verify_retry(self, server, user):
+        pesapal = PesapalService()
+        server.reset_calls()
+        server.fail_next = 1
+        response = pesapal.create_payment(Decimal('5000'), str(uuid.uuid4()), 'Benchmark retry', user)
+        if response.get('order_tracking_id') and server.calls['SubmitOrderRequest'] == 2:
+            self.stdout.write(self.style.SUCCESS("SUCCESS: A 503 from Pesapal is retried with backoff"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: Retry after 503, got {response}, calls {dict(server.calls)}"))
@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import time
+
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.payments.models import WalletTransaction
+from apps.payments.wallet_service import WalletService, InsufficientFunds
+from apps.common.management.harness import HarnessCommand
+
+BENCH_PHONE = '+256710880003'
+
+
+class Command(HarnessCommand):
+    help = 'Measure wallet debits/credits and verify concurrent updates, ledger reconciliation and balance_at'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent debit workers (PostgreSQL only)')
+
+    def handle(self, *args, **options):
+        User.objects.filter(phone=BENCH_PHONE).delete()
+        user = User.objects.create(phone=BENCH_PHONE, first_name='Bench', password='!')
+        try:
+            self._measure(user, options['operations'])
+            self._verify_concurrency(user, options['operations'], options['workers'])
+            self._verify_ledger(user)
+        finally:
+            User.objects.filter(phone=BENCH_PHONE).delete()
+
+    def _measure(self, user, n):
+        WalletService.credit(user, Decimal(n * 10), 'topup', 'Benchmark top-up')
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(n):
+                WalletService.debit(user, Decimal('10.00'), 'payment', 'Benchmark debit', allow_negative=False)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f"debit(): {len(queries) / n:.1f} queries, {elapsed * 1000 / n:.2f}ms per operation")
+
+        try:
+            WalletService.debit(user, Decimal('10.00'), 'payment', 'Benchmark overdraw', allow_negative=False)
+            self.stdout.write(self.style.ERROR("FAILED: Overdraw allowed"))
+        except InsufficientFunds as e:
+            self.stdout.write(self.style.SUCCESS(f"SUCCESS: Overdraw refused at balance {e.balance}"))
+
+    def _verify_concurrency(self, user, n, workers):
+        # Two requests holding copies of the user loaded before either spent
+        WalletService.credit(user, Decimal('20.00'), 'topup', 'Benchmark top-up')
+        first, second = User.objects.get(id=user.id), User.objects.get(id=user.id)
+        WalletService.debit(first, Decimal('5.00'), 'payment', 'Stale copy debit')
+        WalletService.debit(second, Decimal('5.00'), 'payment', 'Stale copy debit')
+        balance = User.objects.values_list('wallet_balance', flat=True).get(id=user.id)
+        if balance == Decimal('10.00') and second.wallet_balance == balance:
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Debits through stale user copies both apply"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: Balance {balance} after two debits of 5 from 20"))
+        WalletService.debit(user, balance, 'payment', 'Benchmark reset')
+
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING("Skipping concurrent debits: SQLite serializes writers"))
+            return
+        WalletService.credit(user, Decimal(n), 'topup', 'Benchmark top-up')
+
+        def spend(_):
+            try:
+                # Each worker holds its own stale copy of the user, as request.user would be
+                WalletService.debit(User.objects.get(id=user.id), Decimal('1.00'), 'payment', 'Concurrent debit')
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(spend, range(n)))
+        balance = User.objects.values_list('wallet_balance', flat=True).get(id=user.id)
+        if balance == Decimal('0'):
+            self.stdout.write(self.style.SUCCESS(f"SUCCESS: {n} concurrent debits, no lost update"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: Balance {balance} after {n} concurrent debits, expected 0"))
+
+    def _verify_ledger(self, user):
+        stats = WalletService.reconcile_batch([user.id])
+        midpoint = timezone.now()
+        balance_at_midpoint = User.objects.values_list('wallet_balance', flat=True).get(id=user.id)
+        WalletService.credit(user, Decimal('250.00'), 'refund', 'Benchmark refund')
+
+        if stats['mismatches'] == 0 and WalletService.balance_at(user, midpoint) == balance_at_midpoint:
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Ledger matches the balance and balance_at() is exact"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: {stats}, balance_at {WalletService.balance_at(user, midpoint)} != {balance_at_midpoint}"))
+
+        # A change that bypasses WalletService is caught by the next reconciliation
+        User.objects.filter(id=user.id).update(wallet_balance=Decimal('999999.00'))
+        stats = WalletService.reconcile_batch([user.id])
+        if stats['mismatches'] == 1:
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Reconciliation flags balance changes made outside the ledger"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: Out-of-ledger change not detected: {stats}"))
+        self.stdout.write(f"Ledger entries: {WalletTransaction.objects.filter(user=user).count()}")
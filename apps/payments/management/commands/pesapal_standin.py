@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from apps.payments.pesapal_standin import PesapalStandIn
+
+
+class Command(BaseCommand):
+    help = 'Run a local stand-in for the Pesapal V3 API (set PESAPAL_BASE_URL to its address)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=150, help='Milliseconds added to every request')
+        parser.add_argument('--connect-latency', type=float, default=100,
+                            help='Milliseconds added to every new connection (TLS handshake)')
+        parser.add_argument('--token-ttl', type=int, default=300, help='Seconds tokens stay valid')
+        parser.add_argument('--fail-every', type=int, default=0, help='Answer every Nth request with 503')
+
+    def handle(self, *args, **options):
+        server = PesapalStandIn(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'] / 1000,
+            connect_latency=options['connect_latency'] / 1000,
+            token_ttl=options['token_ttl'],
+            fail_every=options['fail_every'],
+            verbose=options['verbosity'] > 1,
+        )
+        self.stdout.write(f"Pesapal stand-in on {server.base_url} (PESAPAL_BASE_URL={server.base_url})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            calls = ', '.join(f"{name}={count}" for name, count in sorted(server.calls.items()))
+            self.stdout.write(f"Calls: {calls or 'none'}")
@@ -0,0 +1,109 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.accounts.authentication import start_device_session
+from apps.accounts.models import User
+from apps.common.models import Country
+from apps.payments import gateway_cache
+from apps.payments.models import PaymentGateway, PaymentGatewayConfig
+from apps.payments.pesapal_service import PesapalService
+from apps.common.management.harness import HarnessCommand
+
+BENCH_ISO = 'ZZ'
+BENCH_PHONE = '+256710880006'
+GATEWAYS_URL = '/api/payments/user/payments/gateways/'
+
+
+class Command(HarnessCommand):
+    help = 'Verify cached gateway configs: queries per lookup and invalidation on admin changes'
+
+    def handle(self, *args, **options):
+        self._cleanup()
+        country = Country.objects.create(
+            name='Benchmark Land', iso_code=BENCH_ISO, currency='UGX', currency_symbol='USh', phone_code='+999'
+        )
+        pesapal = PaymentGatewayConfig.all_objects.create(
+            country=country, gateway=PaymentGateway.PESAPAL, name='Pesapal', priority=1,
+            credentials={'consumer_key': 'bench-key', 'consumer_secret': 'bench-secret'}
+        )
+        PaymentGatewayConfig.all_objects.create(
+            country=country, gateway=PaymentGateway.CASH, name='Cash', priority=5, credentials={}
+        )
+        try:
+            self._verify_queries(country)
+            self._verify_listing(country)
+            self._verify_invalidation(country, pesapal)
+        finally:
+            self._cleanup()
+
+    def _cleanup(self):
+        User.objects.filter(phone=BENCH_PHONE).delete()
+        PaymentGatewayConfig.all_objects.filter(country__iso_code=BENCH_ISO).delete()
+        Country.objects.filter(iso_code=BENCH_ISO).delete()
+        gateway_cache.invalidate()
+
+    def _queries(self, call):
+        with CaptureQueriesContext(connection) as queries:
+            result = call()
+        return len(queries), result
+
+    def _verify_queries(self, country):
+        lookup = lambda: PesapalService.get_config_for_country(country)
+        cold, config = self._queries(lookup)
+        warm, _ = self._queries(lookup)
+        # Another process: only the shared cache is warm
+        gateway_cache._local_configs.clear()
+        shared, _ = self._queries(lookup)
+        self.stdout.write(f"get_config_for_country: {cold} queries cold, {shared} from the shared cache, {warm} local")
+        if warm == 0 and shared == 0 and config and config.credentials.get('consumer_key') == 'bench-key':
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Gateway config and credentials served without a query"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: {warm}/{shared} queries, config {config}"))
+
+        config.credentials['consumer_key'] = 'changed by caller'
+        if lookup().credentials.get('consumer_key') == 'bench-key':
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Callers get their own copy of the config"))
+        else:
+            self.stdout.write(self.style.ERROR("FAILED: A caller's change leaked into the cache"))
+
+    def _verify_listing(self, country):
+        user = User.objects.create(phone=BENCH_PHONE, first_name='Bench', password='!', country=country)
+        refresh = start_device_session(user)
+        user.save()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        client.get(GATEWAYS_URL)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(GATEWAYS_URL)
+        results = response.data.get('results', response.data) if response.status_code == 200 else []
+        gateways = [item['gateway'] for item in results]
+        if gateways == [PaymentGateway.CASH, PaymentGateway.PESAPAL] and not any(
+            PaymentGatewayConfig._meta.db_table in query['sql'] for query in queries
+        ):
+            self.stdout.write(self.style.SUCCESS(
+                f"SUCCESS: Gateway list by priority with no config query ({len(queries)} queries in total)"
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: Gateway list {response.status_code} {gateways}"))
+
+    def _verify_invalidation(self, country, pesapal):
+        PesapalService.get_config_for_country(country)
+        pesapal.is_active = False
+        pesapal.save()
+        deactivated = PesapalService.get_config_for_country(country) is None
+
+        pesapal.is_active = True
+        pesapal.credentials = {'consumer_key': 'rotated-key', 'consumer_secret': 'rotated-secret'}
+        pesapal.save()
+        config = PesapalService.get_config_for_country(country)
+        rotated = config is not None and config.credentials['consumer_key'] == 'rotated-key'
+
+        pesapal.delete()
+        deleted = PesapalService.get_config_for_country(country) is None
+        if deactivated and rotated and deleted:
+            self.stdout.write(self.style.SUCCESS("SUCCESS: Deactivating, rotating and deleting a config apply at once"))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"FAILED: Invalidation (deactivated {deactivated}, rotated {rotated}, deleted {deleted})"
+            ))
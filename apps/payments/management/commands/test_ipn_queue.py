@@ -0,0 +1,200 @@
+from datetime import timedelta
+from decimal import Decimal
+import time
+import uuid
+
+from celery.exceptions import MaxRetriesExceededError
+from django.conf import settings
+from django.core.cache import cache
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.accounts.models import User
+from apps.common.constants import TransactionStatus
+from apps.payments import pesapal_service
+from apps.payments.ipn_service import IPNService, BUSY, queued_key, slot_key
+from apps.payments.models import Transaction, WalletTransaction
+from apps.payments.tasks import BUSY_RETRIES, process_pesapal_payment
+from apps.payments.pesapal_service import PesapalService
+from apps.payments.pesapal_standin import PesapalStandIn
+from apps.common.management.harness import HarnessCommand
+
+BENCH_PHONE = '+256710880005'
+IPN_URL = '/api/user/payments/pesapal/ipn/'
+CALLBACK_URL = '/api/user/payments/pesapal/callback/'
+
+
+class Command(HarnessCommand):
+    help = 'Verify queued Pesapal IPN handling against the local stand-in: dedupe, idempotency, limits, reconciler'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duplicates', type=int, default=10)
+        parser.add_argument('--stuck', type=int, default=25, help='PENDING transactions for the reconciler')
+
+    def handle(self, *args, **options):
+        User.objects.filter(phone=BENCH_PHONE).delete()
+        server = PesapalStandIn(latency=0.05).start()
+        account = override_settings(
+            PESAPAL_BASE_URL=server.base_url,
+            PESAPAL_CONSUMER_KEY=f"bench-{uuid.uuid4().hex}",
+            PESAPAL_CONSUMER_SECRET='bench-secret',
+        )
+        account.enable()
+        self.server = server
+        self.client = APIClient()
+        self.user = User.objects.create(phone=BENCH_PHONE, first_name='Bench', password='!')
+        try:
+            self._verify_duplicates(options['duplicates'])
+            self._verify_queued_dedupe()
+            self._verify_concurrency_limit()
+            self._verify_failed_then_completed()
+            self._verify_callback()
+            self._verify_reconciler(options['stuck'])
+        finally:
+            account.disable()
+            pesapal_service.reset()
+            server.stop()
+            User.objects.filter(phone=BENCH_PHONE).delete()
+
+    def _order(self, amount=Decimal('1000')):
+        """A PENDING wallet top-up with an order at the stand-in"""
+        reference = str(uuid.uuid4())
+        trans = Transaction.objects.create(
+            user=self.user, amount=amount, status=TransactionStatus.PENDING,
+            idempotency_key=reference, pesapal_merchant_reference=reference,
+            processor_response={'is_wallet_topup': True}
+        )
+        response = PesapalService().create_payment(amount, reference, 'IPN queue test', self.user)
+        trans.pesapal_order_tracking_id = response['order_tracking_id']
+        trans.save()
+        return trans
+
+    def _ipn(self, trans):
+        return self.client.post(IPN_URL, {
+            'OrderTrackingId': trans.pesapal_order_tracking_id,
+            'OrderMerchantReference': trans.pesapal_merchant_reference,
+            'OrderNotificationType': 'IPNCHANGE',
+        }, format='json')
+
+    def _credits(self, trans):
+        return WalletTransaction.objects.filter(related_transaction=trans).count()
+
+    def _report(self, ok, success, failure):
+        if ok:
+            self.stdout.write(self.style.SUCCESS(f"SUCCESS: {success}"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAILED: {failure}"))
+
+    def _verify_duplicates(self, n):
+        trans = self._order()
+        self.server.reset_calls()
+        timings = []
+        statuses = set()
+        for _ in range(n):
+            started = time.perf_counter()
+            statuses.add(self._ipn(trans).status_code)
+            timings.append(time.perf_counter() - started)
+        trans.refresh_from_db()
+        checks = self.server.calls['GetTransactionStatus']
+        self.stdout.write(
+            f"{n} IPNs for one order: first {timings[0] * 1000:.1f}ms, "
+            f"duplicates {sum(timings[1:]) * 1000 / max(1, n - 1):.1f}ms each"
+        )
+        self._report(
+            statuses == {200} and trans.status == TransactionStatus.COMPLETED
+            and self._credits(trans) == 1 and checks == 1,
+            f"{n} IPNs for one order: one status check, one wallet credit",
+            f"{n} IPNs: statuses {statuses}, {trans.status}, {self._credits(trans)} credits, {checks} status checks"
+        )
+
+    def _verify_queued_dedupe(self):
+        trans = self._order()
+        # As if a worker had the order queued already
+        cache.add(queued_key(trans.pesapal_order_tracking_id), 1, 60)
+        self.server.reset_calls()
+        response = self._ipn(trans)
+        trans.refresh_from_db()
+        self._report(
+            response.status_code == 200 and self.server.calls['GetTransactionStatus'] == 0
+            and trans.status == TransactionStatus.PENDING,
+            "An IPN for an already queued order is acknowledged and dropped",
+            f"Queued duplicate: {response.status_code}, {trans.status}, calls {dict(self.server.calls)}"
+        )
+        cache.delete(queued_key(trans.pesapal_order_tracking_id))
+        self._ipn(trans)
+
+    def _verify_concurrency_limit(self):
+        trans = self._order()
+        slots = [slot_key(slot) for slot in range(settings.PESAPAL_STATUS_CONCURRENCY)]
+        for key in slots:
+            cache.add(key, 'held', 60)
+        self.server.reset_calls()
+        key = queued_key(trans.pesapal_order_tracking_id)
+        try:
+            outcome = IPNService.process(trans.pesapal_order_tracking_id, trans.pesapal_merchant_reference)
+            # The last retry of a queued order still finding no slot
+            cache.add(key, 1, 60)
+            last_try = process_pesapal_payment.apply(
+                (trans.pesapal_order_tracking_id, trans.pesapal_merchant_reference), retries=BUSY_RETRIES
+            )
+        finally:
+            cache.delete_many(slots)
+        self._report(
+            outcome == BUSY and self.server.calls['GetTransactionStatus'] == 0,
+            f"With all {len(slots)} status-check slots taken, processing waits",
+            f"Concurrency limit: outcome {outcome}, calls {dict(self.server.calls)}"
+        )
+        self._report(
+            isinstance(last_try.result, MaxRetriesExceededError) and cache.get(key) is None,
+            "A task out of retries clears the queued marker, so a resend queues the order again",
+            f"Out of retries: {last_try.result!r}, marker {cache.get(key)}"
+        )
+        IPNService.process(trans.pesapal_order_tracking_id, trans.pesapal_merchant_reference)
+
+    def _verify_failed_then_completed(self):
+        trans = self._order()
+        self.server.payment_statuses[trans.pesapal_order_tracking_id] = 'Failed'
+        self._ipn(trans)
+        trans.refresh_from_db()
+        failed = trans.status == TransactionStatus.FAILED and self._credits(trans) == 0
+        # The user pays again on the same order
+        self.server.payment_statuses[trans.pesapal_order_tracking_id] = 'Completed'
+        self._ipn(trans)
+        trans.refresh_from_db()
+        self._report(
+            failed and trans.status == TransactionStatus.COMPLETED and self._credits(trans) == 1,
+            "A failed payment completed later is credited once",
+            f"Failed then completed: {trans.status}, {self._credits(trans)} credits"
+        )
+
+    def _verify_callback(self):
+        trans = self._order()
+        response = self.client.get(CALLBACK_URL, {
+            'OrderTrackingId': trans.pesapal_order_tracking_id,
+            'OrderMerchantReference': trans.pesapal_merchant_reference,
+        })
+        self._report(
+            response.status_code == 200 and b'Payment Completed' in response.content,
+            "The redirect callback answers with the transaction's current status",
+            f"Callback: {response.status_code} {response.content[:200]}"
+        )
+
+    def _verify_reconciler(self, n):
+        orders = [self._order() for _ in range(n)]
+        Transaction.objects.filter(id__in=[trans.id for trans in orders]).update(
+            created_at=timezone.now() - timedelta(minutes=10)
+        )
+        self.server.reset_calls()
+        started = time.perf_counter()
+        totals = IPNService.reconcile_pending(batch_size=10)
+        elapsed = time.perf_counter() - started
+        completed = Transaction.objects.filter(
+            id__in=[trans.id for trans in orders], status=TransactionStatus.COMPLETED
+        ).count()
+        self.stdout.write(f"Reconciler: {totals} in {elapsed * 1000:.0f}ms")
+        self._report(
+            completed == n and totals['queued'] >= n and self.server.calls['GetTransactionStatus'] == n,
+            f"The reconciler completed {n} stuck PENDING transactions in batches",
+            f"Reconciler: {completed} of {n} completed, {totals}, calls {dict(self.server.calls)}"
+        )
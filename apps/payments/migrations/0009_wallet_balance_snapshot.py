@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+from django.utils import timezone
+
+
+def opening_snapshots(apps, schema_editor):
+    # Earlier balance changes were not all ledgered, so reconciliation starts
+    # from every wallet's balance as it is now
+    User = apps.get_model('accounts', 'User')
+    WalletBalanceSnapshot = apps.get_model('payments', 'WalletBalanceSnapshot')
+    now = timezone.now()
+    WalletBalanceSnapshot.objects.bulk_create(
+        (
+            WalletBalanceSnapshot(user_id=user_id, balance=balance, ledger_balance=balance, as_of=now)
+            for user_id, balance in User.objects.values_list('id', 'wallet_balance').iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('payments', '0008_invoice_pay_inv_num_idx_invoice_pay_inv_tx_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletBalanceSnapshot',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('ledger_balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('as_of', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wallet_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-as_of'], name='pay_wsnap_u_asof_idx')],
+            },
+        ),
+        migrations.RunPython(opening_snapshots, migrations.RunPython.noop),
+    ]
@@ -26,6 +26,19 @@ class PaymentGatewayConfig(RegionalModel, BaseModel):
         country_name = self.country.name if self.country else "Global"
         return f"{self.gateway.title()} - {country_name}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        from apps.payments.gateway_cache import configs_changed
+        configs_changed()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+
+        from apps.payments.gateway_cache import configs_changed
+        configs_changed()
+        return result
+
 class PaymentMethod(BaseModel):
     user = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='payment_methods')
     card_last_four = models.CharField(max_length=4)
@@ -134,4 +147,28 @@ class WalletTransaction(BaseModel):
         ]
     
     def __str__(self):
-        return f"{self.user.phone} - {self.transaction_type} - {self.amount}"
\ No newline at end of file
+        return f"{self.user.phone} - {self.transaction_type} - {self.amount}"
+
+class WalletBalanceSnapshot(BaseModel):
+    """
+    A user's wallet balance as of a point in time, taken by the wallet
+    reconciliation job. ledger_balance is what the previous snapshot plus the
+    ledger entries since then add up to; it differs from balance only if the
+    balance was changed outside WalletService.
+    """
+    user = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='wallet_snapshots')
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    ledger_balance = models.DecimalField(max_digits=12, decimal_places=2)
+    as_of = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-as_of'], name='pay_wsnap_u_asof_idx'),
+        ]
+
+    @property
+    def is_consistent(self):
+        return self.balance == self.ledger_balance
+
+    def __str__(self):
+        return f"{self.user_id} - {self.balance} @ {self.as_of}"
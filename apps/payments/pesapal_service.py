@@ -1,12 +1,98 @@
-import requests
-import uuid
+"""
+Pesapal V3 client.
+
+Every call goes through one pooled requests.Session per process, so repeated
+calls reuse a kept-alive connection instead of a new TCP/TLS handshake each.
+Connection failures, 429 and 503 are retried with backoff; other errors and read
+timeouts are not, so an order is never submitted twice.
+
+The auth token is cached per account (base URL and consumer key) until
+PESAPAL_TOKEN_REFRESH_MARGIN seconds before it expires, and the IPN id per
+account and IPN URL, so a payment costs one Pesapal call instead of three and a
+status check one instead of two. Both are shared through the default cache and
+fetched by one worker at a time (CoalescingCache). A request rejected with 401
+drops the cached token and is retried once with a fresh one.
+
+PESAPAL_BASE_URL overrides the sandbox/live URL, e.g. to point at the local
+stand-in (`manage.py pesapal_standin`).
+"""
+from collections import Counter
+from datetime import datetime
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import hashlib
 import logging
 import os
-from django.conf import settings
-from decouple import config
+import re
+import threading
+import time
+import requests
+
+from apps.common.cache import CoalescingCache
 
 logger = logging.getLogger(__name__)
 
+SANDBOX_URL = "https://cybqa.pesapal.com/pesapalv3"
+LIVE_URL = "https://pay.pesapal.com/v3"
+
+# Pesapal sends up to 7 fractional digits, more than fromisoformat takes
+EXPIRY_PATTERN = re.compile(r'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.\d+)?(Z|[+-]\d\d:\d\d)?$')
+
+stats = Counter()
+
+token_cache = CoalescingCache('pesapal_token', ttl=settings.PESAPAL_TOKEN_TTL, stale_ttl=0)
+ipn_cache = CoalescingCache('pesapal_ipn', ttl=settings.PESAPAL_IPN_ID_TTL)
+
+_session_lock = threading.Lock()
+_session = None
+_session_pid = None
+
+
+def get_session() -> requests.Session:
+    """This process's pooled session, created on first use (and again after a fork)"""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                retry = Retry(
+                    total=settings.PESAPAL_RETRIES,
+                    read=0,
+                    backoff_factor=0.3,
+                    # Statuses that mean the request was not processed, so POSTs are safe to resend
+                    status_forcelist=(429, 503),
+                    allowed_methods=frozenset({'GET', 'POST'}),
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_maxsize=settings.PESAPAL_POOL_SIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+                _session_pid = pid
+    return _session
+
+
+def reset() -> None:
+    """Close this process's connections; the next call opens new ones"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def _parse_expiry(value):
+    """Epoch seconds of a Pesapal expiryDate (UTC unless it says otherwise), or None"""
+    match = EXPIRY_PATTERN.match(value or '')
+    if not match:
+        return None
+    stamp, offset = match.groups()
+    return datetime.fromisoformat(stamp + (offset if offset and offset != 'Z' else '+00:00')).timestamp()
+
+
 class PesapalService:
     def __init__(self, config_obj=None):
         if config_obj:
@@ -21,34 +107,58 @@ class PesapalService:
             self.sandbox = settings.PESAPAL_SANDBOX
             self.callback_url = settings.PESAPAL_CALLBACK_URL
         
-        if self.sandbox:
-            self.base_url = "https://cybqa.pesapal.com/pesapalv3"
+        if settings.PESAPAL_BASE_URL:
+            self.base_url = settings.PESAPAL_BASE_URL.rstrip('/')
+        elif self.sandbox:
+            self.base_url = SANDBOX_URL
         else:
-            self.base_url = "https://pay.pesapal.com/v3"
+            self.base_url = LIVE_URL
+        self.timeout = (settings.PESAPAL_CONNECT_TIMEOUT, settings.PESAPAL_READ_TIMEOUT)
 
     @staticmethod
     def get_config_for_country(country):
-        """Helper to get Pesapal config for a country"""
-        from .models import PaymentGatewayConfig, PaymentGateway
-        return PaymentGatewayConfig.objects.filter(
-            country=country,
-            gateway=PaymentGateway.PESAPAL,
-            is_active=True
-        ).first()
+        """Helper to get Pesapal config for a country, from the gateway config cache"""
+        from .gateway_cache import get_config
+        from .models import PaymentGateway
+        return get_config(country.id if country else None, PaymentGateway.PESAPAL)
+
+    def _account_hash(self, *extra) -> str:
+        # Never the secret: the key only has to tell accounts apart
+        raw = '|'.join([self.base_url, self.consumer_key or '', *extra])
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
 
+    def token_key(self) -> str:
+        return f"pesapal_token_{self._account_hash()}"
 
+    def ipn_url(self) -> str:
+        # Derive IPN URL - replace 'callback' with 'ipn' or append if not present
+        # Assuming PESAPAL_CALLBACK_URL ends with /callback/
+        # We want .../ipn/
+        ipn_url = self.callback_url.replace('/callback/', '/ipn/')
+        if ipn_url == self.callback_url:
+             # Fallback if pattern doesn't match
+             ipn_url = self.callback_url + 'ipn/'
+        return ipn_url
 
+    def ipn_key(self) -> str:
+        return f"pesapal_ipn_{self._account_hash(self.ipn_url())}"
 
-    def get_token(self):
-        """Get authentication token from PesaPal V3"""
-        url = f"{self.base_url}/api/Auth/RequestToken"
+    def _post(self, path, payload, token=None):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        return get_session().post(f"{self.base_url}{path}", json=payload, headers=headers, timeout=self.timeout)
+
+    def request_token(self):
+        """A new token from PesaPal V3: {'token', 'expires_at'} or None"""
+        stats['token_requests'] += 1
         payload = {
             "consumer_key": self.consumer_key,
             "consumer_secret": self.consumer_secret
         }
         
         try:
-            response = requests.post(url, json=payload, timeout=30)
+            response = self._post("/api/Auth/RequestToken", payload)
             response.raise_for_status()
             
             data = response.json()
@@ -57,50 +167,74 @@ class PesapalService:
                 return None
                 
             token = data.get('token')
-            return token
+            if not token:
+                return None
+            expires_at = _parse_expiry(data.get('expiryDate')) or time.time() + settings.PESAPAL_TOKEN_TTL
+            return {'token': token, 'expires_at': expires_at}
         except Exception as e:
             logger.error(f"PesaPal get_token error: {str(e)}")
             return None
 
-    def register_ipn(self, token):
-        """Register IPN URL with PesaPal if not already done"""
-        url = f"{self.base_url}/api/URLSetup/RegisterIPN"
-        
-        # Derive IPN URL - replace 'callback' with 'ipn' or append if not present
-        # Assuming PESAPAL_CALLBACK_URL ends with /callback/
-        # We want .../ipn/
-        ipn_url = self.callback_url.replace('/callback/', '/ipn/')
-        if ipn_url == self.callback_url:
-             # Fallback if pattern doesn't match
-             ipn_url = self.callback_url + 'ipn/'
+    def get_token(self):
+        """Get authentication token from PesaPal V3, cached until shortly before it expires"""
+        key = self.token_key()
+        cached = token_cache.get_or_compute(key, self.request_token)
+        if cached and cached['expires_at'] - settings.PESAPAL_TOKEN_REFRESH_MARGIN <= time.time():
+            # Issued with a shorter life than PESAPAL_TOKEN_TTL
+            token_cache.delete(key)
+            cached = token_cache.get_or_compute(key, self.request_token)
+        return cached['token'] if cached else None
+
+    def invalidate_token(self) -> None:
+        token_cache.delete(self.token_key())
+
+    def _authorized(self, method, path, payload=None):
+        """Send with the cached token; on 401 drop it and retry once with a fresh one"""
+        for attempt in range(2):
+            token = self.get_token()
+            if not token:
+                return None
+            if method == 'GET':
+                response = get_session().get(
+                    f"{self.base_url}{path}",
+                    headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+                    timeout=self.timeout
+                )
+            else:
+                response = self._post(path, payload, token=token)
+            if response.status_code != 401 or attempt:
+                return response
+            logger.info("Pesapal rejected the cached token, requesting a new one")
+            self.invalidate_token()
 
+    def _register_ipn(self, token):
+        stats['ipn_registrations'] += 1
         payload = {
-            "url": ipn_url,
+            "url": self.ipn_url(),
             "ipn_notification_type": "POST" # Prefer POST for IPN
         }
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
         
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
+            response = self._post("/api/URLSetup/RegisterIPN", payload, token=token)
+            if response.status_code == 401:
+                self.invalidate_token()
             response.raise_for_status()
             return response.json().get('ipn_id')
         except Exception as e:
             logger.error(f"PesaPal register_ipn error: {str(e)}")
             return None
 
+    def register_ipn(self, token):
+        """The IPN id for our IPN URL, registering it with PesaPal if not cached"""
+        return ipn_cache.get_or_compute(self.ipn_key(), lambda: self._register_ipn(token))
+
     def create_payment(self, amount, merchant_reference, description, user, currency="UGX"):
         """Create a payment request and return redirect URL"""
         token = self.get_token()
         if not token:
             return {'error': 'Failed to authenticate with Pesapal'}
             
-        url = f"{self.base_url}/api/Transactions/SubmitOrderRequest"
-        
-        # Registration of IPN might be needed for every transaction or once.
-        # V3 usually expects an IPN ID.
+        # V3 expects the id of a registered IPN URL; it stays valid, so it is cached
         ipn_id = self.register_ipn(token)
         if not ipn_id:
             logger.error("Failed to register/get IPN ID")
@@ -122,13 +256,10 @@ class PesapalService:
             }
         }
 
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
+            response = self._authorized('POST', "/api/Transactions/SubmitOrderRequest", payload)
+            if response is None:
+                return {'error': 'Failed to authenticate with Pesapal'}
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -139,18 +270,12 @@ class PesapalService:
 
     def get_transaction_status(self, order_tracking_id):
         """Get transaction status from PesaPal"""
-        token = self.get_token()
-        if not token:
-            return None
-            
-        url = f"{self.base_url}/api/Transactions/GetTransactionStatus?orderTrackingId={order_tracking_id}"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
         try:
-            response = requests.get(url, headers=headers, timeout=30)
+            response = self._authorized(
+                'GET', f"/api/Transactions/GetTransactionStatus?orderTrackingId={order_tracking_id}"
+            )
+            if response is None:
+                return None
             response.raise_for_status()
             return response.json()
         except Exception as e:
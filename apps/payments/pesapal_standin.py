@@ -0,0 +1,176 @@
+"""
+A local stand-in for the Pesapal V3 API, for benchmarking and offline testing.
+
+Serves the endpoints PesapalService uses (RequestToken, RegisterIPN,
+SubmitOrderRequest, GetTransactionStatus) with responses shaped like Pesapal's,
+and counts calls per endpoint. `latency` is added to every request and
+`connect_latency` once per new connection, to stand in for the TLS handshake a
+pooled connection saves; `fail_every` answers every Nth request with 503. Run it with `manage.py pesapal_standin` and point
+PESAPAL_BASE_URL at it, or start it in-process with PesapalStandIn().start().
+"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import json
+import threading
+import time
+import uuid
+
+STATUS_CODES = {'Invalid': 0, 'Completed': 1, 'Failed': 2, 'Reversed': 3}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Keep-alive, as Pesapal does
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.count('connections')
+        time.sleep(self.server.connect_latency)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _authorized(self):
+        token = (self.headers.get('Authorization') or '').removeprefix('Bearer ')
+        expires_at = self.server.tokens.get(token)
+        if expires_at is None or expires_at <= time.time():
+            self._send(401, {'error': {'code': 'invalid_token', 'message': 'Token is invalid or expired'}, 'status': '401'})
+            return False
+        return True
+
+    def _handle(self, method):
+        server = self.server
+        path = urlparse(self.path).path
+        endpoint = path.rsplit('/', 1)[-1]
+        server.count(endpoint)
+        # Read before any early answer, so the kept-alive connection stays in step
+        body = self._body() if method == 'POST' else {}
+        time.sleep(server.latency)
+        if server.should_fail():
+            return self._send(503, {'error': {'code': 'unavailable', 'message': 'Try again'}, 'status': '503'})
+
+        if method == 'POST' and endpoint == 'RequestToken':
+            if not body.get('consumer_key') or not body.get('consumer_secret'):
+                return self._send(200, {'error': {'code': 'invalid_consumer_key_or_secret_provided'}, 'status': '500'})
+            token = uuid.uuid4().hex
+            expires_at = datetime.now(dt_timezone.utc) + timedelta(seconds=server.token_ttl)
+            with server.lock:
+                server.tokens[token] = expires_at.timestamp()
+            return self._send(200, {
+                'token': token,
+                # 7 fractional digits, as Pesapal sends
+                'expiryDate': expires_at.strftime('%Y-%m-%dT%H:%M:%S.%f') + '0Z',
+                'error': None, 'status': '200', 'message': 'Request processed successfully'
+            })
+
+        if not self._authorized():
+            return
+        if method == 'POST' and endpoint == 'RegisterIPN':
+            with server.lock:
+                ipn_id = server.ipns.setdefault(body.get('url'), str(uuid.uuid4()))
+            return self._send(200, {
+                'url': body.get('url'), 'ipn_id': ipn_id, 'notification_type': 1,
+                'ipn_notification_type_description': body.get('ipn_notification_type', 'POST'),
+                'ipn_status': 1, 'ipn_status_description': 'Active', 'error': None, 'status': '200'
+            })
+        if method == 'POST' and endpoint == 'SubmitOrderRequest':
+            if body.get('notification_id') not in server.ipns.values():
+                return self._send(200, {'error': {'code': 'invalid_notification_id'}, 'status': '500'})
+            order_tracking_id = str(uuid.uuid4())
+            with server.lock:
+                server.orders[order_tracking_id] = body
+            return self._send(200, {
+                'order_tracking_id': order_tracking_id,
+                'merchant_reference': body.get('id'),
+                'redirect_url': f"{server.base_url}/iframe/?OrderTrackingId={order_tracking_id}",
+                'error': None, 'status': '200'
+            })
+        if method == 'GET' and endpoint == 'GetTransactionStatus':
+            order_tracking_id = parse_qs(urlparse(self.path).query).get('orderTrackingId', [''])[0]
+            order = server.orders.get(order_tracking_id)
+            if order is None:
+                return self._send(200, {'error': {'code': 'order_not_found'}, 'status': '500'})
+            payment_status = server.payment_statuses.get(order_tracking_id, 'Completed')
+            return self._send(200, {
+                'payment_method': 'Visa', 'amount': order['amount'], 'currency': order['currency'],
+                'payment_status_description': payment_status, 'status_code': STATUS_CODES[payment_status],
+                'merchant_reference': order['id'], 'confirmation_code': uuid.uuid4().hex[:12].upper(),
+                'created_date': datetime.now(dt_timezone.utc).isoformat(), 'error': None, 'status': '200'
+            })
+        self._send(404, {'error': {'code': 'not_found', 'message': path}, 'status': '404'})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class PesapalStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, connect_latency=0.0,
+                 token_ttl=300, fail_every=0, verbose=False):
+        super().__init__((host, port), StandInHandler)
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.token_ttl = token_ttl
+        self.fail_every = fail_every
+        # Requests still to answer with 503, whatever fail_every says
+        self.fail_next = 0
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.tokens = {}
+        self.ipns = {}
+        self.orders = {}
+        # payment_status_description per order tracking id, Completed if not set
+        self.payment_statuses = {}
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name) -> int:
+        with self.lock:
+            self.calls[name] += 1
+            return self.calls[name]
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            self.calls['requests'] += 1
+            if self.fail_next:
+                self.fail_next -= 1
+                return True
+            return bool(self.fail_every) and self.calls['requests'] % self.fail_every == 0
+
+    def reset_calls(self) -> None:
+        with self.lock:
+            self.calls.clear()
+
+    def start(self) -> 'PesapalStandIn':
+        """Serve from a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
@@ -8,6 +8,7 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from decimal import Decimal
 
+from .ipn_service import IPNService
 from .pesapal_service import PesapalService
 from .models import Transaction
 from apps.common.constants import TransactionStatus
@@ -93,51 +94,23 @@ class PesapalCallbackView(APIView):
         if not order_tracking_id:
             return Response({'error': 'OrderTrackingId is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        pesapal = PesapalService()
-        status_response = pesapal.get_transaction_status(order_tracking_id)
-
-        if not status_response:
-            return Response({'error': 'Could not verify payment status'}, status=status.HTTP_400_BAD_REQUEST)
+        transaction = Transaction.objects.filter(pesapal_merchant_reference=merchant_reference).first()
+        if transaction is None:
+            logger.error(f"Transaction with reference {merchant_reference} not found")
+            return Response({'error': 'Transaction not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Update transaction status
+        # The status is checked with Pesapal in the background (see ipn_service)
         try:
-            transaction = Transaction.objects.get(pesapal_merchant_reference=merchant_reference)
-            
-            payment_status = status_response.get('payment_status_description')
-            
-            if payment_status == "Completed":
-                transaction.status = TransactionStatus.COMPLETED
-                if transaction.parking_session:
-                    # Activate the parking session
-                    session = transaction.parking_session
-                    if session.status == 'pending_payment': # Use string if constant not imported, or import it
-                        session.status = 'active'
-                        # Refresh planned_end_time? Optional, but let's keep original for now.
-                        session.save()
-                        
-                        # Send notifications
-                        from apps.notifications.notification_triggers import notify_parking_started, notify_payment_success
-                        notify_payment_success(transaction)
-                        notify_parking_started(session)
-                        
-            elif payment_status == "Failed":
-                transaction.status = TransactionStatus.FAILED
-            
-            transaction.processor_response = status_response
-            transaction.save()
+            IPNService.enqueue(order_tracking_id, merchant_reference)
+        except Exception as e:
+            logger.error(f"Could not queue Pesapal callback for {order_tracking_id}: {e}")
+        transaction.refresh_from_db(fields=['status'])
 
-            # For a mobile app callback, we usually want to show a success/failure page
-            # or redirect to a custom scheme.
-            # providing a simple HTML response for now.
-            return Response({
-                'status': 'success',
-                'payment_status': payment_status, 
-                'merchant_reference': merchant_reference
-            })
-
-        except Transaction.DoesNotExist:
-            logger.error(f"Transaction with reference {merchant_reference} not found")
-            return Response({'error': 'Transaction not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'status': 'success',
+            'payment_status': transaction.get_status_display(),
+            'merchant_reference': merchant_reference
+        })
 
 class PesapalIPNView(APIView):
     permission_classes = [AllowAny]
@@ -160,46 +133,18 @@ class PesapalIPNView(APIView):
         if not order_tracking_id:
              return Response({'error': 'Missing OrderTrackingId'}, status=status.HTTP_400_BAD_REQUEST)
 
-        pesapal = PesapalService()
-        status_response = pesapal.get_transaction_status(order_tracking_id)
-        
-        if not status_response:
-             # If we can't verify, we should probably return 500 so Pesapal retries
-             return Response({'error': 'Verification failed'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
+        response_data = {
+            "orderNotificationType": notification_type,
+            "orderTrackingId": order_tracking_id,
+            "orderMerchantReference": merchant_reference,
+            "status": 200
+        }
         try:
-            transaction = Transaction.objects.get(pesapal_merchant_reference=merchant_reference)
-            payment_status = status_response.get('payment_status_description')
-            
-            if payment_status == "Completed":
-                transaction.status = TransactionStatus.COMPLETED
-                if transaction.parking_session:
-                    # Activate the parking session
-                    session = transaction.parking_session
-                    if session.status == 'pending_payment':
-                        session.status = 'active'
-                        session.save()
-                        
-                        # Send notifications
-                        from apps.notifications.notification_triggers import notify_parking_started, notify_payment_success
-                        notify_payment_success(transaction)
-                        notify_parking_started(session)
-
-            elif payment_status == "Failed":
-                transaction.status = TransactionStatus.FAILED
-                
-            transaction.processor_response = status_response
-            transaction.save()
-            
-            # Respond to Pesapal as required
-            response_data = {
-                "orderNotificationType": notification_type,
-                "orderTrackingId": order_tracking_id,
-                "orderMerchantReference": merchant_reference,
-                "status": 200
-            }
-            return Response(response_data)
-
-        except Transaction.DoesNotExist:
-             logger.error(f"IPN: Transaction {merchant_reference} not found")
-             return Response({'error': 'Transaction not found'}, status=status.HTTP_404_NOT_FOUND)
+            IPNService.enqueue(order_tracking_id, merchant_reference)
+        except Exception as e:
+            logger.error(f"IPN: Could not queue {order_tracking_id}: {e}")
+            # Return 500 so Pesapal retries
+            return Response({**response_data, "status": 500}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # Respond to Pesapal as required; the status is applied in the background
+        return Response(response_data)
@@ -0,0 +1,45 @@
+from celery import shared_task
+from celery.exceptions import MaxRetriesExceededError
+import logging
+import random
+
+from apps.payments.ipn_service import IPNService, BUSY, UNAVAILABLE
+from apps.payments.wallet_service import WalletService
+
+logger = logging.getLogger(__name__)
+
+# Waiting for a free status-check slot, then for Pesapal to answer again
+BUSY_RETRIES = 30
+UNAVAILABLE_RETRIES = 5
+
+@shared_task
+def reconcile_wallets():
+    """Check every wallet against its ledger and snapshot the ones that changed"""
+    stats = WalletService.reconcile()
+    logger.info(
+        f"Reconciled {stats['checked']} wallets: {stats['snapshots']} snapshots, {stats['mismatches']} mismatches"
+    )
+    return stats
+
+@shared_task(bind=True, acks_late=True)
+def process_pesapal_payment(self, order_tracking_id, merchant_reference=None):
+    """Apply Pesapal's current status of an order, queued by the IPN and callback views"""
+    outcome = IPNService.process(order_tracking_id, merchant_reference)
+    if outcome == BUSY:
+        try:
+            raise self.retry(countdown=random.uniform(1, 5), max_retries=BUSY_RETRIES)
+        except MaxRetriesExceededError:
+            # The queued marker is still set: without this, resends would be dropped until it expires
+            IPNService.abandon(order_tracking_id)
+            raise
+    if outcome == UNAVAILABLE:
+        # Past the last retry the reconciler picks the order up
+        raise self.retry(countdown=min(300, 10 * 2 ** self.request.retries), max_retries=UNAVAILABLE_RETRIES)
+    return outcome
+
+@shared_task
+def reconcile_pending_payments():
+    """Check on PENDING Pesapal transactions that never got a notification"""
+    totals = IPNService.reconcile_pending()
+    logger.info(f"Checked {totals['checked']} pending Pesapal transactions, queued {totals['queued']}")
+    return totals
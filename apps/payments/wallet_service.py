@@ -0,0 +1,200 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Abs
+from django.utils import timezone
+import logging
+
+from apps.accounts.models import User
+from apps.common.constants import TransactionStatus
+from .models import WalletTransaction, WalletBalanceSnapshot
+
+logger = logging.getLogger(__name__)
+
+CREDIT_TYPES = ('topup', 'refund')
+DEBIT_TYPES = ('payment', 'fine_payment')
+
+RECONCILE_BATCH_SIZE = 1000
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+# Direction comes from the type: amounts are positive, except fine payments
+# recorded before the ledger, which were stored negative
+SIGNED_AMOUNT = Case(
+    When(transaction_type__in=CREDIT_TYPES, then=Abs('amount')),
+    default=-Abs('amount'),
+    output_field=MONEY
+)
+
+
+class InsufficientFunds(ValueError):
+    def __init__(self, message, balance):
+        super().__init__(message)
+        self.balance = balance
+
+
+class WalletService:
+    """
+    The only writer of User.wallet_balance.
+
+    Every change is one F() update of the balance plus one WalletTransaction in
+    the same transaction, so concurrent debits and credits can't overwrite each
+    other and the ledger always adds up to the balance. bulk_debit() does the
+    same for many wallets at once (set-based session expiry). The ledger is
+    append-only: corrections are new entries, never edits.
+
+    reconcile() periodically checks each wallet against its ledger and stores a
+    WalletBalanceSnapshot, so balance_at() only sums the entries after the
+    closest snapshot.
+    """
+
+    @staticmethod
+    def _record(user, amount, transaction_type, description, **refs) -> WalletTransaction:
+        # The row is locked by the update until commit, so this is our own result
+        user.wallet_balance = User.objects.filter(id=user.id).values_list('wallet_balance', flat=True).get()
+        return WalletTransaction.objects.create(
+            user=user,
+            amount=amount,
+            transaction_type=transaction_type,
+            status=TransactionStatus.COMPLETED,
+            description=description,
+            **refs
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def credit(user, amount: Decimal, transaction_type: str, description: str, **refs) -> WalletTransaction:
+        """Add amount to the wallet. refs are WalletTransaction references (parking_session, metadata...)."""
+        if transaction_type not in CREDIT_TYPES:
+            raise ValueError(f"{transaction_type} is not a credit")
+        User.objects.filter(id=user.id).update(wallet_balance=F('wallet_balance') + amount)
+        return WalletService._record(user, amount, transaction_type, description, **refs)
+
+    @staticmethod
+    @transaction.atomic
+    def debit(user, amount: Decimal, transaction_type: str, description: str,
+              allow_negative: bool = True, **refs) -> WalletTransaction:
+        """
+        Take amount from the wallet. Without allow_negative the balance is checked
+        in the same statement and InsufficientFunds raised if it is too low.
+        """
+        if transaction_type not in DEBIT_TYPES:
+            raise ValueError(f"{transaction_type} is not a debit")
+        wallet = User.objects.filter(id=user.id)
+        if not allow_negative:
+            wallet = wallet.filter(wallet_balance__gte=amount)
+        if not wallet.update(wallet_balance=F('wallet_balance') - amount):
+            balance = User.objects.filter(id=user.id).values_list('wallet_balance', flat=True).get()
+            user.wallet_balance = balance
+            raise InsufficientFunds(f"Insufficient funds. Required: {amount}", balance)
+        return WalletService._record(user, amount, transaction_type, description, **refs)
+
+    @staticmethod
+    @transaction.atomic
+    def bulk_debit(debits, entries) -> list:
+        """
+        Take {user_id: amount} from many wallets with one F() update (a per-user
+        CASE) and bulk-create entries, the unsaved debit WalletTransactions making
+        up those amounts. Negative balances are allowed: callers needing the
+        balances lock the wallets first. Raises ValueError if the entries don't
+        add up to the debits.
+        """
+        debits = {user_id: amount for user_id, amount in debits.items() if amount}
+        totals = defaultdict(Decimal)
+        for entry in entries:
+            if entry.transaction_type not in DEBIT_TYPES:
+                raise ValueError(f"{entry.transaction_type} is not a debit")
+            entry.status = TransactionStatus.COMPLETED
+            totals[entry.user_id] += entry.amount
+        if totals != debits:
+            raise ValueError("Ledger entries don't add up to the debits")
+        if not debits:
+            return []
+        User.objects.filter(id__in=debits).update(
+            wallet_balance=F('wallet_balance') - Case(
+                *[When(id=user_id, then=Value(amount)) for user_id, amount in debits.items()],
+                output_field=MONEY
+            )
+        )
+        return WalletTransaction.objects.bulk_create(entries)
+
+    @staticmethod
+    def _latest_snapshot(user_ref, before=None):
+        snapshots = WalletBalanceSnapshot.objects.filter(user_id=user_ref)
+        if before is not None:
+            snapshots = snapshots.filter(as_of__lte=before)
+        return snapshots.order_by('-as_of')
+
+    @staticmethod
+    def ledger_total(entries) -> Decimal:
+        return entries.filter(status=TransactionStatus.COMPLETED).aggregate(
+            total=Sum(SIGNED_AMOUNT)
+        )['total'] or Decimal('0')
+
+    @staticmethod
+    def balance_at(user, when) -> Decimal:
+        """The wallet balance as of when, from the closest earlier snapshot and the ledger since"""
+        snapshot = WalletService._latest_snapshot(user.id, before=when).first()
+        entries = WalletTransaction.objects.filter(user_id=user.id, created_at__lte=when)
+        if snapshot is None:
+            # Before the opening snapshot the ledger may be incomplete
+            return WalletService.ledger_total(entries)
+        return snapshot.balance + WalletService.ledger_total(entries.filter(created_at__gt=snapshot.as_of))
+
+    @staticmethod
+    @transaction.atomic
+    def reconcile_batch(user_ids, now=None) -> dict:
+        """
+        Check the given wallets against their ledgers and snapshot those that
+        changed or drifted. Returns {'checked', 'snapshots', 'mismatches'}.
+        """
+        latest = WalletService._latest_snapshot(OuterRef('user_id'))
+        # Locked wallets can't change between reading them and the snapshot time
+        wallets = list(
+            User.objects.select_for_update().filter(id__in=user_ids).order_by('id').annotate(
+                snapshot_balance=Subquery(WalletService._latest_snapshot(OuterRef('id')).values('balance')[:1]),
+                snapshot_as_of=Subquery(WalletService._latest_snapshot(OuterRef('id')).values('as_of')[:1]),
+            ).values_list('id', 'wallet_balance', 'snapshot_balance', 'snapshot_as_of')
+        )
+        now = now or timezone.now()
+        deltas = dict(
+            WalletTransaction.objects.filter(user_id__in=user_ids, status=TransactionStatus.COMPLETED)
+            .annotate(snapshot_as_of=Subquery(latest.values('as_of')[:1]))
+            .filter(Q(snapshot_as_of__isnull=True) | Q(created_at__gt=F('snapshot_as_of')))
+            .values('user_id').annotate(delta=Sum(SIGNED_AMOUNT)).values_list('user_id', 'delta')
+        )
+
+        snapshots = []
+        mismatches = 0
+        for user_id, balance, snapshot_balance, snapshot_as_of in wallets:
+            ledger_balance = (snapshot_balance or Decimal('0')) + (deltas.get(user_id) or Decimal('0'))
+            if balance != ledger_balance:
+                mismatches += 1
+                logger.error(f"Wallet of user {user_id} is {balance} but its ledger adds up to {ledger_balance}")
+            elif snapshot_as_of is not None and user_id not in deltas:
+                # Unchanged since its last snapshot
+                continue
+            snapshots.append(WalletBalanceSnapshot(
+                user_id=user_id, balance=balance, ledger_balance=ledger_balance, as_of=now
+            ))
+        WalletBalanceSnapshot.objects.bulk_create(snapshots)
+        return {'checked': len(wallets), 'snapshots': len(snapshots), 'mismatches': mismatches}
+
+    @staticmethod
+    def reconcile(batch_size: int = RECONCILE_BATCH_SIZE) -> dict:
+        """Reconcile every wallet, one locked batch of users at a time"""
+        totals = {'checked': 0, 'snapshots': 0, 'mismatches': 0}
+        user_ids = User.objects.order_by('id').values_list('id', flat=True)
+        last_id = None
+        while True:
+            batch = user_ids.filter(id__gt=last_id) if last_id else user_ids
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            for key, value in WalletService.reconcile_batch(batch).items():
+                totals[key] += value
+            last_id = batch[-1]
+        if totals['mismatches']:
+            logger.error(f"{totals['mismatches']} of {totals['checked']} wallets don't match their ledger")
+        return totals
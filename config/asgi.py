@@ -1,7 +1,6 @@
 import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 from django.urls import path
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.production')
@@ -9,11 +8,15 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.production')
 django_asgi_app = get_asgi_application()
 
 # Import routing here to avoid AppRegistryNotReady error
-from apps.notifications.routing import websocket_urlpatterns
+from apps.notifications.routing import websocket_urlpatterns as notification_websocket_urlpatterns
+from apps.parking.routing import websocket_urlpatterns as parking_websocket_urlpatterns
+from apps.accounts.websocket_auth import JWTAuthMiddlewareStack
+
+websocket_urlpatterns = notification_websocket_urlpatterns + parking_websocket_urlpatterns
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
-    "websocket": AuthMiddlewareStack(
+    "websocket": JWTAuthMiddlewareStack(
         URLRouter(
             websocket_urlpatterns
         )
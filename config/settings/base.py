@@ -55,7 +55,6 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'apps.common.middleware.RegionalContextMiddleware',
-    'apps.accounts.middleware.SingleDeviceLoginMiddleware',  # Single device login enforcement
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -149,6 +148,7 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    'EXCEPTION_HANDLER': 'apps.accounts.exceptions.exception_handler',
 }
 
 # JWT Settings
@@ -160,8 +160,20 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': False,
     'UPDATE_LAST_LOGIN': True,
     'JTI_CLAIM': 'jti',  # Token ID for session tracking
+    'TOKEN_REFRESH_SERIALIZER': 'apps.accounts.authentication.DeviceSessionTokenRefreshSerializer',
 }
 
+# Idempotency-Key handling (apps.common.idempotency): seconds responses are kept,
+# seconds a key stays claimed by a running request, and seconds a duplicate waits
+IDEMPOTENCY_TTL = 86400
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+IDEMPOTENCY_WAIT_TIMEOUT = 10
+
+# Token denylist (apps.accounts.revocation): seconds between each process picking
+# up new revocations, and between full rebuilds of its Bloom filter
+REVOCATION_REFRESH_SECONDS = 5
+REVOCATION_REBUILD_SECONDS = 3600
+
 # Redis
 REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 
@@ -229,10 +241,62 @@ PESAPAL_CONSUMER_KEY = config('PESAPAL_CONSUMER_KEY', default='')
 PESAPAL_CONSUMER_SECRET = config('PESAPAL_CONSUMER_SECRET', default='')
 PESAPAL_SANDBOX = config('PESAPAL_SANDBOX', default=True, cast=bool)
 PESAPAL_CALLBACK_URL = config('PESAPAL_CALLBACK_URL', default='https://curtis-unmobilized-clarence.ngrok-free.dev/api/user/payments/pesapal/callback/')
+# Overrides the sandbox/live API URL, e.g. http://127.0.0.1:8765 for manage.py pesapal_standin
+PESAPAL_BASE_URL = config('PESAPAL_BASE_URL', default='')
+# Pesapal client (apps.payments.pesapal_service): seconds a token is cached (they
+# last 5 minutes) and renewed before it expires, seconds an IPN id is cached,
+# connect/read timeouts, retries of unsent requests, and pooled connections per host
+PESAPAL_TOKEN_TTL = 240
+PESAPAL_TOKEN_REFRESH_MARGIN = 30
+PESAPAL_IPN_ID_TTL = 604800
+PESAPAL_CONNECT_TIMEOUT = 5
+PESAPAL_READ_TIMEOUT = 30
+PESAPAL_RETRIES = 3
+PESAPAL_POOL_SIZE = 10
+# Payment gateway configs (apps.payments.gateway_cache): seconds cached per
+# country, and seconds a process keeps its own copy after an admin change
+GATEWAY_CONFIG_TTL = 3600
+GATEWAY_CONFIG_LOCAL_TTL = 30
+# Pesapal notifications (apps.payments.ipn_service): seconds a queued order drops
+# duplicate notifications, status checks running at once across workers, and the
+# batch size and age window (seconds) of the sweep of stuck PENDING transactions
+PESAPAL_IPN_DEDUPE_TTL = 300
+PESAPAL_STATUS_CONCURRENCY = 4
+PESAPAL_RECONCILE_BATCH_SIZE = 100
+PESAPAL_RECONCILE_MIN_AGE = 300
+PESAPAL_RECONCILE_MAX_AGE = 259200
 
 # Firebase Cloud Messaging Settings
 FIREBASE_CREDENTIALS_PATH = BASE_DIR / 'jambo-parking-d6e88-firebase-adminsdk-fbsvc-9ba12edacb.json'
 FIREBASE_ENABLED = config('FIREBASE_ENABLED', default=True, cast=bool)
+# Batched pushes (apps.notifications.push_dispatcher): messages per FCM send_each
+# call (at most 500), batches in flight at once, and a local stand-in to send to
+# instead of Firebase, e.g. http://127.0.0.1:8766 for manage.py fcm_standin
+FCM_BATCH_SIZE = 500
+FCM_DISPATCH_WORKERS = 4
+FCM_STANDIN_URL = config('FCM_STANDIN_URL', default='')
+# Notification outbox (apps.notifications.outbox): rows turned into
+# NotificationEvents per batch, and batches per relay run
+NOTIFICATION_OUTBOX_BATCH_SIZE = 500
+NOTIFICATION_OUTBOX_MAX_BATCHES = 20
+# Admin notification campaigns (apps.notifications.campaign_service): users per
+# chunk, and seconds a task works before queuing the next one
+NOTIFICATION_CAMPAIGN_CHUNK_SIZE = 2000
+NOTIFICATION_CAMPAIGN_TIME_BUDGET = 60
+# Unread counters (apps.notifications.counters): seconds a counter lives, and
+# how far back (seconds) the scheduled repair looks for active users
+NOTIFICATION_COUNTERS_TTL = 86400
+NOTIFICATION_COUNTERS_REPAIR_WINDOW = 7200
+
+# Default minutes before a parking session ends at which the driver is alerted
+# (overridable per zone and per user preference)
+PARKING_ALERT_THRESHOLDS = [10, 5]
+
+# Authenticated-user snapshots (apps.accounts.user_cache): seconds kept in the
+# shared cache, and entries/seconds kept in each process
+USER_SNAPSHOT_TTL = 3600
+USER_SNAPSHOT_LOCAL_SIZE = 2048
+USER_SNAPSHOT_LOCAL_TTL = 5
 
 # Celery Beat Schedule
 CELERY_BEAT_SCHEDULE = {
@@ -240,10 +304,30 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'apps.parking.tasks.check_expired_sessions',
         'schedule': crontab(minute='*/1'),  # Every minute
     },
+    'send-session-alerts': {
+        'task': 'apps.parking.tasks.send_session_alerts',
+        'schedule': crontab(minute='*/1'),  # Every minute
+    },
+    'relay-notification-outbox': {
+        'task': 'apps.notifications.tasks.relay_notification_outbox_task',
+        'schedule': crontab(minute='*/1'),  # Every minute
+    },
+    'repair-notification-counters': {
+        'task': 'apps.notifications.tasks.repair_notification_counters_task',
+        'schedule': crontab(minute=20),  # Hourly
+    },
     'cancel-overdue-reservations': {
         'task': 'apps.parking.tasks.cancel_overdue_reservations',
         'schedule': crontab(minute='*/5'),  # Every 5 minutes
     },
+    'reconcile-zone-occupancy': {
+        'task': 'apps.parking.tasks.reconcile_zone_occupancy',
+        'schedule': crontab(minute=30),  # Hourly
+    },
+    'prune-capacity-buckets': {
+        'task': 'apps.parking.tasks.prune_capacity_buckets',
+        'schedule': crontab(minute=15, hour=3),  # Daily at 03:15
+    },
     'validate-active-session-location': {
         'task': 'apps.parking.tasks.validate_active_session_location',
         'schedule': crontab(minute='*/10'),  # Every 10 minutes
@@ -252,6 +336,18 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'apps.enforcement.tasks.identify_violation_hotspots',
         'schedule': crontab(minute='*/15'),  # Every 15 minutes
     },
+    'purge-expired-revocations': {
+        'task': 'apps.accounts.tasks.purge_expired_revocations',
+        'schedule': crontab(minute=45, hour=3),  # Daily at 03:45
+    },
+    'reconcile-pending-payments': {
+        'task': 'apps.payments.tasks.reconcile_pending_payments',
+        'schedule': crontab(minute='*/10'),  # Every 10 minutes
+    },
+    'reconcile-wallets': {
+        'task': 'apps.payments.tasks.reconcile_wallets',
+        'schedule': crontab(minute=30, hour=2),  # Daily at 02:30
+    },
     'generate-daily-revenue': {
         'task': 'apps.analytics.tasks.generate_daily_revenue',
         'schedule': crontab(minute=5, hour=0),  # Daily at 00:05